@@ -0,0 +1,124 @@
+# benchmarks/bench_dashboard.py
+"""Headless dashboard rerun latency: uncached (old dashboard.py logic) vs src.dashboard_data.
+
+    python benchmarks/bench_dashboard.py --locations 50 500 2000 --days 365 --pred-files 300
+
+For each size a synthetic processed table and a directory of prediction files
+are written to a temp dir. A "rerun" is the data work one widget interaction
+triggers: find + load the latest prediction, load the processed table, filter
+one location/date range, categorise forecasts and build the map frame.
+"""
+import argparse
+import glob
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import numpy as np
+import pandas as pd
+from src import dashboard_data
+from src.storage import BACKENDS, read_table, write_table
+
+# the dashboard's former linear-scan table (with its gaps, e.g. 12.05 -> "Unknown")
+OLD_AQI_BREAKPOINTS = [(0, 12, "Good"), (12.1, 35.4, "Moderate"), (35.5, 55.4, "Unhealthy for Sensitive Groups"),
+                       (55.5, 150.4, "Unhealthy"), (150.5, 250.4, "Very Unhealthy"), (250.5, 500, "Hazardous")]
+COORDS = {f"Loc_{i}": (float(i % 90), float(i % 180)) for i in range(0, 5000, 7)}
+
+def _write_fixture(tmp, locations, days, pred_files, fmt, seed=0):
+    rng = np.random.default_rng(seed)
+    locs = [f"Loc_{i}" for i in range(locations)]
+    dates = pd.date_range("2024-01-01", periods=days, freq="D")
+    n = locations * days
+    processed = pd.DataFrame({
+        "location": np.repeat(locs, days),
+        "date": np.tile(dates, locations),
+        "pm25_mean": rng.gamma(2, 15, n), "pm25_max": rng.gamma(3, 15, n), "pm25_roll3": rng.gamma(2, 15, n),
+        "pm10_mean": rng.gamma(2, 25, n), "temp": rng.normal(15, 8, n), "humidity": rng.uniform(20, 90, n),
+    })
+    processed_path = tmp / f"processed.{fmt}"
+    write_table(processed, processed_path)
+    pred_dir = tmp / "predictions"
+    pred_dir.mkdir()
+    for k in range(pred_files):
+        day = pd.Timestamp("2024-01-01") + pd.Timedelta(days=k)
+        pred = pd.DataFrame({"location": locs, "date": day, "pm25_pred_next_day": rng.gamma(2, 20, locations)})
+        write_table(pred, pred_dir / f"prediction_{day:%Y-%m-%d}.csv")
+    return processed_path, pred_dir, locs[len(locs) // 2], dates[days // 4].date(), dates[-1].date()
+
+def _old_aqi(pm25):
+    for low, high, name in OLD_AQI_BREAKPOINTS:
+        if low <= pm25 <= high:
+            return name
+    return "Unknown"
+
+def old_rerun(processed_path, pred_dir, loc, start, end):
+    df = read_table(processed_path)
+    df["date"] = df["date"].dt.date
+    files = sorted(f for f in glob.glob(str(Path(pred_dir) / "prediction_*")) if Path(f).suffix in BACKENDS)
+    prediction = read_table(files[-1])
+    prediction["date"] = prediction["date"].dt.date
+    subset = df[(df["location"] == loc) & (df["date"] >= start) & (df["date"] <= end)].copy()
+    prediction["aqi_category"] = prediction["pm25_pred_next_day"].apply(_old_aqi)
+    coords = []
+    for _, row in prediction.iterrows():
+        if row["location"] in COORDS:
+            lat, lon = COORDS[row["location"]]
+            coords.append({"lat": lat, "lon": lon, "pm25": row["pm25_pred_next_day"], "loc": row["location"]})
+    return subset, prediction, pd.DataFrame(coords)
+
+def new_rerun(processed_path, pred_dir, loc, start, end):
+    index = dashboard_data.processed_index(processed_path)
+    prediction = dashboard_data.load_prediction(dashboard_data.latest_prediction_file(pred_dir))
+    subset = index.select(loc, start, end)
+    return subset, prediction, dashboard_data.map_frame(prediction, COORDS)
+
+def _best(fn, args, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), out
+
+def run(locations, days, pred_files, fmt="parquet", repeats=5):
+    results = []
+    for n_locs in locations:
+        tmp = Path(tempfile.mkdtemp(prefix="aq_bench_dash_"))
+        try:
+            args = _write_fixture(tmp, n_locs, days, pred_files, fmt)
+            old_s, (old_subset, old_pred, old_map) = _best(old_rerun, args, repeats)
+            dashboard_data.clear_cache()
+            cold_s, _ = _best(new_rerun, args, 1)
+            warm_s, (subset, pred, map_df) = _best(new_rerun, args, repeats)
+            # same rows and categories as the old code path
+            assert len(subset) == len(old_subset)
+            assert np.allclose(subset["pm25_mean"].to_numpy(), old_subset["pm25_mean"].to_numpy())
+            # same categories, except where the old table had gaps ("Unknown")
+            new_cat = pred.set_index("location")["aqi_category"].sort_index()
+            old_cat = old_pred.set_index("location")["aqi_category"].sort_index()
+            assert ((new_cat == old_cat) | (old_cat == "Unknown")).all()
+            assert len(map_df) == len(old_map)
+            results.append({
+                "locations": n_locs, "rows": n_locs * days, "pred_files": pred_files,
+                "old_rerun_ms": round(old_s * 1000, 1),
+                "cold_rerun_ms": round(cold_s * 1000, 1),
+                "warm_rerun_ms": round(warm_s * 1000, 2),
+                "speedup_warm": round(old_s / warm_s, 1),
+            })
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--locations", type=int, nargs="+", default=[50, 500, 2000])
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--pred-files", type=int, default=300)
+    ap.add_argument("--format", default="parquet", choices=["parquet", "csv"])
+    ap.add_argument("--repeats", type=int, default=5)
+    args = ap.parse_args()
+    print(json.dumps(run(args.locations, args.days, args.pred_files, args.format, args.repeats), indent=2))
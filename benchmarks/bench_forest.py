@@ -0,0 +1,92 @@
+# benchmarks/bench_forest.py
+"""joblib pickle vs memory-mapped tree arrays: load time, resident memory, predict throughput.
+
+    python benchmarks/bench_forest.py --trees 100 --rows 50000
+
+Fits a forest on synthetic data (or benchmarks --model, an existing .joblib),
+exports it with src.forest.export_forest and measures each load path in a fresh
+subprocess. Memory is the growth of resident / private (not file-backed, so
+not shareable between workers) pages, read from /proc/self/statm (Linux).
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+import numpy as np
+
+_PROBE = """
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+from src.model import load_model
+def rss():  # (resident, private) MB from /proc; file-backed mmap pages count as shared
+    resident, shared = map(int, open("/proc/self/statm").read().split()[1:3])
+    page = os.sysconf("SC_PAGE_SIZE") / 2**20
+    return resident * page, (resident - shared) * page
+base = rss()
+start = time.perf_counter()
+model = load_model({path!r})
+load_s = time.perf_counter() - start
+X = np.load({x_path!r})
+start = time.perf_counter()
+pred = model.predict(X)
+predict_s = time.perf_counter() - start
+np.save({pred_path!r}, pred)
+after = rss()
+print(json.dumps({{"load_s": load_s, "predict_s": predict_s,
+                  "rss_mb": after[0] - base[0], "private_mb": after[1] - base[1]}}))
+"""
+
+def _probe(path, x_path, pred_path):
+    code = _PROBE.format(root=str(ROOT), path=str(path), x_path=str(x_path), pred_path=str(pred_path))
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def run(trees, rows, model_path=None, seed=0):
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+    from src.forest import export_forest
+    tmp = Path(tempfile.mkdtemp(prefix="aq_bench_forest_"))
+    rng = np.random.default_rng(seed)
+    try:
+        if model_path:
+            model = joblib.load(model_path)
+        else:
+            X_fit = rng.normal(size=(20_000, 9))
+            y_fit = X_fit @ rng.normal(size=9) + rng.normal(scale=0.5, size=len(X_fit))
+            model = RandomForestRegressor(n_estimators=trees, random_state=seed, n_jobs=-1).fit(X_fit, y_fit)
+            model_path = tmp / "model.joblib"
+            joblib.dump(model, model_path)
+        arrays_path = export_forest(model, tmp / "model.forest")
+        X = rng.normal(size=(rows, model.n_features_in_))
+        np.save(tmp / "X.npy", X)
+        results = {}
+        for name, path in (("joblib", model_path), ("mmap_arrays", arrays_path)):
+            r = _probe(path, tmp / "X.npy", tmp / f"pred_{name}.npy")
+            size = sum(p.stat().st_size for p in Path(path).rglob("*")) if Path(path).is_dir() else Path(path).stat().st_size
+            results[name] = {
+                "size_mb": round(size / 1e6, 1),
+                "load_s": round(r["load_s"], 4),
+                "rss_mb": round(r["rss_mb"], 1),
+                "private_mb": round(r["private_mb"], 1),
+                "predict_rows_per_s": round(rows / r["predict_s"]),
+            }
+        a, b = np.load(tmp / "pred_joblib.npy"), np.load(tmp / "pred_mmap_arrays.npy")
+        results["max_abs_diff"] = float(np.abs(a - b).max())
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--trees", type=int, default=100)
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--model", default=None, help="benchmark an existing .joblib model instead of fitting one")
+    args = ap.parse_args()
+    print(json.dumps(run(args.trees, args.rows, args.model), indent=2))
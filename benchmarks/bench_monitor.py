@@ -0,0 +1,78 @@
+# benchmarks/bench_monitor.py
+"""Cost of the incremental monitor vs rescanning history, and the training it lets a run skip.
+
+    python benchmarks/bench_monitor.py --stations 100 1000 --days 60
+
+For each size, synthetic hourly tables of `days` days are folded into a fresh
+src.monitor.Profile ("rescan": what rebuilding the statistics from history on
+every run would cost), then one more day is folded into that profile
+("incremental": what a daily run pays). Drift and quality checks on the new
+day are included in the incremental time. "train_s" is model.train on the
+processed table of the same data, the cost of a run that retrains.
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pandas as pd
+from src.data_generator import iter_sensor_readings, iter_weather_data
+from src.etl import _aggregate_daily, _merge
+from src.features import build_features
+from src.model import train
+from src.monitor import Profile, check_quality, psi
+from src.schema import conform
+from src.storage import write_table
+
+FEATURES = [{"column": "pm25_mean", "name": "pm25", "rolling": {"windows": [3, 7], "aggs": ["mean"]}, "trend": [3]}]
+
+def _fold(profile, tables):
+    for source, df in tables.items():
+        check_quality(df, source, profile.meta["last_seen"].get(source))
+        profile.fold(df, source)
+
+def run(stations, days, tmp):
+    results = []
+    for n in stations:
+        sensor = conform(pd.concat(iter_sensor_readings(days + 1, n, seed=0), ignore_index=True), "sensor")
+        weather = conform(pd.concat(iter_weather_data(days + 1, n, seed=1), ignore_index=True), "weather")
+        cut = sensor["timestamp"].max().normalize()
+        history = {"sensor": sensor[sensor["timestamp"] < cut], "weather": weather[weather["timestamp"] < cut]}
+        new_day = {"sensor": sensor[sensor["timestamp"] >= cut], "weather": weather[weather["timestamp"] >= cut]}
+
+        profile = Profile()
+        start = time.perf_counter()
+        _fold(profile, history)
+        rescan = time.perf_counter() - start
+        profile.reference = profile.window()
+
+        start = time.perf_counter()
+        _fold(profile, new_day)
+        psi(profile.reference, profile.window(profile.days[-7]))
+        incremental = time.perf_counter() - start
+
+        processed = Path(tmp) / f"processed_{n}.parquet"
+        write_table(build_features(_aggregate_daily(_merge(history["sensor"], history["weather"])), FEATURES),
+                    processed)
+        start = time.perf_counter()
+        train(processed, Path(tmp) / f"model_{n}.joblib")
+        train_s = time.perf_counter() - start
+        results.append({"stations": n, "raw_rows": len(sensor) + len(weather), "rescan_s": round(rescan, 3),
+                        "incremental_s": round(incremental, 3), "speedup": round(rescan / incremental, 1),
+                        "train_s": round(train_s, 2)})
+    return results
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--stations", type=int, nargs="+", default=[100, 1000])
+    ap.add_argument("--days", type=int, default=60)
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp(prefix="aq_monitor_")
+    try:
+        print(json.dumps(run(args.stations, args.days, tmp), indent=2))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,71 @@
+# benchmarks/bench_schema.py
+"""Memory and groupby speed of the default dtypes vs src.schema (category / float32 / datetime64).
+
+    python benchmarks/bench_schema.py --stations 100 1000 3000 --days 30
+
+For each size, synthetic hourly sensor and weather tables are built in memory.
+"default" is what reading them from CSV used to give: object location strings
+and float64 measurements. "schema" is the same data after src.schema.conform.
+The timings cover the ETL join + daily aggregation (etl._merge /
+_aggregate_daily) and the per-location mean of the processed table.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pandas as pd
+from src.data_generator import iter_sensor_readings, iter_weather_data
+from src.etl import _aggregate_daily, _merge
+from src.schema import conform
+
+def _default(df):
+    df = df.copy()
+    df["location"] = df["location"].astype(object)
+    for col in df.columns:
+        if pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype("float64")
+    return df
+
+def _mib(df):
+    return round(df.memory_usage(deep=True).sum() / 2**20, 1)
+
+def _best(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), out
+
+def run(stations, days, repeats=3):
+    results = []
+    for n in stations:
+        sensor = pd.concat(iter_sensor_readings(days, n, seed=0), ignore_index=True)
+        weather = pd.concat(iter_weather_data(days, n, seed=1), ignore_index=True)
+        row = {"stations": n, "raw_rows": len(sensor)}
+        for label, cast in (("default", _default), ("schema", lambda df, t: conform(df.copy(), t))):
+            s = cast(sensor, "sensor") if label == "schema" else cast(sensor)
+            w = cast(weather, "weather") if label == "schema" else cast(weather)
+            etl_s, daily = _best(lambda: _aggregate_daily(_merge(s, w)), repeats)
+            if label == "default":
+                daily["location"] = daily["location"].astype(object)
+                daily = daily.astype({c: "float64" for c in daily.columns if c not in ("location", "date")})
+            group_s, _ = _best(lambda: daily.groupby("location", observed=True).mean(numeric_only=True), repeats)
+            row.update({f"{label}_raw_mib": _mib(s) + _mib(w), f"{label}_processed_mib": _mib(daily),
+                        f"{label}_etl_s": round(etl_s, 3), f"{label}_groupby_ms": round(group_s * 1000, 2)})
+        row["memory_ratio"] = round(row["default_raw_mib"] / row["schema_raw_mib"], 1)
+        row["etl_speedup"] = round(row["default_etl_s"] / row["schema_etl_s"], 2)
+        row["groupby_speedup"] = round(row["default_groupby_ms"] / row["schema_groupby_ms"], 2)
+        results.append(row)
+    return results
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--stations", type=int, nargs="+", default=[100, 1000, 3000])
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--repeats", type=int, default=3)
+    args = ap.parse_args()
+    print(json.dumps(run(args.stations, args.days, args.repeats), indent=2))
@@ -0,0 +1,60 @@
+# benchmarks/bench_sharding.py
+"""Scaling of sharded (per-location) training and prediction from 1 to N worker processes.
+
+    python benchmarks/bench_sharding.py --locations 64 --days 180 --workers 1 2 4 8
+
+Generates synthetic data, runs the ETL once (partitioned by location), then
+times src.sharding.train_sharded / predict_sharded for each worker count and
+reports wall time, speedup and parallel efficiency relative to one worker.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.data_generator import generate_sensor_readings, generate_weather_data
+from src.etl import run_etl
+from src.sharding import predict_sharded, train_sharded
+
+def run(locations, days, workers, trees=50, seed=0):
+    tmp = Path(tempfile.mkdtemp(prefix="aq_bench_shard_"))
+    try:
+        sensor, weather, processed = tmp / "sensor.parquet", tmp / "weather.parquet", tmp / "processed.parquet"
+        generate_sensor_readings(days, locations, out_path=sensor, seed=seed)
+        generate_weather_data(days, locations, out_path=weather, seed=seed + 1)
+        run_etl(sensor, weather, processed, partition_cols=["location"])
+        estimator = {"name": "random_forest", "params": {"n_estimators": trees, "random_state": seed}}
+        results = []
+        for n in workers:
+            registry_dir = tmp / f"registry_{n}"
+            start = time.perf_counter()
+            summary = train_sharded(processed, registry_dir, estimator=estimator, max_workers=n)
+            train_s = time.perf_counter() - start
+            start = time.perf_counter()
+            predict_sharded(registry_dir / "registry.json", processed, output_path=tmp / f"pred_{n}.csv",
+                            max_workers=n)
+            predict_s = time.perf_counter() - start
+            results.append({"workers": n, "shards": summary["shards"], "train_s": round(train_s, 2),
+                            "predict_s": round(predict_s, 2), "cores_used": summary["cores_used"]})
+        base = results[0]["train_s"]
+        for r in results:
+            r["speedup"] = round(base / r["train_s"], 2)
+            r["efficiency"] = round(r["speedup"] / (r["workers"] / results[0]["workers"]), 2)
+        return {"cpus": os.cpu_count(), "locations": locations, "days": days, "trees": trees, "results": results}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--locations", type=int, default=64)
+    ap.add_argument("--days", type=int, default=180)
+    ap.add_argument("--trees", type=int, default=50)
+    ap.add_argument("--workers", type=int, nargs="+",
+                    default=sorted({1, 2, 4, os.cpu_count() or 1} & set(range(1, (os.cpu_count() or 1) + 1))))
+    args = ap.parse_args()
+    print(json.dumps(run(args.locations, args.days, args.workers, args.trees), indent=2))
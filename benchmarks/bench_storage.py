@@ -0,0 +1,66 @@
+# benchmarks/bench_storage.py
+"""CSV vs Parquet: write/read time and size for synthetic raw sensor data.
+
+    python benchmarks/bench_storage.py --locations 500 --days 90
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pandas as pd
+from src.data_generator import iter_sensor_readings
+from src.storage import open_writer, read_table
+
+def _size(path):
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+def _timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - start, out
+
+def run(locations, days, seed=0):
+    chunks = list(iter_sensor_readings(days=days, locations=locations, seed=seed))
+    rows = sum(len(c) for c in chunks)
+    cutoff = chunks[-1]["timestamp"].iloc[0]
+    some_locs = list(chunks[0]["location"].cat.categories[:max(1, locations // 10)])
+    tmp = Path(tempfile.mkdtemp(prefix="aq_bench_"))
+    variants = {
+        "csv": (tmp / "sensor.csv", None),
+        "parquet": (tmp / "sensor.parquet", None),
+        "parquet/location": (tmp / "sensor_by_loc.parquet", ["location"]),
+    }
+    results = []
+    try:
+        for name, (path, parts) in variants.items():
+            def write():
+                with open_writer(path, partition_cols=parts) as w:
+                    for c in chunks:
+                        w.write(c)
+            t_write, _ = _timed(write)
+            t_read, _ = _timed(lambda: read_table(path))
+            t_proj, _ = _timed(lambda: read_table(path, columns=["timestamp", "location", "pm25"]))
+            t_filter, _ = _timed(lambda: read_table(path, columns=["timestamp", "location", "pm25"],
+                                                   filters=[("location", "in", some_locs),
+                                                            ("timestamp", ">=", cutoff)]))
+            results.append({"format": name, "rows": rows, "size_mb": _size(path) / 1e6,
+                            "write_s": t_write, "read_s": t_read, "read_cols_s": t_proj,
+                            "read_filtered_s": t_filter})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--locations", type=int, default=200)
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    print(run(args.locations, args.days, args.seed).round(3).to_string(index=False))
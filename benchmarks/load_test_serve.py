@@ -0,0 +1,88 @@
+# benchmarks/load_test_serve.py
+"""Load test for the local prediction server (src/serve.py).
+
+    python -m src.serve --port 8008 &
+    python benchmarks/load_test_serve.py --url http://127.0.0.1:8008 --clients 32 --seconds 10
+
+With --spawn the server is started in-process on a free port using the current
+artifacts, so the script can run standalone.
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import numpy as np
+
+def _client(host, port, path, deadline, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+def run(url, clients, seconds, location=None):
+    u = urlparse(url)
+    path = "/predict" + (f"?location={location}" if location else "")
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=_client, args=(u.hostname, u.port, path, deadline, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    lat = np.array(latencies) * 1000
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=30)
+    conn.request("GET", "/metrics")
+    server = json.loads(conn.getresponse().read())
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_p50_ms": round(float(np.percentile(lat, 50)), 2) if len(lat) else None,
+        "latency_p99_ms": round(float(np.percentile(lat, 99)), 2) if len(lat) else None,
+        "server_avg_batch_rows": server.get("avg_batch_rows"),
+        "server_batches_total": server.get("batches_total"),
+    }
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default="http://127.0.0.1:8008")
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--location", default=None, help="query one location instead of all")
+    ap.add_argument("--spawn", action="store_true", help="start a server in-process on a free port")
+    args = ap.parse_args()
+    server = None
+    if args.spawn:
+        from src.serve import PredictionServer
+        from src.config import MODELS_DIR, PROCESSED_PATH
+        server = PredictionServer(("127.0.0.1", 0), MODELS_DIR / "aqi_model.joblib", PROCESSED_PATH)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        args.url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        print(json.dumps(run(args.url, args.clients, args.seconds, args.location), indent=2))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
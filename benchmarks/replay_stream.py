@@ -0,0 +1,180 @@
+# benchmarks/replay_stream.py
+"""Replay sensor_readings/weather files as hourly events into the streaming consumer.
+
+    python benchmarks/replay_stream.py                                 # as fast as possible, in-process
+    python benchmarks/replay_stream.py --speed 3600                    # one data hour per second
+    python benchmarks/replay_stream.py --generate 200x60 --verify      # synthetic input, compare with run_etl
+    python -m src.streaming --listen 127.0.0.1:8765 &
+    python benchmarks/replay_stream.py --connect 127.0.0.1:8765
+
+Events are sent in timestamp order (each hour: sensor rows, then weather
+rows). In-process, the replay and src.streaming.consume share one event loop
+and the report includes throughput and end-to-end latency: from the event that
+closed a day being queued to that day's prediction being stored. With
+--connect the events go over TCP as JSON lines and only the send rate is
+reported (see the consumer's own stats when it stops). --verify runs run_etl
+on the same files and compares the streamed daily rows with its output.
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import numpy as np
+import pandas as pd
+from src.config import DATA_DIR, MODELS_DIR
+from src.data_generator import generate_sensor_readings, generate_weather_data
+from src.etl import run_etl
+from src.storage import iter_table, read_table
+from src.streaming import FIELDS, StreamProcessor, consume
+
+def _time_ordered(path, chunk_rows):
+    last = None
+    for chunk in iter_table(path, chunk_rows, columns=["timestamp"]):
+        ts = chunk["timestamp"]
+        if ts.empty:
+            continue
+        if not ts.is_monotonic_increasing or (last is not None and ts.iloc[0] < last):
+            return False
+        last = ts.iloc[-1]
+    return True
+
+def _hours(path, kind, chunk_rows=200_000):
+    """(timestamp, kind, [event, ...]) per hour of a table, read chunk by chunk if it is time-ordered."""
+    fields = list(FIELDS[kind])
+    columns = ["timestamp", "location"] + fields
+    if _time_ordered(path, chunk_rows):
+        chunks = iter_table(path, chunk_rows, columns=columns)
+    else:
+        # e.g. the shipped CSVs, written location by location: sorted in memory
+        chunks = [read_table(path, columns=columns).sort_values("timestamp", kind="stable", ignore_index=True)]
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        last = chunk["timestamp"].iloc[-1]
+        carry = chunk[chunk["timestamp"] == last]  # the last hour may continue in the next chunk
+        chunk = chunk[chunk["timestamp"] < last]
+        yield from _group(chunk, kind, fields)
+    if carry is not None:
+        yield from _group(carry, kind, fields)
+
+def _group(chunk, kind, fields):
+    # one pass to Python objects, then split at timestamp changes (the chunk is time-ordered)
+    ts = chunk["timestamp"]
+    columns = [chunk["location"].astype(str).tolist()] + [chunk[f].tolist() for f in fields]
+    events = [{"type": kind, "location": loc, **dict(zip(fields, vals))} for loc, *vals in zip(*columns)]
+    starts = np.flatnonzero(np.r_[True, ts.to_numpy()[1:] != ts.to_numpy()[:-1]]) if len(ts) else []
+    for lo, hi in zip(starts, list(starts[1:]) + [len(ts)]):
+        stamp = ts.iloc[lo]
+        for event in events[lo:hi]:
+            event["timestamp"] = stamp
+        yield stamp, kind, events[lo:hi]
+
+def replay_events(sensor_path, weather_path):
+    """Hourly event batches of both files merged by timestamp (sensor first within an hour)."""
+    return heapq.merge(_hours(sensor_path, "sensor"), _hours(weather_path, "weather"),
+                       key=lambda item: (item[0], item[1] != "sensor"))
+
+async def _pace(hours, speed):
+    """Yield hourly batches, sleeping so data time advances `speed` times faster than wall time."""
+    start, first = time.perf_counter(), None
+    for ts, kind, events in hours:
+        first = ts if first is None else first
+        if speed:
+            delay = (ts - first).total_seconds() / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield events
+
+async def replay_inprocess(sensor_path, weather_path, speed=0.0, model_path=None, store_path=None,
+                           collect=False, queue_size=50_000):
+    queue = asyncio.Queue(maxsize=queue_size)
+    processor = StreamProcessor(model_path, store_path, collect=collect)
+
+    async def produce():
+        try:
+            async for events in _pace(replay_events(sensor_path, weather_path), speed):
+                for event in events:
+                    await queue.put((event, time.perf_counter()))
+        finally:
+            # also on failure, so the consumer stops; the error is re-raised by `await producer`
+            await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        stats = await consume(queue, processor)
+    finally:
+        if not producer.done():
+            producer.cancel()
+    await producer
+    return stats, processor
+
+async def replay_socket(sensor_path, weather_path, host, port, speed=0.0, stop=True):
+    reader, writer = await asyncio.open_connection(host, port)
+    sent, start = 0, time.perf_counter()
+    async for events in _pace(replay_events(sensor_path, weather_path), speed):
+        for event in events:
+            writer.write((json.dumps({**event, "timestamp": event["timestamp"].isoformat()}) + "\n").encode())
+        sent += len(events)
+        await writer.drain()
+    writer.write((json.dumps({"type": "stop" if stop else "flush"}) + "\n").encode())
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+    elapsed = time.perf_counter() - start
+    return {"events_sent": sent, "elapsed_s": round(elapsed, 3), "events_per_s": round(sent / elapsed, 1)}
+
+def verify(processor, sensor_path, weather_path, tmp):
+    """Compare the streamed daily rows (collect=True) with run_etl on the same files."""
+    batch = read_table(run_etl(sensor_path, weather_path, Path(tmp) / "processed.parquet"))
+    batch["location"] = batch["location"].astype(str)
+    batch = batch.sort_values(["location", "date"], ignore_index=True)
+    streamed = processor.result()
+    if len(batch) != len(streamed):
+        return {"rows_batch": len(batch), "rows_stream": len(streamed), "match": False}
+    cols = [c for c in batch.columns if c not in ("location", "date")]
+    diff = np.nanmax(np.abs(batch[cols].to_numpy(float) - streamed[cols].to_numpy(float)))
+    same_keys = bool((batch["location"] == streamed["location"]).all()
+                     and (batch["date"].to_numpy() == streamed["date"].to_numpy()).all())
+    return {"rows": len(batch), "max_abs_diff": float(diff), "match": bool(same_keys and diff == 0)}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sensor", default=str(DATA_DIR / "sensor_readings.csv"))
+    ap.add_argument("--weather", default=str(DATA_DIR / "weather.csv"))
+    ap.add_argument("--generate", default=None, metavar="STATIONSxDAYS",
+                    help="replay freshly generated synthetic data instead of --sensor/--weather")
+    ap.add_argument("--speed", type=float, default=0.0,
+                    help="data seconds per wall second (3600 = an hour per second); 0 = as fast as possible")
+    ap.add_argument("--connect", default=None, metavar="HOST:PORT", help="send to a running src.streaming")
+    ap.add_argument("--model", default=None, help=f"predict closed days (e.g. {MODELS_DIR / 'aqi_model.forest'})")
+    ap.add_argument("--store", default=None, help="append the predictions to this SQLite store")
+    ap.add_argument("--verify", action="store_true", help="compare the streamed daily rows with run_etl")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="aq_replay_"))
+    try:
+        sensor, weather = args.sensor, args.weather
+        if args.generate:
+            stations, days = (int(x) for x in args.generate.lower().split("x"))
+            sensor, weather = tmp / "sensor_readings.parquet", tmp / "weather.parquet"
+            generate_sensor_readings(days, stations, out_path=sensor, seed=0)
+            generate_weather_data(days, stations, out_path=weather, seed=1)
+        if args.connect:
+            host, _, port = args.connect.rpartition(":")
+            result = asyncio.run(replay_socket(sensor, weather, host, int(port), args.speed))
+        else:
+            result, processor = asyncio.run(replay_inprocess(sensor, weather, args.speed, args.model, args.store,
+                                                             collect=args.verify))
+            if args.verify:
+                result["verify"] = verify(processor, sensor, weather, tmp)
+        print(json.dumps(result, indent=2))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,170 @@
+# benchmarks/run_suite.py
+"""End-to-end benchmark suite: generators, ETL, training, prediction and dashboard loads at scale.
+
+    python benchmarks/run_suite.py --scales smoke small            # presets
+    python benchmarks/run_suite.py --scales 200x90xhourly 1000x30  # STATIONSxDAYS[xFREQ]
+    python benchmarks/run_suite.py --scales small --save-baseline  # store benchmarks/baseline.json
+    python benchmarks/run_suite.py --scales small --baseline benchmarks/baseline.json
+
+Everything runs offline on the synthetic generators (fixed seed) in a temp
+directory. Each stage is measured with src.metrics.measure_step (wall/CPU
+seconds, peak RSS, rows and bytes through src.storage); the best of
+--repeats runs is kept. Results go to artifacts/reports/benchmarks/. With a
+baseline, any stage whose wall time or peak RSS grew by more than --tolerance
+is reported as a regression and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src import dashboard_data
+from src.config import REPORT_DIR
+from src.data_generator import generate_sensor_readings, generate_weather_data
+from src.etl import run_etl
+from src.metrics import measure_step
+from src.model import predict_today, train
+
+PRESETS = {
+    "smoke": "5x30xhourly",
+    "small": "50x90xhourly",
+    "medium": "500x180xhourly",
+    "large": "2000x365xhourly",
+}
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+OUT_DIR = REPORT_DIR / "benchmarks"
+COMPARED = ("wall_s", "peak_rss_bytes")
+
+def parse_scale(text):
+    """'small' or 'STATIONSxDAYS[xFREQ]' -> (label, stations, days, freq)."""
+    spec = PRESETS.get(text, text)
+    parts = spec.lower().split("x")
+    if len(parts) not in (2, 3) or not (parts[0].isdigit() and parts[1].isdigit()):
+        raise ValueError(f"Bad scale {text!r}; use a preset ({', '.join(PRESETS)}) or STATIONSxDAYSxFREQ")
+    freq = parts[2] if len(parts) == 3 else "hourly"
+    if freq not in ("hourly", "daily"):
+        raise ValueError(f"Bad frequency {freq!r} in scale {text!r}; use hourly or daily")
+    return f"{parts[0]}x{parts[1]}x{freq}", int(parts[0]), int(parts[1]), freq
+
+def _stages(tmp, stations, days, freq, trees, seed):
+    sensor, weather = tmp / "sensor_readings.parquet", tmp / "weather.parquet"
+    processed, model = tmp / "processed.parquet", tmp / "aqi_model.joblib"
+    arrays, store = tmp / "aqi_model.forest", tmp / "predictions.sqlite"
+    estimator = {"name": "random_forest", "params": {"n_estimators": trees, "random_state": seed}}
+
+    def dashboard_cold():
+        dashboard_data.clear_cache()
+        return dashboard_data.processed_index(processed), dashboard_data.store_latest(store)
+
+    def dashboard_warm():
+        return dashboard_data.processed_index(processed), dashboard_data.store_latest(store)
+
+    return [
+        ("generate_sensors", lambda: generate_sensor_readings(days, stations, freq=freq, out_path=sensor, seed=seed)),
+        ("generate_weather", lambda: generate_weather_data(days, stations, out_path=weather, seed=seed + 1)),
+        ("etl", lambda: run_etl(sensor, weather, processed)),
+        ("train", lambda: train(processed, model, estimator=estimator, arrays_path=arrays)),
+        ("predict_joblib", lambda: predict_today(model, data_path=processed, store_path=store)),
+        ("predict_arrays", lambda: predict_today(arrays, data_path=processed, store_path=store)),
+        ("dashboard_cold", dashboard_cold),
+        ("dashboard_warm", dashboard_warm),
+    ]
+
+def run_scale(label, stations, days, freq, trees=100, repeats=1, seed=0):
+    best = {}
+    for _ in range(repeats):
+        tmp = Path(tempfile.mkdtemp(prefix="aq_suite_"))
+        try:
+            for name, fn in _stages(tmp, stations, days, freq, trees, seed):
+                with measure_step(name) as m:
+                    fn()
+                rows = max(m["rows_in"], m["rows_out"])
+                m["rows_per_s"] = round(rows / m["wall_s"]) if m["wall_s"] else None
+                prev = best.get(name)
+                if prev is None or m["wall_s"] < prev["wall_s"]:
+                    best[name] = dict(m)
+                # fastest wall time, but the worst memory seen
+                best[name]["peak_rss_bytes"] = max(m["peak_rss_bytes"], prev["peak_rss_bytes"] if prev else 0)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+            dashboard_data.clear_cache()
+    return {"scale": label, "stations": stations, "days": days, "freq": freq, "stages": list(best.values())}
+
+def machine():
+    import numpy, pandas, sklearn
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.05):
+    """Regressions of `results` against `baseline`: a list of human-readable lines."""
+    base = {(s["scale"], st["step"]): st for s in baseline["scales"] for st in s["stages"]}
+    out = []
+    for scale in results["scales"]:
+        for stage in scale["stages"]:
+            ref = base.get((scale["scale"], stage["step"]))
+            if ref is None:
+                continue
+            for field in COMPARED:
+                old, new = ref.get(field) or 0, stage.get(field) or 0
+                if field == "wall_s" and new - old < min_seconds:
+                    continue  # too short to measure reliably
+                if old and new > old * (1 + tolerance):
+                    out.append(f"{scale['scale']} {stage['step']}: {field} {old:,.3f} -> {new:,.3f} "
+                               f"(+{(new / old - 1) * 100:.0f}%)")
+    return out
+
+def _table(results):
+    lines = [f"{'scale':<20} {'stage':<17} {'wall_s':>8} {'cpu_s':>8} {'peak_MiB':>9} {'rows':>11} {'rows/s':>11}"]
+    for scale in results["scales"]:
+        for st in scale["stages"]:
+            rows = max(st["rows_in"], st["rows_out"])
+            lines.append(f"{scale['scale']:<20} {st['step']:<17} {st['wall_s']:>8.3f} {st['cpu_s']:>8.2f} "
+                         f"{st['peak_rss_bytes'] / 2**20:>9.0f} {rows:>11,} {st['rows_per_s'] or 0:>11,}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scales", nargs="+", default=["smoke", "small"])
+    ap.add_argument("--trees", type=int, default=100, help="random forest size for the train stage")
+    ap.add_argument("--repeats", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--baseline", default=None, help="compare against this results file")
+    ap.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE_PATH}")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth before flagging")
+    args = ap.parse_args()
+
+    results = {"created": datetime.now().isoformat(timespec="seconds"), "machine": machine(),
+               "trees": args.trees, "seed": args.seed, "scales": []}
+    for text in args.scales:
+        label, stations, days, freq = parse_scale(text)
+        results["scales"].append(run_scale(label, stations, days, freq, args.trees, args.repeats, args.seed))
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = OUT_DIR / f"bench_{datetime.now():%Y-%m-%d_%H-%M-%S}.json"
+    out_path.write_text(json.dumps(results, indent=2))
+    print(_table(results))
+    print(f"\nResults written to {out_path}")
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {BASELINE_PATH}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("machine", {}).get("cpus") != results["machine"]["cpus"]:
+            print("Warning: baseline was recorded on a machine with a different CPU count")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) vs {args.baseline}:")
+            print("\n".join(f"  {r}" for r in regressions))
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
@@ -0,0 +1,109 @@
+"""EPA Air Quality Index: breakpoint tables and vectorised classification.
+
+One table per pollutant, in the units of the sensor data:
+
+    pm25  µg/m³, 24-hour      pm10  µg/m³, 24-hour
+    no2   ppb, 1-hour         so2   ppb, 1-hour
+
+Concentrations are truncated to the precision of the table first (0.1 for
+PM2.5, whole numbers otherwise), as EPA specifies, so there are no gaps
+between breakpoints: 12.05 µg/m³ is 12.0 and "Good". The breakpoint row is
+found with one `np.searchsorted` over the upper bounds for a whole array,
+then the index is the linear interpolation within that row. Values above the
+top of the table count as "Hazardous" with an index of 500; NaN stays NaN
+("Unknown").
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "Hazardous"]
+UNHEALTHY = CATEGORIES[2:]
+UNKNOWN = "Unknown"
+
+# (C_lo, C_hi, I_lo, I_hi, category) -- EPA Technical Assistance Document (2018)
+BREAKPOINTS = {
+    "pm25": [(0.0, 12.0, 0, 50, 0), (12.1, 35.4, 51, 100, 1), (35.5, 55.4, 101, 150, 2),
+             (55.5, 150.4, 151, 200, 3), (150.5, 250.4, 201, 300, 4), (250.5, 350.4, 301, 400, 5),
+             (350.5, 500.4, 401, 500, 5)],
+    "pm10": [(0, 54, 0, 50, 0), (55, 154, 51, 100, 1), (155, 254, 101, 150, 2), (255, 354, 151, 200, 3),
+             (355, 424, 201, 300, 4), (425, 504, 301, 400, 5), (505, 604, 401, 500, 5)],
+    "no2": [(0, 53, 0, 50, 0), (54, 100, 51, 100, 1), (101, 360, 101, 150, 2), (361, 649, 151, 200, 3),
+            (650, 1249, 201, 300, 4), (1250, 1649, 301, 400, 5), (1650, 2049, 401, 500, 5)],
+    # 1-hour SO2 is only defined up to 304 ppb; the upper rows are EPA's 24-hour ones
+    "so2": [(0, 35, 0, 50, 0), (36, 75, 51, 100, 1), (76, 185, 101, 150, 2), (186, 304, 151, 200, 3),
+            (305, 604, 201, 300, 4), (605, 804, 301, 400, 5), (805, 1004, 401, 500, 5)],
+}
+DECIMALS = {"pm25": 1, "pm10": 0, "no2": 0, "so2": 0}
+
+_TABLES = {name: tuple(np.array(col, dtype=float) for col in zip(*rows)) for name, rows in BREAKPOINTS.items()}
+_NAMES = np.array(CATEGORIES + [UNKNOWN], dtype=object)  # code -1 -> "Unknown"
+
+def _table(pollutant):
+    try:
+        return _TABLES[pollutant]
+    except KeyError:
+        raise ValueError(f"Unknown pollutant {pollutant!r}; expected one of {sorted(_TABLES)}") from None
+
+def _truncate(conc, pollutant):
+    scale = 10.0 ** DECIMALS[pollutant]
+    # the epsilon keeps e.g. 35.4 (35.39999...) from truncating to 35.3
+    return np.floor(np.maximum(conc, 0) * scale + 1e-6) / scale
+
+def _rows(conc, pollutant):
+    """Truncated concentrations and the breakpoint row of each (clipped to the top row)."""
+    c_hi = _table(pollutant)[1]
+    c = _truncate(np.asarray(conc, dtype=float), pollutant)
+    row = np.minimum(np.searchsorted(c_hi, c, side="left"), len(c_hi) - 1)
+    return c, row
+
+def category_codes(conc, pollutant="pm25"):
+    """Index into CATEGORIES per value, -1 for NaN."""
+    c, row = _rows(conc, pollutant)
+    codes = _table(pollutant)[4].astype(np.int8)[row]
+    return np.where(np.isnan(c), -1, codes)
+
+def categorize(conc, pollutant="pm25"):
+    """AQI category name per value, as an object array."""
+    return _NAMES[category_codes(conc, pollutant)]
+
+def categorical(conc, pollutant="pm25"):
+    """categorize() as an ordered pandas Categorical (compact for millions of rows)."""
+    return pd.Categorical.from_codes(category_codes(conc, pollutant), categories=CATEGORIES, ordered=True)
+
+def aqi_index(conc, pollutant="pm25"):
+    """EPA AQI value per concentration (float array, NaN for NaN, capped at 500)."""
+    c, row = _rows(conc, pollutant)
+    c_lo, c_hi, i_lo, i_hi, _ = _table(pollutant)
+    c = np.minimum(c, c_hi[-1])
+    value = (i_hi[row] - i_lo[row]) / (c_hi[row] - c_lo[row]) * (c - c_lo[row]) + i_lo[row]
+    return np.floor(value + 0.5)
+
+def aqi_category(conc, pollutant="pm25"):
+    """Category of a single value."""
+    return str(categorize([conc], pollutant)[0])
+
+def overall(df, columns=None):
+    """Per-row AQI across pollutants: the max sub-index and the pollutant that sets it.
+
+    `columns` maps pollutant -> column name; by default every pollutant whose
+    name (or `<name>_mean`) is a column of `df`.
+    """
+    if columns is None:
+        columns = {}
+        for name in BREAKPOINTS:
+            for col in (name, f"{name}_mean"):
+                if col in df:
+                    columns[name] = col
+                    break
+    if not columns:
+        raise ValueError("No pollutant columns found")
+    names = list(columns)
+    sub = np.column_stack([aqi_index(df[columns[name]].to_numpy(), name) for name in names])
+    all_nan = np.isnan(sub).all(axis=1)
+    best = np.argmax(np.where(np.isnan(sub), -1, sub), axis=1)
+    value = np.where(all_nan, np.nan, sub[np.arange(len(sub)), best])
+    dominant = np.where(all_nan, None, np.array(names, dtype=object)[best])
+    # the category follows from the index value the same way for every pollutant
+    category = np.where(all_nan, -1, np.searchsorted([50, 100, 150, 200, 300, 500], value, side="left"))
+    return pd.DataFrame({"aqi": value, "aqi_pollutant": dominant,
+                         "aqi_category": _NAMES[np.minimum(category, len(CATEGORIES) - 1)]}, index=df.index)
@@ -0,0 +1,128 @@
+"""Content-addressed cache of pipeline step results.
+
+A step's key hashes its module/function name, the source of the `src` package
+(a step's code includes the helpers it imports), its (rendered) params and the content of every file listed in its `inputs`. When a
+later run produces the same key and the recorded `outputs` are still on disk
+with the same content, the step is skipped and its recorded result reused.
+
+The index lives in artifacts/cache/steps.json. File hashes are memoised by
+(size, mtime) so unchanged multi-GB inputs are not re-read on every run.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from .config import ARTIFACTS
+from .utils import get_logger
+
+logger = get_logger()
+
+CACHE_DIR = ARTIFACTS / "cache"
+INDEX_PATH = CACHE_DIR / "steps.json"
+DEFAULT_MAX_ENTRIES = 64
+
+def _hash_file(path, memo):
+    st = path.stat()
+    stamp = f"{st.st_size}:{st.st_mtime_ns}"
+    cached = memo.get(str(path))
+    if cached and cached[0] == stamp:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    memo[str(path)] = [stamp, h.hexdigest()]
+    return memo[str(path)][1]
+
+def hash_path(path, memo=None):
+    """Content hash of a file, or of every file under a directory (e.g. a Parquet dataset)."""
+    memo = {} if memo is None else memo
+    path = Path(path)
+    if not path.exists():
+        return None
+    if path.is_file():
+        return _hash_file(path, memo)
+    h = hashlib.sha256()
+    for p in sorted(q for q in path.rglob("*") if q.is_file()):
+        h.update(str(p.relative_to(path)).encode())
+        h.update(_hash_file(p, memo).encode())
+    return h.hexdigest()
+
+_CODE_HASH = None
+
+def _code_hash():
+    global _CODE_HASH
+    if _CODE_HASH is None:
+        h = hashlib.sha256()
+        for p in sorted(Path(__file__).resolve().parent.glob("*.py")):
+            h.update(p.name.encode())
+            h.update(p.read_bytes())
+        _CODE_HASH = h.hexdigest()
+    return _CODE_HASH
+
+class StepCache:
+    def __init__(self, index_path=INDEX_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.index_path = Path(index_path)
+        self.max_entries = max_entries
+        self.index = {"entries": {}, "files": {}}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path) as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Ignoring unreadable step cache index {self.index_path}")
+
+    def key(self, module, function, params, inputs):
+        payload = {
+            "module": module,
+            "function": function,
+            "source": _code_hash(),
+            "params": params,
+            "inputs": {str(p): hash_path(p, self.index["files"]) for p in inputs},
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha256(blob).hexdigest()
+
+    def lookup(self, key):
+        """Return the recorded entry if every recorded output is unchanged, else None."""
+        entry = self.index["entries"].get(key)
+        if entry is None:
+            return None
+        for path, digest in entry["outputs"].items():
+            if digest is None or hash_path(path, self.index["files"]) != digest:
+                return None
+        entry["last_used"] = time.time()
+        return entry
+
+    def store(self, key, result, outputs):
+        try:
+            json.dumps(result)
+        except TypeError:
+            return  # only JSON-serialisable results can be replayed
+        self.index["entries"][key] = {
+            "result": result,
+            "outputs": {str(p): hash_path(p, self.index["files"]) for p in outputs},
+            "created": time.time(),
+            "last_used": time.time(),
+        }
+        self._evict()
+
+    def _evict(self):
+        entries = self.index["entries"]
+        if len(entries) > self.max_entries:
+            # least recently used first
+            for key in sorted(entries, key=lambda k: entries[k]["last_used"])[:len(entries) - self.max_entries]:
+                del entries[key]
+        self.index["files"] = {p: v for p, v in self.index["files"].items() if Path(p).exists()}
+
+    def save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(f".{os.getpid()}.tmp")  # concurrent pipeline runs each save
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def clear(self):
+        self.index = {"entries": {}, "files": {}}
+        self.save()
@@ -1,3 +1,5 @@
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -10,3 +12,15 @@ LOG_DIR = ROOT / "logs"
 
 for d in [ARTIFACTS, DATA_DIR, MODELS_DIR, PRED_DIR, REPORT_DIR, LOG_DIR]:
     d.mkdir(parents=True, exist_ok=True)
+
+# default on-disk format for data artifacts ("parquet" needs pyarrow, "csv" always works)
+STORAGE_FORMAT = os.environ.get("AQ_STORAGE_FORMAT") or ("parquet" if find_spec("pyarrow") else "csv")
+
+def data_path(name, fmt=None):
+    """Path of a data artifact, e.g. data_path("processed") -> artifacts/data/processed.parquet."""
+    return DATA_DIR / f"{name}.{fmt or STORAGE_FORMAT}"
+
+SENSOR_PATH = data_path("sensor_readings")
+WEATHER_PATH = data_path("weather")
+PROCESSED_PATH = data_path("processed")
+PREDICTION_DB = PRED_DIR / "predictions.sqlite"
@@ -0,0 +1,133 @@
+"""Dependency graph for pipeline.yaml steps and a concurrent executor.
+
+A step's dependencies are its explicit `depends_on` names plus every step whose
+`outputs` appear in its `inputs`. Steps that declare none of `depends_on`,
+`inputs` or `outputs` keep the old behaviour and depend on the step listed
+before them. A step with `run_if: <step>.<key>` also depends on that step.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from .utils import get_logger
+
+logger = get_logger()
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+def as_list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+def build_graph(steps):
+    """Return {step name: set of step names it depends on}, in yaml order."""
+    names = [step["name"] for step in steps]
+    if len(set(names)) != len(names):
+        raise ValueError("Pipeline step names must be unique")
+    producers = {}
+    for step in steps:
+        for out in as_list(step.get("outputs")):
+            producers[out] = step["name"]
+    graph = {}
+    prev = None
+    for step in steps:
+        name = step["name"]
+        if any(key in step for key in ("depends_on", "inputs", "outputs")):
+            deps = set(as_list(step.get("depends_on")))
+            deps |= {producers[i] for i in as_list(step.get("inputs")) if producers.get(i, name) != name}
+        else:
+            deps = {prev} if prev else set()
+        if condition_step(step):
+            deps.add(condition_step(step))
+        unknown = deps - set(names)
+        if unknown:
+            raise ValueError(f"Step {name} depends on unknown step(s): {sorted(unknown)}")
+        graph[name] = deps
+        prev = name
+    topological_order(graph)
+    return graph
+
+def condition_step(step):
+    """The step a `run_if: [not] <step>[.<key>...]` condition reads, or None."""
+    cond = step.get("run_if")
+    return str(cond).removeprefix("not ").strip().split(".")[0] if cond else None
+
+def condition_met(cond, results):
+    """Evaluate a `run_if` condition against {step name: result}: the value at the path is truthy."""
+    negate = cond.startswith("not ")
+    name, *keys = cond.removeprefix("not ").strip().split(".")
+    value = results.get(name)
+    for key in keys:
+        value = value.get(key) if isinstance(value, dict) else None
+    return bool(value) != negate
+
+def topological_order(graph):
+    order, done = [], set()
+    remaining = dict(graph)
+    while remaining:
+        ready = [n for n, deps in remaining.items() if deps <= done]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle among {sorted(remaining)}")
+        for n in ready:
+            order.append(n)
+            done.add(n)
+            del remaining[n]
+    return order
+
+def _timed(fn, args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def run_dag(steps, task, max_workers=1, executor="thread", lookup=None, record=None):
+    """Run `task(step)` for every step once its dependencies succeeded.
+
+    `task` returns `(fn, args)` to execute in the pool (picklable for the process
+    executor). Ready steps run concurrently up to `max_workers`. When a step
+    fails, nothing new is started, running steps are awaited and the first error
+    is re-raised. `lookup(step)` may return a `(result,)` tuple to skip a ready
+    step (step cache, `run_if`); `record(step, result)` is called for every step that ran.
+    Both are called from the scheduling thread. Returns ({name: result}, {name:
+    seconds}) in yaml order.
+    """
+    graph = build_graph(steps)
+    by_name = {step["name"]: step for step in steps}
+    results, timings = {}, {}
+    started, done = set(), set()
+    failure = None
+    with EXECUTORS[executor](max_workers=max(1, int(max_workers))) as pool:
+        running = {}
+        while True:
+            progress = failure is None
+            while progress:
+                progress = False
+                for name, deps in graph.items():
+                    if name in started or not deps <= done:
+                        continue
+                    started.add(name)
+                    hit = lookup(by_name[name]) if lookup else None
+                    if hit is not None:
+                        results[name], timings[name] = hit[0], 0.0
+                        done.add(name)
+                        progress = True  # dependents may be ready now
+                        logger.info(f"Step {name} skipped")
+                        continue
+                    fn, args = task(by_name[name])
+                    running[pool.submit(_timed, fn, args)] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                try:
+                    results[name], timings[name] = fut.result()
+                    done.add(name)
+                    logger.info(f"Step {name} finished in {timings[name]:.2f}s")
+                    if record:
+                        record(by_name[name], results[name])
+                except Exception as e:
+                    logger.exception(f"Step {name} failed: {e}")
+                    if failure is None:
+                        failure = e
+    if failure is not None:
+        raise failure
+    return {name: results[name] for name in graph}, timings
@@ -1,9 +1,8 @@
 # src/dashboard.py
 import streamlit as st
-import pandas as pd
-import numpy as np
 from pathlib import Path
 import glob
+import sys
 import altair as alt
 from datetime import datetime
 import time
@@ -20,44 +19,12 @@ if st.sidebar.button("Refresh dashboard now"):
         # fallback: modify query params to force Streamlit to re-run the script
         st.experimental_set_query_params(_refresh=int(time.time()))
 
-ARTIFACTS = Path(__file__).resolve().parents[1] / "artifacts"
-PROCESSED = ARTIFACTS / "data" / "processed.csv"
-PRED_DIR = ARTIFACTS / "predictions"
-
-# ---------- helpers ----------
-AQI_BREAKPOINTS = [
-    (0, 12, "Good"),
-    (12.1, 35.4, "Moderate"),
-    (35.5, 55.4, "Unhealthy for Sensitive Groups"),
-    (55.5, 150.4, "Unhealthy"),
-    (150.5, 250.4, "Very Unhealthy"),
-    (250.5, 500, "Hazardous"),
-]
-
-def aqi_category(pm25):
-    for low, high, name in AQI_BREAKPOINTS:
-        if low <= pm25 <= high:
-            return name
-    return "Unknown"
-
-def latest_prediction_file():
-    files = sorted(glob.glob(str(PRED_DIR / "prediction_*.csv")))
-    return files[-1] if files else None
-
-def load_processed():
-    if not PROCESSED.exists():
-        return None
-    df = pd.read_csv(PROCESSED, parse_dates=["date"])
-    # ensure date column dtype is date (not datetime)
-    df["date"] = pd.to_datetime(df["date"]).dt.date
-    return df
-
-def load_prediction(path):
-    if path is None:
-        return None
-    df = pd.read_csv(path, parse_dates=["date"])
-    df["date"] = pd.to_datetime(df["date"]).dt.date
-    return df
+# `streamlit run src/dashboard.py` puts src/ (not the repo root) on sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.config import ARTIFACTS
+from src.aqi import UNHEALTHY, aqi_category
+from src.dashboard_data import (forecast_history, latest_prediction_file, load_prediction, map_frame,
+                                processed_index, step_history, store_latest)
 
 # optional static lat/lon mapping for simple map (edit coordinates to match real locations)
 DEFAULT_LOCATION_COORDS = {
@@ -72,26 +39,34 @@ DEFAULT_LOCATION_COORDS = {
 st.title("Air Quality Monitoring & Prediction — Dashboard")
 st.caption("Local, YAML-driven pipeline outputs (simulated data)")
 
-processed = load_processed()
-pred_file = latest_prediction_file()
-prediction = load_prediction(pred_file)
+# cached across reruns and sessions; re-read only when the files change (src/dashboard_data.py)
+index = processed_index()
+processed = index.df if index is not None else None
+# the prediction store replaces the per-day files; fall back to the newest file until it exists
+prediction = store_latest()
+pred_file = None if prediction is not None else latest_prediction_file()
+if prediction is None:
+    prediction = load_prediction(pred_file)
 
 col1, col2 = st.columns([2, 1])
 
 with col2:
-    st.markdown("### Latest prediction file")
+    st.markdown("### Latest predictions")
     if pred_file:
         st.write(Path(pred_file).name)
         st.download_button("Download latest prediction CSV", data=open(pred_file, "rb"), file_name=Path(pred_file).name)
+    elif prediction is not None:
+        st.write("Prediction store, forecasts for", prediction["date"].max().date())
+        st.download_button("Download latest predictions CSV", data=prediction.to_csv(index=False),
+                           file_name="predictions_latest.csv")
     else:
         st.info("No prediction file found. Run the pipeline to generate predictions.")
 
     st.markdown("### Quick stats")
     if processed is not None and not processed.empty:
-        latest_date = processed["date"].max()
-        st.write("Data last processed for:", latest_date)
-        st.write("Locations:", processed["location"].nunique())
-        st.write("Days of data:", processed["date"].nunique())
+        st.write("Data last processed for:", index.max_date)
+        st.write("Locations:", len(index.locations))
+        st.write("Days of data:", index.n_days)
     else:
         st.info("No processed data found. Run the pipeline to create processed.csv")
 
@@ -100,17 +75,14 @@ with col1:
         st.warning("No processed data available. Run the pipeline (python -m src.pipeline_runner) first.")
     else:
         # Location selector
-        locations = sorted(processed["location"].unique())
-        sel_loc = st.selectbox("Select location", options=locations, index=0)
+        sel_loc = st.selectbox("Select location", options=index.locations, index=0)
 
         # Date range
-        min_date = processed["date"].min()
-        max_date = processed["date"].max()
+        min_date, max_date = index.min_date, index.max_date
         date_range = st.date_input("Date range", value=(min_date, max_date), min_value=min_date, max_value=max_date)
 
-        # filter data
-        mask = (processed["location"] == sel_loc) & (processed["date"] >= date_range[0]) & (processed["date"] <= date_range[1])
-        subset = processed[mask].copy()
+        # filter data (row range lookup on the pre-sorted index, no full-table mask)
+        subset = index.select(sel_loc, date_range[0], date_range[-1])
 
         st.markdown(f"### PM2.5 trend for {sel_loc}")
         if subset.empty:
@@ -128,7 +100,7 @@ with col1:
             st.altair_chart(line, width="stretch")
 
             # show last observed and predicted (if prediction exists)
-            last_obs = subset.sort_values("date").tail(1).iloc[0]
+            last_obs = subset.iloc[-1]
             st.write("Latest observed PM2.5 (mean):", round(last_obs["pm25_mean"], 2))
             if prediction is not None:
                 pred_row = prediction[prediction["location"] == sel_loc]
@@ -138,38 +110,48 @@ with col1:
                 else:
                     st.info("No prediction for this location in latest file.")
 
+        # forecast history from the prediction store
+        history = forecast_history(sel_loc, date_range[0], date_range[-1], index=index)
+        if history is not None and not history.empty:
+            st.markdown(f"### Forecast vs. actual for {sel_loc}")
+            hist_df = history[["forecast_date", "pm25_pred", "pm25_actual"]].melt(
+                id_vars=["forecast_date"], var_name="series", value_name="value").dropna()
+            hist_chart = alt.Chart(hist_df).mark_line(point=True).encode(
+                x=alt.X("forecast_date:T", title="Forecast date"),
+                y=alt.Y("value:Q", title="PM2.5"),
+                color="series:N",
+                tooltip=["forecast_date:T", "series:N", "value:Q"]
+            ).interactive()
+            st.altair_chart(hist_chart, width="stretch")
+            scored = history.dropna(subset=["error"])
+            if not scored.empty:
+                st.write("Mean absolute error:", round(float(scored["error"].abs().mean()), 2),
+                         f"over {len(scored)} forecasts")
+
         # show table of recent processed rows for location
         st.markdown("Recent processed rows")
-        st.dataframe(subset.sort_values("date", ascending=False).head(10))
+        st.dataframe(subset.iloc[::-1].head(10))
 
 # ---------- global predictions table ----------
 st.markdown("## Latest Predictions — All locations")
 if prediction is None:
     st.info("No predictions available. Run pipeline to generate predictions.")
 else:
-    # decorate with AQI
-    prediction["aqi_category"] = prediction["pm25_pred_next_day"].apply(aqi_category)
-    st.dataframe(prediction.sort_values("pm25_pred_next_day", ascending=False).reset_index(drop=True))
+    # already decorated with AQI categories and sorted by forecast
+    st.dataframe(prediction)
 
     # show locations needing attention
-    warn = prediction[prediction["aqi_category"].isin(["Unhealthy","Very Unhealthy","Hazardous","Unhealthy for Sensitive Groups"])]
+    warn = prediction[prediction["aqi_category"].isin(UNHEALTHY)]
     st.markdown("### Locations needing attention (Unhealthy or worse)")
     if warn.empty:
         st.success("No locations currently in unhealthy categories based on predictions.")
     else:
-        st.table(warn[["location", "pm25_pred_next_day", "aqi_category"]])
+        st.table(warn[["location", "pm25_pred_next_day", "aqi", "aqi_category"]])
 
     # small map (approx) using default coords (if available)
-    coords = []
-    for _, row in prediction.iterrows():
-        loc = row["location"]
-        if loc in DEFAULT_LOCATION_COORDS:
-            lat, lon = DEFAULT_LOCATION_COORDS[loc]
-            coords.append({"lat": lat, "lon": lon, "pm25": row["pm25_pred_next_day"], "loc": loc})
-    if coords:
+    map_df = map_frame(prediction, DEFAULT_LOCATION_COORDS)
+    if not map_df.empty:
         st.markdown("### Map (approx locations)")
-        map_df = pd.DataFrame(coords)
-        map_df = map_df.rename(columns={"lat": "lat", "lon": "lon"})
         st.map(map_df[["lat", "lon"]])
 
 # ---------- model metrics & history ----------
@@ -183,5 +165,25 @@ if report_files:
 else:
     st.info("No model reports found. Consider saving model metrics in artifacts/reports/ after training.")
 
+# ---------- pipeline step metrics ----------
+st.markdown("## Pipeline step timings")
+steps = step_history()
+if steps is None or steps.empty:
+    st.info("No step metrics yet. They are written to artifacts/reports/metrics/ on every pipeline run.")
+else:
+    metric = st.selectbox("Metric", options=["wall_s", "cpu_s", "peak_rss_mb", "rows_in", "rows_out"], index=0)
+    ran = steps[(steps["cached"] == 0) & (steps["skipped"] == 0)]
+    trend = alt.Chart(ran).mark_line(point=True).encode(
+        x=alt.X("started:T", title="Run started"),
+        y=alt.Y(f"{metric}:Q", title=metric),
+        color="step:N",
+        tooltip=["run_id:N", "step:N", f"{metric}:Q"]
+    ).interactive()
+    st.altair_chart(trend, width="stretch")
+    st.markdown("Last run")
+    last = steps[steps["run_id"] == steps["run_id"].iloc[-1]]
+    st.dataframe(last[["step", "cached", "skipped", "wall_s", "cpu_s", "peak_rss_mb", "rows_in", "rows_out",
+                       "bytes_in", "bytes_out"]].reset_index(drop=True))
+
 st.markdown("---")
 st.caption(f"Dashboard last refreshed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -0,0 +1,146 @@
+"""Cached data access for the Streamlit dashboard.
+
+Streamlit re-executes dashboard.py on every widget interaction. Everything
+here is cached at module level, which is shared by all sessions of the server
+process, and keyed by file stamps (mtime + size; for directories, the newest
+file under them). An unchanged artifact is never re-read or re-indexed, and
+the predictions directory is only re-listed when its own mtime changes.
+"""
+import json
+import threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from . import prediction_store
+from .aqi import aqi_index, categorize
+from .config import PRED_DIR, PREDICTION_DB, PROCESSED_PATH, data_path
+from .metrics import HISTORY_PATH
+from .schema import conform
+from .storage import BACKENDS, read_table
+
+_CACHE = {}
+_LOCK = threading.Lock()
+
+def _stamp(path, deep=True):
+    path = Path(path)
+    if not path.exists():
+        return None
+    if path.is_dir() and not deep:
+        return path.stat().st_mtime_ns
+    if path.is_dir():
+        stats = [p.stat() for p in path.rglob("*") if p.is_file()]
+        return (path.stat().st_mtime_ns, max((s.st_mtime_ns for s in stats), default=0), sum(s.st_size for s in stats))
+    st = path.stat()
+    return (st.st_mtime_ns, st.st_size)
+
+def cached(kind, path, loader, deep=True):
+    """`loader(path)`, recomputed only when the stamp of `path` changes."""
+    key = (kind, str(path))
+    stamp = _stamp(path, deep)
+    with _LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None and hit[0] == stamp:
+            return hit[1]
+    value = loader(path) if stamp is not None else None
+    with _LOCK:
+        _CACHE[key] = (stamp, value)
+    return value
+
+def clear_cache():
+    with _LOCK:
+        _CACHE.clear()
+
+class ProcessedIndex:
+    """processed data sorted by (location, date) with a row range per location."""
+
+    def __init__(self, df):
+        df = conform(df.copy(), "processed")
+        df["date"] = df["date"].dt.normalize()
+        self.df = df.sort_values(["location", "date"], kind="stable").reset_index(drop=True)
+        codes, self.locations = pd.factorize(self.df["location"], sort=True)
+        self.locations = list(self.locations)
+        bounds = np.searchsorted(codes, np.arange(len(self.locations) + 1))
+        self.ranges = {loc: (bounds[i], bounds[i + 1]) for i, loc in enumerate(self.locations)}
+        self.dates = self.df["date"].to_numpy()
+        self.min_date = self.df["date"].min().date() if len(self.df) else None
+        self.max_date = self.df["date"].max().date() if len(self.df) else None
+        self.n_days = self.df["date"].nunique()
+
+    def select(self, location, start=None, end=None):
+        """Rows for `location` with start <= date <= end, in date order."""
+        base, stop = self.ranges.get(location, (0, 0))
+        dates = self.dates[base:stop]
+        lo = base + (np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side="left") if start is not None else 0)
+        hi = base + (np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side="right") if end is not None else len(dates))
+        return self.df.iloc[lo:hi]
+
+def _processed_path():
+    # fall back to the CSV export when the configured format has not been produced yet
+    return PROCESSED_PATH if PROCESSED_PATH.exists() else data_path("processed", "csv")
+
+def processed_index(path=None):
+    return cached("processed", path or _processed_path(), lambda p: ProcessedIndex(read_table(p)))
+
+def _list_predictions(pred_dir):
+    return sorted(str(p) for p in Path(pred_dir).glob("prediction_*") if p.suffix in BACKENDS)
+
+def prediction_files(pred_dir=PRED_DIR):
+    # a directory's mtime changes when entries are added or removed
+    return cached("listing", pred_dir, _list_predictions, deep=False) or []
+
+def latest_prediction_file(pred_dir=PRED_DIR):
+    files = prediction_files(pred_dir)
+    return files[-1] if files else None
+
+def _load_prediction(path):
+    df = read_table(path)
+    df["aqi"] = aqi_index(df["pm25_pred_next_day"])
+    df["aqi_category"] = categorize(df["pm25_pred_next_day"])
+    return conform(df, "predictions").sort_values("pm25_pred_next_day", ascending=False).reset_index(drop=True)
+
+def load_prediction(path):
+    """Prediction file with an `aqi_category` column, highest forecast first."""
+    if path is None:
+        return None
+    return cached("prediction", path, _load_prediction)
+
+def _store_latest(db_path):
+    df = prediction_store.latest(db_path)
+    df = df.rename(columns={"issued_date": "date", "pm25_pred": "pm25_pred_next_day"})
+    df["aqi"] = aqi_index(df["pm25_pred_next_day"])
+    df["aqi_category"] = categorize(df["pm25_pred_next_day"])
+    df = conform(df[["location", "date", "pm25_pred_next_day", "aqi", "aqi_category"]], "predictions")
+    return df.sort_values("pm25_pred_next_day", ascending=False).reset_index(drop=True)
+
+def store_latest(db_path=PREDICTION_DB):
+    """Latest forecast per location from the prediction store, in load_prediction's layout and order."""
+    return cached("store_latest", db_path, _store_latest)
+
+def forecast_history(location, start=None, end=None, db_path=PREDICTION_DB, index=None):
+    """Forecasts for `location` next to the observed pm25_mean of the forecast day.
+
+    An indexed SQLite range query; the actuals come from the cached processed index.
+    """
+    if not Path(db_path).exists():
+        return None
+    actuals = index.select(location, start, end) if index is not None else PROCESSED_PATH
+    return prediction_store.forecast_vs_actual(db_path, actuals, location, start, end)
+
+def _load_step_history(path):
+    with open(path) as f:
+        df = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+    if not df.empty:
+        df["started"] = pd.to_datetime(df["started"])
+        df["peak_rss_mb"] = df["peak_rss_bytes"] / 2**20
+        df["skipped"] = df["skipped"].fillna(0).astype(int) if "skipped" in df else 0
+    return df
+
+def step_history(path=HISTORY_PATH):
+    """One row per step per pipeline run (src/metrics.py), or None before the first run."""
+    return cached("step_history", path, _load_step_history)
+
+def map_frame(prediction, coords):
+    """lat/lon/pm25/loc rows for predictions whose location has coordinates."""
+    table = pd.DataFrame([(loc, lat, lon) for loc, (lat, lon) in coords.items()], columns=["loc", "lat", "lon"])
+    out = prediction[["location", "pm25_pred_next_day"]].merge(table, left_on="location", right_on="loc")
+    return out.rename(columns={"pm25_pred_next_day": "pm25"})[["lat", "lon", "pm25", "loc"]]
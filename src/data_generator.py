@@ -1,60 +1,110 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from .config import DATA_DIR
-from pathlib import Path
-import random
+from .config import SENSOR_PATH, WEATHER_PATH
+from .schema import conform
+from .storage import open_writer
 
-def _date_range(days, freq='hourly'):
-    end = datetime.now().replace(minute=0, second=0, microsecond=0)
+# names used when `locations` is given as a count; extra stations become Loc_<n>
+DEFAULT_LOCATIONS = ["Banglore", "Tokyo", "Hallstat", "Zurich", "Amsterdam"]
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+def _date_range(days, freq='hourly', as_of=None):
+    # up to the current hour, or up to the end of day `as_of` (YYYY-MM-DD, e.g. a backfilled run date)
+    end = pd.Timestamp(as_of).to_pydatetime() if as_of else datetime.now().replace(minute=0, second=0, microsecond=0)
     if freq == "hourly":
         start = end - timedelta(days=days-1)
-        rng = pd.date_range(start=start, end=end + timedelta(hours=23), freq='H')  # cover full days
+        rng = pd.date_range(start=start, end=end + timedelta(hours=23), freq='h')  # cover full days
     else:
         start = (end.date() - timedelta(days=days-1))
         rng = pd.date_range(start=start, periods=days, freq='D')
     return rng
 
-def generate_sensor_readings(days=30, locations=5, freq="hourly", out_path=None):
-    dates = _date_range(days, freq=freq)
-    rows = []
-# Replace dummy Loc_1..Loc_n with actual city names
-    locations_list = ["Banglore", "Tokyo", "Hallstat", "Zurich", "Amsterdam"]
-    for loc in locations_list:
-        # base pollution level varies by location
-        base_pm25 = random.uniform(20, 70)
-        for ts in dates:
-            # simulate diurnal pattern + noise
-            hour = ts.hour
-            diurnal = 10 * np.sin((hour / 24) * 2 * np.pi)  # rough day-night pattern
-            pm25 = max(0, base_pm25 + diurnal + np.random.normal(0, 5))
-            pm10 = pm25 * (1.2 + np.random.normal(0, 0.05))
-            no2 = max(0, 20 + np.random.normal(0,5) + (pm25/10))
-            so2 = max(0, 5 + np.random.normal(0,2))
-            rows.append({"timestamp": ts, "location": loc, "pm25": round(pm25,2),
-                         "pm10": round(pm10,2), "no2": round(no2,2), "so2": round(so2,2)})
-    df = pd.DataFrame(rows)
-    out_path = out_path or (DATA_DIR / "sensor_readings.csv")
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out_path, index=False)
+def resolve_locations(locations=5):
+    """Return the list of station names for an int count or an explicit list."""
+    if isinstance(locations, (list, tuple)):
+        return [str(l) for l in locations]
+    n = int(locations)
+    names = DEFAULT_LOCATIONS[:n]
+    return names + [f"Loc_{i}" for i in range(len(names) + 1, n + 1)]
+
+def _time_chunks(dates, n_locations, chunk_rows):
+    """Yield slices of `dates` so that each chunk holds about `chunk_rows` rows.
+
+    Chunks are time-major (a block of timestamps x every location), so the
+    written files are ordered by timestamp, the way sensors actually report.
+    """
+    step = max(1, int(chunk_rows or DEFAULT_CHUNK_ROWS) // max(1, n_locations))
+    for i in range(0, len(dates), step):
+        yield dates[i:i + step]
+
+def _write_chunks(chunks, out_path, partition_cols, table):
+    with open_writer(out_path, partition_cols=partition_cols) as writer:
+        for df in chunks:
+            writer.write(conform(df, table))
     return str(out_path)
 
-def generate_weather_data(days=30, locations=5, out_path=None):
+def _frame(dates, names, columns):
+    # expand a (timestamps x locations) block into long rows, time-major;
+    # location is built from codes so no per-row Python strings are created
+    n = len(names)
+    locs = pd.Categorical.from_codes(np.tile(np.arange(n), len(dates)), categories=names)
+    df = pd.DataFrame({"timestamp": np.repeat(dates.to_numpy(), n), "location": locs})
+    for name, values in columns.items():
+        df[name] = values
+    return df
+
+def iter_sensor_readings(days=30, locations=5, freq="hourly", seed=None, chunk_rows=DEFAULT_CHUNK_ROWS, as_of=None):
+    """Yield sensor readings as DataFrames of roughly `chunk_rows` rows."""
+    rng = np.random.default_rng(seed)
+    names = resolve_locations(locations)
+    n = len(names)
+    # base pollution level varies by location
+    base_pm25 = rng.uniform(20, 70, size=n)
+    for dates in _time_chunks(_date_range(days, freq=freq, as_of=as_of), n, chunk_rows):
+        shape = (len(dates), n)
+        # simulate diurnal pattern + noise
+        diurnal = 10 * np.sin((dates.hour.to_numpy() / 24) * 2 * np.pi)  # rough day-night pattern
+        pm25 = np.maximum(0, base_pm25[None, :] + diurnal[:, None] + rng.normal(0, 5, shape))
+        pm10 = pm25 * (1.2 + rng.normal(0, 0.05, shape))
+        no2 = np.maximum(0, 20 + rng.normal(0, 5, shape) + (pm25 / 10))
+        so2 = np.maximum(0, 5 + rng.normal(0, 2, shape))
+        yield _frame(dates, names, {
+            "pm25": np.round(pm25, 2).ravel(),
+            "pm10": np.round(pm10, 2).ravel(),
+            "no2": np.round(no2, 2).ravel(),
+            "so2": np.round(so2, 2).ravel(),
+        })
+
+def iter_weather_data(days=30, locations=5, seed=None, chunk_rows=DEFAULT_CHUNK_ROWS, as_of=None):
+    """Yield weather rows as DataFrames of roughly `chunk_rows` rows."""
+    rng = np.random.default_rng(seed)
+    names = resolve_locations(locations)
+    n = len(names)
+    for dates in _time_chunks(_date_range(days, freq='hourly', as_of=as_of), n, chunk_rows):
+        shape = (len(dates), n)
+        season = 10 * np.sin((dates.dayofyear.to_numpy() / 365) * 2 * np.pi)
+        diurnal = 20 * np.sin((dates.hour.to_numpy() / 24) * 2 * np.pi)
+        temp = 15 + season[:, None] + rng.normal(0, 2, shape)
+        humidity = np.clip(40 + diurnal[:, None] + rng.normal(0, 5, shape), 5, 100)
+        wind_speed = np.maximum(0, rng.normal(3, 1.5, shape))
+        precipitation = np.maximum(0, rng.exponential(0.1, shape) - 0.05)  # mostly small chance
+        yield _frame(dates, names, {
+            "temp": np.round(temp, 2).ravel(),
+            "humidity": np.round(humidity, 1).ravel(),
+            "wind_speed": np.round(wind_speed, 2).ravel(),
+            "precip": np.round(precipitation, 3).ravel(),
+        })
+
+def generate_sensor_readings(days=30, locations=5, freq="hourly", out_path=None, seed=None,
+                             chunk_rows=DEFAULT_CHUNK_ROWS, partition_cols=None, as_of=None):
+    out_path = out_path or SENSOR_PATH
+    chunks = iter_sensor_readings(days, locations, freq=freq, seed=seed, chunk_rows=chunk_rows, as_of=as_of)
+    return _write_chunks(chunks, out_path, partition_cols, table="sensor")
+
+def generate_weather_data(days=30, locations=5, out_path=None, seed=None,
+                          chunk_rows=DEFAULT_CHUNK_ROWS, partition_cols=None, as_of=None):
     # simple weather features correlated with AQI
-    dates = _date_range(days, freq='hourly')
-    rows = []
-    locations_list = ["Banglore", "Tokyo", "Hallstat", "Zurich", "Amsterdam"]
-    for loc in locations_list:
-        for ts in dates:
-            temp = 15 + 10 * np.sin((ts.timetuple().tm_yday / 365) * 2 * np.pi) + np.random.normal(0,2)
-            humidity = np.clip(40 + 20*np.sin((ts.hour/24)*2*np.pi) + np.random.normal(0,5), 5, 100)
-            wind_speed = max(0, np.random.normal(3,1.5))
-            precipitation = max(0, np.random.exponential(0.1) - 0.05)  # mostly small chance
-            rows.append({"timestamp": ts, "location": loc, "temp": round(temp,2),
-                         "humidity": round(humidity,1), "wind_speed": round(wind_speed,2),
-                         "precip": round(precipitation,3)})
-    df = pd.DataFrame(rows)
-    out_path = out_path or (DATA_DIR / "weather.csv")
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out_path, index=False)
-    return str(out_path)
\ No newline at end of file
+    out_path = out_path or WEATHER_PATH
+    chunks = iter_weather_data(days, locations, seed=seed, chunk_rows=chunk_rows, as_of=as_of)
+    return _write_chunks(chunks, out_path, partition_cols, table="weather")
@@ -1,45 +1,253 @@
+import json
 import pandas as pd
 from pathlib import Path
+from .features import build_features, lookback
+from .schema import SENSOR_COLUMNS, WEATHER_COLUMNS, conform
+from .storage import apply_filters, iter_table, partitioned, read_table, write_partitions, write_table
 from .utils import get_logger
 
 logger = get_logger()
 
-def run_etl(sensor_path, weather_path, out_path, agg_freq="daily"):
-    # read
-    s = pd.read_csv(sensor_path, parse_dates=["timestamp"])
-    w = pd.read_csv(weather_path, parse_dates=["timestamp"])
+def _watermark_path(out_path, state_path=None):
+    return Path(state_path) if state_path else Path(f"{out_path}.watermark.json")
+
+def _load_watermarks(path):
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return {loc: pd.Timestamp(d) for loc, d in json.load(f).items()}
+
+def _save_watermarks(out, path, previous=None):
+    # `out` may hold only the locations that were updated; the others keep their watermark
+    last = out.groupby("location", observed=True)["date"].max()
+    marks = {str(loc): d.strftime("%Y-%m-%d") for loc, d in (previous or {}).items()}
+    marks.update({str(loc): d.strftime("%Y-%m-%d") for loc, d in last.items()})
+    with open(path, "w") as f:
+        json.dump(marks, f, indent=2)
+
+def _until(as_of):
+    """Filter keeping raw rows up to the end of day `as_of` (YYYY-MM-DD); [] for everything."""
+    return [("timestamp", "<", pd.Timestamp(as_of) + pd.Timedelta(days=1))] if as_of else []
+
+def _merge(s, w):
     # merge on nearest timestamp per hour (they align) and location
     df = pd.merge(s, w, on=["timestamp","location"], how="left")
     # create datetime features
-    df["date"] = df["timestamp"].dt.date
+    df["date"] = df["timestamp"].dt.normalize()
     df["hour"] = df["timestamp"].dt.hour
+    return df
+
+def _aggregate_daily(df):
+    agg = df.groupby(["location","date"], observed=True).agg(
+        pm25_mean=("pm25","mean"),
+        pm25_max=("pm25","max"),
+        pm10_mean=("pm10","mean"),
+        no2_mean=("no2","mean"),
+        so2_mean=("so2","mean"),
+        temp_mean=("temp","mean"),
+        humidity_mean=("humidity","mean"),
+        wind_speed_mean=("wind_speed","mean"),
+        precip_sum=("precip","sum")
+    ).reset_index()
+    return conform(agg, "processed")
+
+def _incremental_daily(sensor_path, weather_path, out_path, watermarks, features=None, as_of=None, by_location=False):
+    """Aggregate only days at or after each location's watermark and upsert them.
+
+    The watermark day itself is recomputed because it may have been partial on
+    the previous run. Only the (location, date) rows recomputed here replace
+    existing ones; stations without new raw rows keep all of theirs. Features
+    for the new days are computed from the last `lookback(features)` processed
+    days, which gives the same values as a rebuild.
+
+    With `by_location` (the table is partitioned by location) only the
+    partitions of locations that have new rows are read and returned, for
+    write_partitions; otherwise the whole table is. Returns (rows to write or
+    None when nothing is new, number of daily rows recomputed).
+    """
+    since = [("timestamp", ">=", min(watermarks.values()))] + _until(as_of)
+    s = conform(read_table(sensor_path, filters=since), "sensor")
+    w = conform(read_table(weather_path, filters=since), "weather")
+    new_locs = sorted(set(s["location"].astype(str)) - set(watermarks))
+    if new_locs:
+        # stations never processed before need their whole history
+        only_new = [("location", "in", new_locs)] + _until(as_of)
+        s = conform(pd.concat([s[~s["location"].astype(str).isin(new_locs)],
+                               read_table(sensor_path, filters=only_new)]), "sensor")
+        w = conform(pd.concat([w[~w["location"].astype(str).isin(new_locs)],
+                               read_table(weather_path, filters=only_new)]), "weather")
+    df = _merge(s, w)
+    cutoff = df["location"].astype(str).map(watermarks)
+    df = df[cutoff.isna() | (df["date"] >= cutoff)]
+    fresh = _aggregate_daily(df)
+    if fresh.empty:
+        return None, 0
+    fresh["location"] = fresh["location"].astype(str)
+
+    affected = [("location", "in", sorted(fresh["location"].unique()))] if by_location else None
+    existing = conform(read_table(out_path, filters=affected), "processed")
+    existing["location"] = existing["location"].astype(str)
+    # replace only the recomputed (location, date) rows; features need the days before each location's first
+    start = fresh.groupby("location")["date"].min()
+    keys = pd.MultiIndex.from_frame(existing[["location", "date"]])
+    prior = existing[~keys.isin(pd.MultiIndex.from_frame(fresh[["location", "date"]]))]
+    before = prior["date"] < prior["location"].map(start)
+    tail = prior[before].sort_values(["location", "date"]).groupby("location").tail(lookback(features))
+    recomputed = build_features(pd.concat([tail[fresh.columns].assign(_tail=True), fresh.assign(_tail=False)],
+                                          ignore_index=True), features)
+    # the tail rows were only context for the windows; keep the recomputed days
+    recomputed = recomputed[~recomputed.pop("_tail").astype(bool)]
+    out = pd.concat([prior, recomputed[prior.columns]], ignore_index=True)
+    return out.sort_values(["location", "date"], ignore_index=True), len(fresh)
+
+def _empty_daily():
+    """A daily table with no rows and the columns of _aggregate_daily."""
+    # an empty date_range has the default datetime unit, like the generated timestamps
+    keys = {"timestamp": pd.Series(pd.date_range("2000-01-01", periods=0, freq="h")),
+            "location": pd.Series(dtype=object)}
+    s = pd.DataFrame({**keys, **{c: pd.Series(dtype="float32") for c in SENSOR_COLUMNS}})
+    w = pd.DataFrame({**keys, **{c: pd.Series(dtype="float32") for c in WEATHER_COLUMNS}})
+    return _aggregate_daily(_merge(conform(s, "sensor"), conform(w, "weather")))
+
+def _time_ordered(chunks, name):
+    # pass chunks through, failing fast if timestamps ever go backwards
+    last = None
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        ts = chunk["timestamp"]
+        if not ts.is_monotonic_increasing or (last is not None and ts.iloc[0] < last):
+            raise ValueError(f"Streaming ETL needs {name} sorted by timestamp")
+        last = ts.iloc[-1]
+        yield chunk
+
+class _FeatureStream:
+    """Computes features for daily rows as days close, carrying a per-location tail."""
+
+    def __init__(self, features=None, keep=True):
+        self.features = features
+        self.keep = keep
+        self.tail = None
+        self.parts = []
+
+    def push(self, daily):
+        """Featurized `daily` rows (kept for `result()` unless keep=False)."""
+        if daily.empty:
+            return daily
+        if self.tail is None:
+            frame = daily.assign(_tail=False)
+        else:
+            frame = pd.concat([self.tail.assign(_tail=True), daily.assign(_tail=False)], ignore_index=True)
+        frame = build_features(frame, self.features)
+        done = frame[~frame.pop("_tail").astype(bool)]
+        if self.keep:
+            self.parts.append(done)
+        self.tail = (pd.concat([self.tail, daily], ignore_index=True) if self.tail is not None else daily)
+        self.tail = self.tail.sort_values(["location", "date"]).groupby("location").tail(lookback(self.features))
+        return done
+
+    def result(self):
+        if not self.parts:
+            # empty inputs, or `as_of` before the data: no rows, as on the in-memory path
+            return build_features(_empty_daily(), self.features)
+        out = pd.concat(self.parts, ignore_index=True)
+        return out.sort_values(["location", "date"], ignore_index=True)
+
+def _stream_daily(sensor_path, weather_path, chunk_rows, features=None, as_of=None):
+    """Join and aggregate time-ordered inputs chunk by chunk.
+
+    Weather rows are buffered only up to the newest sensor timestamp seen, merged
+    rows are buffered only for days that may still receive data, and a day is
+    aggregated (with the same groupby as the in-memory path) once a later
+    timestamp arrives. Peak memory is roughly one chunk plus one day of rows.
+    """
+    until = _until(as_of)
+    weather = _time_ordered((conform(apply_filters(c, until), "weather") for c in iter_table(weather_path, chunk_rows)),
+                            weather_path)
+    wbuf = None
+    weather_done = False
+    pending = None
+    stream = _FeatureStream(features)
+    for s in _time_ordered((conform(apply_filters(c, until), "sensor") for c in iter_table(sensor_path, chunk_rows)),
+                           sensor_path):
+        hi = s["timestamp"].iloc[-1]
+        # pull weather until it covers every timestamp of this sensor chunk
+        while not weather_done and (wbuf is None or wbuf.empty or wbuf["timestamp"].iloc[-1] <= hi):
+            try:
+                chunk = next(weather)
+            except StopIteration:
+                weather_done = True
+                break
+            wbuf = chunk if wbuf is None else pd.concat([wbuf, chunk], ignore_index=True)
+        if wbuf is None:
+            wbuf = pd.DataFrame(columns=["timestamp", "location"])
+        joined = _merge(s, wbuf[wbuf["timestamp"] <= hi])
+        # rows at `hi` may still match sensor rows at the start of the next chunk
+        wbuf = wbuf[wbuf["timestamp"] >= hi].reset_index(drop=True)
+        pending = joined if pending is None else pd.concat([pending, joined], ignore_index=True)
+        open_day = hi.normalize()
+        closed = pending["date"] < open_day
+        if closed.any():
+            stream.push(_aggregate_daily(pending[closed]))
+            pending = pending[~closed].reset_index(drop=True)
+    if pending is not None and not pending.empty:
+        stream.push(_aggregate_daily(pending))
+    return stream.result()
+
+def run_etl(sensor_path, weather_path, out_path, agg_freq="daily", partition_cols=None,
+            incremental=False, state_path=None, features=None, streaming=False, chunk_rows=500_000, as_of=None):
+    """Join the raw tables, aggregate them (daily or hourly) and add features; writes and returns `out_path`.
+
+    `as_of` (YYYY-MM-DD, e.g. a backfilled run date) ignores raw rows after that day.
+    With `incremental`, `out_path` and its watermarks (or `state_path`) must stay
+    the same across runs. Once watermarks exist only the new days are read and
+    upserted, also with `streaming` (which then only builds the first table); a
+    table partitioned by location has only the partitions of updated locations
+    rewritten.
+    """
+    watermark_file = _watermark_path(out_path, state_path)
+    watermarks = _load_watermarks(watermark_file) if incremental and agg_freq == "daily" else {}
+    if watermarks and Path(out_path).exists():
+        by_location = list(partition_cols or []) == ["location"] and partitioned(out_path, partition_cols)
+        out, n_new = _incremental_daily(sensor_path, weather_path, out_path, watermarks, features, as_of,
+                                        by_location=by_location)
+        if out is None:
+            logger.info(f"ETL (incremental): no raw rows after the watermarks of {out_path}")
+            return str(out_path)
+        if by_location:
+            write_partitions(conform(out, "processed"), out_path, partition_cols)
+        else:
+            write_table(conform(out, "processed"), out_path, partition_cols=partition_cols)
+        _save_watermarks(out, watermark_file, watermarks)
+        scope = f"{out['location'].nunique()} location partition(s)" if by_location else f"all {len(out)} rows"
+        logger.info(f"ETL (incremental) upserted {n_new} daily rows into {out_path}; rewrote {scope}")
+        return str(out_path)
+    if streaming:
+        # out-of-core mode for inputs larger than RAM (daily aggregation only)
+        if agg_freq != "daily":
+            raise ValueError("Streaming ETL only supports agg_freq='daily'")
+        out = _stream_daily(sensor_path, weather_path, chunk_rows, features, as_of)
+        write_table(conform(out, "processed"), out_path, partition_cols=partition_cols)
+        if incremental:
+            _save_watermarks(out, watermark_file)
+        logger.info(f"ETL (streaming) produced {out_path} with {len(out)} rows")
+        return str(out_path)
+    # read
+    s = conform(read_table(sensor_path, filters=_until(as_of)), "sensor")
+    w = conform(read_table(weather_path, filters=_until(as_of)), "weather")
+    df = _merge(s, w)
     # aggregate per location per day or per hour
     if agg_freq == "daily":
-        agg = df.groupby(["location","date"]).agg(
-            pm25_mean=("pm25","mean"),
-            pm25_max=("pm25","max"),
-            pm10_mean=("pm10","mean"),
-            no2_mean=("no2","mean"),
-            so2_mean=("so2","mean"),
-            temp_mean=("temp","mean"),
-            humidity_mean=("humidity","mean"),
-            wind_speed_mean=("wind_speed","mean"),
-            precip_sum=("precip","sum")
-        ).reset_index()
+        agg = _aggregate_daily(df)
     else:
-        agg = df.copy()
-        agg = agg.rename(columns={"timestamp":"date"})  # hourly
-    # create lag/rolling features per location
-    dfs = []
-    for loc, g in agg.groupby("location"):
-        g = g.sort_values("date")
-        # rolling means for pm25
-        g["pm25_roll3"] = g["pm25_mean"].rolling(3, min_periods=1).mean()
-        g["pm25_roll7"] = g["pm25_mean"].rolling(7, min_periods=1).mean()
-        g["pm25_trend_3"] = g["pm25_mean"].diff(3).fillna(0)
-        dfs.append(g)
-    out = pd.concat(dfs, ignore_index=True)
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(out_path, index=False)
+        # hourly: rename in place instead of copying the full merged frame
+        df.drop(columns="date", inplace=True)
+        df.rename(columns={"timestamp":"date"}, inplace=True)
+        agg = df
+    # lag/rolling/trend features per location, in one vectorized pass
+    out = conform(build_features(agg, features), "processed")
+    write_table(out, out_path, partition_cols=partition_cols)
+    if incremental and agg_freq == "daily":
+        _save_watermarks(out, watermark_file)
     logger.info(f"ETL produced {out_path} with {len(out)} rows")
     return str(out_path)
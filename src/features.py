@@ -0,0 +1,125 @@
+"""Lag / rolling-window / trend features computed in one sorted, grouped pass.
+
+The feature set is declared in `pipeline.yaml` (etl step, `features:` param):
+
+    features:
+      - column: pm25_mean        # source column
+        name: pm25               # prefix of the generated columns
+        rolling: {windows: [3, 7], aggs: [mean]}   # -> pm25_roll3, pm25_roll7
+        trend: [3]                                 # -> pm25_trend_3
+        lags: [1]                                  # -> pm25_lag1
+
+Rolling aggregates other than `mean` are suffixed (`pm25_roll7_max`). Windows
+use min_periods=1 semantics and are summed term by term, so a row's value only
+depends on the rows inside its window (see etl incremental mode).
+"""
+import numpy as np
+import pandas as pd
+from .utils import get_logger
+
+logger = get_logger()
+
+DEFAULT_FEATURES = [
+    {"column": "pm25_mean", "name": "pm25", "rolling": {"windows": [3, 7], "aggs": ["mean"]}, "trend": [3]},
+]
+ROLLING_AGGS = ("mean", "sum", "min", "max", "std")
+
+def _windows(feat):
+    rolling = feat.get("rolling") or {}
+    return [int(w) for w in rolling.get("windows", [])], list(rolling.get("aggs", ["mean"]))
+
+def lookback(spec=None):
+    """Number of prior rows per group needed to compute every feature of the last row."""
+    steps = [0]
+    for feat in spec or DEFAULT_FEATURES:
+        windows, _ = _windows(feat)
+        steps += [w - 1 for w in windows] + [int(k) for k in feat.get("lags", [])] + [int(k) for k in feat.get("trend", [])]
+    return max(steps)
+
+def feature_columns(spec=None):
+    cols = []
+    for feat in spec or DEFAULT_FEATURES:
+        name = feat.get("name", feat["column"])
+        windows, aggs = _windows(feat)
+        for w in windows:
+            cols += [f"{name}_roll{w}" if agg == "mean" else f"{name}_roll{w}_{agg}" for agg in aggs]
+        cols += [f"{name}_trend_{k}" for k in feat.get("trend", [])]
+        cols += [f"{name}_lag{k}" for k in feat.get("lags", [])]
+    return cols
+
+def _shift(values, group, k):
+    # values shifted down k rows within each (contiguous) group, NaN across group starts
+    out = np.full(len(values), np.nan)
+    if k == 0:
+        out[:] = values
+    elif k < len(values):
+        same = group[k:] == group[:-k]
+        out[k:] = np.where(same, values[:-k], np.nan)
+    return out
+
+def _rolling(values, group, window, aggs):
+    total = np.zeros(len(values))
+    count = np.zeros(len(values))
+    lo = np.full(len(values), np.nan)
+    hi = np.full(len(values), np.nan)
+    for k in range(window):
+        shifted = _shift(values, group, k)
+        ok = ~np.isnan(shifted)
+        total[ok] += shifted[ok]
+        count[ok] += 1
+        lo = np.fmin(lo, shifted)
+        hi = np.fmax(hi, shifted)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        out = {"mean": mean, "sum": np.where(count > 0, total, np.nan), "min": lo, "max": hi}
+        if "std" in aggs:
+            sq = np.zeros(len(values))
+            for k in range(window):
+                dev = _shift(values, group, k) - mean
+                sq += np.where(np.isnan(dev), 0.0, dev * dev)
+            out["std"] = np.where(count > 1, np.sqrt(sq / (count - 1)), np.nan)
+    return out
+
+def _groups(df, by, order):
+    # run ids of `by` plus whether rows are already sorted by (`by`, `order`)
+    codes = pd.factorize(df[by], sort=True)[0]
+    if not len(codes):
+        return codes, True
+    starts = np.r_[True, codes[1:] != codes[:-1]]
+    inner = ~starts[1:]
+    o = df[order].to_numpy()
+    ordered = bool((np.diff(codes) >= 0).all() and (o[1:][inner] >= o[:-1][inner]).all())
+    return np.cumsum(starts), ordered
+
+def build_features(df, spec=None, by="location", order="date"):
+    """Add feature columns to `df` (sorted by `by`, `order`) and return it.
+
+    The frame is sorted once (skipped if already sorted) and every feature is
+    written as a new column on it; no per-group frames or concat are built.
+    """
+    spec = spec or DEFAULT_FEATURES
+    group, ordered = _groups(df, by, order)
+    if not ordered:
+        df = df.sort_values([by, order], ignore_index=True, kind="stable")
+        group, _ = _groups(df, by, order)
+    for feat in spec:
+        col = feat["column"]
+        if col not in df.columns:
+            logger.warning(f"Feature source column {col} not found; skipping its features")
+            continue
+        name = feat.get("name", col)
+        values = df[col].to_numpy(dtype=float)
+        windows, aggs = _windows(feat)
+        for agg in aggs:
+            if agg not in ROLLING_AGGS:
+                raise ValueError(f"Unsupported rolling aggregation {agg!r} (choose from {ROLLING_AGGS})")
+        for w in windows:
+            rolled = _rolling(values, group, w, aggs)
+            for agg in aggs:
+                df[f"{name}_roll{w}" if agg == "mean" else f"{name}_roll{w}_{agg}"] = rolled[agg]
+        for k in feat.get("trend", []):
+            trend = values - _shift(values, group, int(k))
+            df[f"{name}_trend_{k}"] = np.where(np.isnan(trend), 0.0, trend)
+        for k in feat.get("lags", []):
+            df[f"{name}_lag{k}"] = _shift(values, group, int(k))
+    return df
@@ -0,0 +1,154 @@
+"""Tree ensembles flattened into contiguous NumPy arrays for fast, shared inference.
+
+`export_forest` writes every tree of a fitted RandomForest/ExtraTrees regressor
+(or a single decision tree) into one set of node arrays:
+
+    aqi_model.forest/
+        feature.npy  threshold.npy  left.npy  right.npy  value.npy  roots.npy  meta.json
+
+`load_forest` memory-maps them, so loading is near-instant and the pages are
+shared by every process serving the same file. `ForestArrays.predict` walks all
+trees for a batch of rows at once and returns the same values as sklearn.
+
+A re-export never writes into the live directory: the arrays go to a temporary
+sibling that is then renamed over it, so processes still mapping the old files
+keep reading the old model (the files are unlinked, not rewritten).
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+def exportable(model):
+    """True for the models `export_forest` can flatten: random/extra forest and single tree regressors.
+
+    Classifiers are excluded: their leaf values are class fractions, not predictions.
+    """
+    from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+    from sklearn.tree import DecisionTreeRegressor
+    return isinstance(model, (RandomForestRegressor, ExtraTreesRegressor, DecisionTreeRegressor))
+
+def _trees(model):
+    if not exportable(model):
+        raise ValueError(f"{type(model).__name__} cannot be exported; only forest/tree regressors can")
+    if hasattr(model, "estimators_"):
+        return [est.tree_ for est in np.ravel(model.estimators_)]
+    return [model.tree_]
+
+def export_forest(model, out_dir):
+    """Flatten a fitted tree regressor into `out_dir` and return the path."""
+    trees = _trees(model)
+    if trees[0].n_outputs != 1:
+        raise ValueError("Only single-output regressors can be exported")
+    total = sum(t.node_count for t in trees)
+    index = np.int32 if total < 2**31 else np.int64
+    roots = np.cumsum([0] + [t.node_count for t in trees[:-1]]).astype(index)
+    parts = {name: [] for name in ("feature", "threshold", "left", "right", "value")}
+    for offset, t in zip(roots, trees):
+        idx = np.arange(t.node_count, dtype=np.int64) + offset
+        leaf = t.children_left == -1
+        # leaves point at themselves, which is how inference recognises them
+        parts["left"].append(np.where(leaf, idx, t.children_left + offset).astype(index))
+        parts["right"].append(np.where(leaf, idx, t.children_right + offset).astype(index))
+        parts["feature"].append(np.where(leaf, 0, t.feature).astype(np.int32))
+        parts["threshold"].append(t.threshold.astype(np.float64))
+        parts["value"].append(t.value[:, 0, 0].astype(np.float64))
+    meta = {
+        "estimator": type(model).__name__,
+        "n_trees": len(trees),
+        "n_features": int(model.n_features_in_),
+        "max_depth": int(max(t.max_depth for t in trees)),
+        "feature_names": [str(c) for c in getattr(model, "feature_names_in_", [])],
+        "export_id": uuid.uuid4().hex,  # lets load_forest notice a swap while it was reading
+    }
+    out_dir = Path(out_dir)
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{out_dir.name}.", dir=out_dir.parent))
+    try:
+        for name, chunks in parts.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(np.concatenate(chunks)))
+        np.save(tmp / "roots.npy", roots)
+        with open(tmp / "meta.json", "w") as f:
+            json.dump(meta, f, indent=2)
+        _swap(tmp, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return str(out_dir)
+
+def _swap(new, target):
+    """Put directory `new` at `target`; the previous directory is moved aside and deleted."""
+    old = None
+    if target.exists():
+        old = target.with_name(f".{target.name}.old-{uuid.uuid4().hex[:8]}")
+        os.replace(target, old)
+    os.replace(new, target)
+    if old is not None:
+        # open memory maps keep the unlinked files alive (Windows refuses; the leftovers are ignored)
+        shutil.rmtree(old, ignore_errors=True)
+
+class ForestArrays:
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n_features_in_ = meta["n_features"]
+        if meta.get("feature_names"):
+            self.feature_names_in_ = np.array(meta["feature_names"], dtype=object)
+
+    def predict(self, X, batch_rows=8192):
+        """Mean leaf value over all trees, matching sklearn's `predict`."""
+        if hasattr(X, "columns") and hasattr(self, "feature_names_in_"):
+            X = X[list(self.feature_names_in_)]
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        out = np.empty(len(X))
+        for start in range(0, len(X), batch_rows):
+            out[start:start + batch_rows] = self._predict_batch(X[start:start + batch_rows])
+        return out
+
+    def _predict_batch(self, X):
+        n, n_trees = len(X), len(self.roots)
+        flat_x = np.ascontiguousarray(X).ravel()
+        # one (row, tree) cursor per entry; only cursors not yet at a leaf are advanced
+        node = np.tile(self.roots, n)
+        row_offset = np.repeat(np.arange(n, dtype=np.int64) * X.shape[1], n_trees)
+        active = np.flatnonzero(self.left[node] != node)
+        while len(active):
+            cur = node[active]
+            go_left = flat_x[row_offset[active] + self.feature[cur]] <= self.threshold[cur]
+            nxt = np.where(go_left, self.left[cur], self.right[cur])
+            node[active] = nxt
+            active = active[self.left[nxt] != nxt]
+        leaf_values = self.value[node].reshape(n, n_trees)
+        # accumulate tree by tree, in the same order sklearn sums its estimators
+        total = np.zeros(n)
+        for t in range(n_trees):
+            total += leaf_values[:, t]
+        return total / n_trees
+
+def _read_meta(path):
+    with open(path / "meta.json") as f:
+        return json.load(f)
+
+def load_forest(path, mmap=True, retries=5):
+    """Map (or read) an exported forest; retried if a re-export swaps the directory mid-read."""
+    path = Path(path)
+    for attempt in range(retries + 1):
+        try:
+            meta = _read_meta(path)
+            arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None) for name in ARRAYS}
+            if _read_meta(path).get("export_id") == meta.get("export_id"):
+                return ForestArrays(arrays, meta)
+        except FileNotFoundError:
+            # between the two renames of a swap the directory is briefly missing
+            if attempt == retries:
+                raise
+        time.sleep(0.05)
+    raise RuntimeError(f"{path} kept changing while it was loaded")
@@ -0,0 +1,56 @@
+"""File locks shared by the scheduler (one run per date) and pipeline steps (`lock` / `read_lock`).
+
+Locks are advisory (fcntl.flock, msvcrt on Windows), held per open file and
+released when it is closed, including when the process dies. A step with
+`lock: <name>` in pipeline.yaml holds `<name>` exclusively while it runs; a
+step with `read_lock: <name>` holds it shared, so readers overlap each other
+but not a writer (Windows has no shared mode; both are exclusive there).
+"""
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from .config import ARTIFACTS
+
+LOCK_DIR = ARTIFACTS / "scheduler" / "locks"
+
+def pipeline_key(yaml_path):
+    return str(Path(yaml_path).resolve())
+
+def lock_path(pipeline, name, lock_dir=None):
+    """Lock file of `name` (a run date, "all" or "step-<lock>") for one pipeline."""
+    digest = hashlib.sha1(pipeline.encode()).hexdigest()[:10]
+    return Path(lock_dir or LOCK_DIR) / f"{Path(pipeline).stem}_{digest}_{name}.lock"
+
+def _try_lock(f, shared=False):
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+@contextmanager
+def run_lock(path, wait=False, poll=0.5, shared=False):
+    """File lock (exclusive unless `shared`); yields False if it is taken (with wait=False)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+") as f:
+        acquired = _try_lock(f, shared)
+        while wait and not acquired:
+            time.sleep(poll)
+            acquired = _try_lock(f, shared)
+        # released when the file is closed, including when the process dies
+        yield acquired
+
+def step_lock(step, pipeline):
+    """(lock file, shared) for a step declaring `lock` or `read_lock`, else None."""
+    name = step.get("lock") or step.get("read_lock")
+    if not name:
+        return None
+    return str(lock_path(pipeline, f"step-{name}")), not step.get("lock")
@@ -0,0 +1,187 @@
+"""Structured per-step metrics and optional profiling for pipeline runs.
+
+`measure_step` wraps one step and records wall and CPU seconds, peak RSS,
+and the rows/bytes the step moved through `storage` (see `storage.track_io`).
+`write_run` stores a finished run under artifacts/reports/metrics/:
+
+    pipeline_run_<timestamp>.json   the whole run
+    step_metrics.jsonl              one line per step per run (for trends)
+    pipeline_metrics.prom           the latest run in Prometheus text format
+
+A step can be profiled from pipeline.yaml with `profile: cprofile`,
+`profile: tracemalloc` or a list of both. Profiles go to
+artifacts/reports/metrics/profiles/.
+
+CPU seconds and peak RSS are per process. With the thread executor, steps
+running at the same time share them; the process executor runs each step
+alone in its worker.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from pathlib import Path
+from .config import REPORT_DIR
+from .dag import as_list
+from .storage import track_io
+
+METRICS_DIR = REPORT_DIR / "metrics"
+PROFILE_DIR = METRICS_DIR / "profiles"
+HISTORY_PATH = METRICS_DIR / "step_metrics.jsonl"
+PROM_PATH = METRICS_DIR / "pipeline_metrics.prom"
+PROFILERS = ("cprofile", "tracemalloc")
+
+# (metric field, prometheus name, help)
+PROM_FIELDS = [
+    ("wall_s", "aq_step_wall_seconds", "Wall time of the step"),
+    ("cpu_s", "aq_step_cpu_seconds", "CPU time (user + system, incl. finished child processes)"),
+    ("peak_rss_bytes", "aq_step_peak_rss_bytes", "Peak resident memory of the process running the step"),
+    ("rows_in", "aq_step_rows_read", "Rows read through src.storage"),
+    ("rows_out", "aq_step_rows_written", "Rows written through src.storage"),
+    ("bytes_in", "aq_step_bytes_read", "On-disk bytes of the tables read"),
+    ("bytes_out", "aq_step_bytes_written", "On-disk bytes of the tables written"),
+    ("cached", "aq_step_cached", "1 if the step was skipped by the step cache"),
+    ("skipped", "aq_step_skipped", "1 if the step was skipped by its run_if condition"),
+]
+
+def _cpu_seconds():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM, so the peak is per step
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def _peak_rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB elsewhere
+
+def _profile_path(name, kind, suffix):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    return PROFILE_DIR / f"{name}_{kind}_{datetime.now():%Y-%m-%d_%H-%M-%S}{suffix}"
+
+@contextmanager
+def _cprofile(name, out):
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        path = _profile_path(name, "cprofile", ".prof")
+        prof.dump_stats(path)
+        text = io.StringIO()
+        pstats.Stats(prof, stream=text).sort_stats("cumulative").print_stats(30)
+        path.with_suffix(".txt").write_text(text.getvalue())
+        out["cprofile"] = str(path)
+
+@contextmanager
+def _tracemalloc(name, out):
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(10)
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        out["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        if started:
+            tracemalloc.stop()
+        path = _profile_path(name, "tracemalloc", ".txt")
+        top = snapshot.statistics("lineno")[:30]
+        path.write_text("\n".join(str(stat) for stat in top) + "\n")
+        out["tracemalloc"] = str(path)
+
+@contextmanager
+def measure_step(name, profile=None):
+    """Yield a dict that holds the step's metrics once the block exits."""
+    profile = [p.lower() for p in as_list(profile)]
+    unknown = set(profile) - set(PROFILERS)
+    if unknown:
+        raise ValueError(f"Unknown profiler(s) {sorted(unknown)} for step {name}; use {list(PROFILERS)}")
+    metrics = {"step": name, "cached": 0}
+    profiles = {}
+    _reset_peak_rss()
+    cpu, wall = _cpu_seconds(), time.perf_counter()
+    io_counts = {}
+    try:
+        with track_io() as io_counts, ExitStack() as stack:
+            if "tracemalloc" in profile:
+                stack.enter_context(_tracemalloc(name, profiles))
+            if "cprofile" in profile:
+                stack.enter_context(_cprofile(name, profiles))
+            yield metrics
+    finally:
+        metrics.update({
+            "wall_s": round(time.perf_counter() - wall, 4),
+            "cpu_s": round(_cpu_seconds() - cpu, 4),
+            "peak_rss_bytes": _peak_rss_bytes(),
+            **io_counts,
+            **profiles,
+        })
+
+def cached_step(name):
+    """Metrics entry for a step skipped by the step cache."""
+    return {"step": name, "cached": 1, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_bytes": 0,
+            "rows_in": 0, "rows_out": 0, "bytes_in": 0, "bytes_out": 0}
+
+def skipped_step(name):
+    """Metrics entry for a step whose `run_if` condition was false."""
+    return {**cached_step(name), "cached": 0, "skipped": 1}
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def to_prometheus(run):
+    """Prometheus text exposition of a run (gauges labelled by step)."""
+    lines = []
+    for field, metric, help_text in PROM_FIELDS:
+        lines += [f"# HELP {metric} {help_text}.", f"# TYPE {metric} gauge"]
+        for step in run["steps"]:
+            lines.append(f'{metric}{{step="{_label(step["step"])}"}} {step.get(field, 0)}')
+    lines += [
+        "# HELP aq_pipeline_wall_seconds Wall time of the whole pipeline run.",
+        "# TYPE aq_pipeline_wall_seconds gauge",
+        f"aq_pipeline_wall_seconds {run['wall_s']}",
+        "# HELP aq_pipeline_last_run_timestamp_seconds Unix time the last run finished.",
+        "# TYPE aq_pipeline_last_run_timestamp_seconds gauge",
+        f"aq_pipeline_last_run_timestamp_seconds {run['finished_ts']}",
+        "# HELP aq_pipeline_success 1 if the last run succeeded.",
+        "# TYPE aq_pipeline_success gauge",
+        f"aq_pipeline_success {int(run['status'] == 'ok')}",
+    ]
+    return "\n".join(lines) + "\n"
+
+def write_run(run, out_dir=METRICS_DIR):
+    """Write a run's JSON report, append its steps to the history and refresh the .prom file."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"pipeline_run_{run['run_id']}.json"
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    with open(out_dir / HISTORY_PATH.name, "a") as f:
+        for step in run["steps"]:
+            f.write(json.dumps({"run_id": run["run_id"], "started": run["started"], **step}) + "\n")
+    tmp = out_dir / (PROM_PATH.name + ".tmp")
+    tmp.write_text(to_prometheus(run))
+    os.replace(tmp, out_dir / PROM_PATH.name)
+    return str(path)
@@ -1,61 +1,242 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
+from sklearn.ensemble import ExtraTreesRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import ParameterGrid, TimeSeriesSplit
 from sklearn.metrics import mean_squared_error
 import joblib
+from joblib import Parallel, delayed
+from .aqi import aqi_index, categorize
+from .config import PROCESSED_PATH, REPORT_DIR
+from .forest import export_forest, exportable, load_forest
+from .prediction_store import append_predictions
+from .schema import conform
+from .storage import read_table, write_table
 from .utils import get_logger, render_template
 from pathlib import Path
 import numpy as np
 
 logger = get_logger()
 
-def train(data_path, model_path, test_size=0.2):
-    df = pd.read_csv(data_path, parse_dates=["date"])
+FEATURES = ["pm25_mean","pm25_max","pm10_mean","no2_mean","so2_mean","temp_mean","humidity_mean","wind_speed_mean","precip_sum","pm25_roll3","pm25_roll7","pm25_trend_3"]
+
+def latest_features(data_path=PROCESSED_PATH, filters=None):
+    """Latest processed row per location (location, date + FEATURES, NaN filled with 0)."""
+    processed = conform(read_table(data_path, columns=["location", "date"] + FEATURES, filters=filters), "processed")
+    # use latest record per location
+    last = processed.sort_values("date").groupby("location", observed=True).tail(1)
+    last = last.reset_index(drop=True)
+    last[FEATURES] = last[FEATURES].fillna(0)
+    return last
+
+# estimator backends selectable from pipeline.yaml (`estimator: {name: ..., params: {...}}`)
+ESTIMATORS = {
+    "random_forest": RandomForestRegressor,
+    "extra_trees": ExtraTreesRegressor,
+    "hist_gradient_boosting": HistGradientBoostingRegressor,
+    "ridge": Ridge,
+}
+DEFAULT_ESTIMATOR = {"name": "random_forest", "params": {"n_estimators": 100, "random_state": 42}}
+
+def model_file(model_path):
+    """The artifact behind `model_path`: a `.forest` path that was not exported (the estimator is not a
+    forest) resolves to the `.joblib` next to it."""
+    path = Path(model_path)
+    if not path.exists() and path.suffix == ".forest" and path.with_suffix(".joblib").exists():
+        return path.with_suffix(".joblib")
+    return path
+
+def load_model(model_path):
+    """A joblib model file, or a directory of flattened tree arrays (memory-mapped)."""
+    path = model_file(model_path)
+    if path.is_dir():
+        return load_forest(path)
+    return joblib.load(path)
+
+def make_estimator(spec=None, n_jobs=None):
+    """Build an estimator from {"name": ..., "params": {...}}; n_jobs applies where supported."""
+    spec = spec or DEFAULT_ESTIMATOR
+    name = spec.get("name", "random_forest")
+    if name not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator {name!r} (choose from {sorted(ESTIMATORS)})")
+    cls = ESTIMATORS[name]
+    params = dict(spec.get("params") or {})
+    if n_jobs is not None and "n_jobs" in cls().get_params():
+        params.setdefault("n_jobs", n_jobs)
+    return cls(**params)
+
+def training_frame(data_path, filters=None):
+    """Processed rows with the next-day target, sorted by location and date."""
+    df = conform(read_table(data_path, filters=filters), "processed")
     # features and target: predict next-day pm25_mean (shifted)
     df = df.sort_values(["location","date"])
-    df["pm25_next_day"] = df.groupby("location")["pm25_mean"].shift(-1)
+    df["pm25_next_day"] = df.groupby("location", observed=True)["pm25_mean"].shift(-1)
     df = df.dropna(subset=["pm25_next_day"])
-    features = ["pm25_mean","pm25_max","pm10_mean","no2_mean","so2_mean","temp_mean","humidity_mean","wind_speed_mean","precip_sum","pm25_roll3","pm25_roll7","pm25_trend_3"]
     df.fillna(0, inplace=True)
-    X = df[features]
+    return df.reset_index(drop=True)
+
+def time_split(dates, test_size=0.2):
+    """Boolean train mask holding out the latest `test_size` share of days for every location.
+
+    A random row split would train on days after the ones it is scored on.
+    """
+    days = pd.Series(pd.unique(dates)).sort_values().to_numpy()
+    if len(days) < 2:
+        raise ValueError(f"A time-based hold-out needs at least 2 days with a next-day target, got {len(days)} "
+                         "(the last processed day has no target)")
+    n_test = min(len(days) - 1, max(1, int(round(len(days) * test_size))))
+    return (dates < days[len(days) - n_test]).to_numpy()
+
+def summary_path(model_path):
+    """JSON written next to a trained model: held-out RMSE and the training window."""
+    return Path(model_path).with_suffix(".json")
+
+def _cpu_seconds():
+    # CPU time of this process and its finished children (covers threads and forked workers)
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def train(data_path, model_path, test_size=0.2, estimator=None, n_jobs=-1, arrays_path=None):
+    df = training_frame(data_path)
+    X = df[FEATURES]
     y = df["pm25_next_day"]
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    is_train = time_split(df["date"], test_size)
+    X_train, X_test, y_train, y_test = X[is_train], X[~is_train], y[is_train], y[~is_train]
+    model = make_estimator(estimator, n_jobs=n_jobs)
+    wall, cpu = time.perf_counter(), _cpu_seconds()
     model.fit(X_train, y_train)
+    wall, cpu = time.perf_counter() - wall, _cpu_seconds() - cpu
     preds = model.predict(X_test)
     mse = mean_squared_error(y_test, preds)
     rmse = mse ** 0.5
+    save_model(model, model_path, df, rmse, arrays_path)
+    logger.info(f"Model saved to {model_path}. RMSE: {rmse:.3f}. Fit {wall:.2f}s wall, "
+                f"{cpu / wall if wall else 0:.1f} cores busy")
+    return {"model_path": model_path, "rmse": float(rmse), "fit_seconds": round(wall, 3),
+            "cores_used": round(cpu / wall, 2) if wall else 0.0, "arrays_path": arrays_path}
+
+def save_model(model, model_path, df, rmse, arrays_path=None):
+    """Write a fitted model: the joblib file, its tree arrays (or none) and the summary the monitor reads."""
     Path(model_path).parent.mkdir(parents=True, exist_ok=True)
     joblib.dump(model, model_path)
-    logger.info(f"Model saved to {model_path}. RMSE: {rmse:.3f}")
-    return {"model_path": model_path, "rmse": float(rmse)}
+    if arrays_path and exportable(model):
+        # memory-mappable copy of the trees for fast loading (see src/forest.py)
+        export_forest(model, arrays_path)
+    elif arrays_path:
+        # drop arrays of an earlier forest so `arrays_path` resolves to this model (see model_file)
+        shutil.rmtree(arrays_path, ignore_errors=True)
+        logger.info(f"{type(model).__name__} has no tree arrays; {arrays_path} will load {model_path}")
+    with open(summary_path(model_path), "w") as f:
+        json.dump({"trained_at": datetime.now().isoformat(timespec="seconds"), "rmse": float(rmse),
+                   "rows": len(df), "train_start": f"{df['date'].min():%Y-%m-%d}",
+                   "train_end": f"{df['date'].max():%Y-%m-%d}"}, f, indent=2)
 
-def predict_today(model_path, output_path):
-    model = joblib.load(model_path)
-    processed = pd.read_csv("artifacts/data/processed.csv", parse_dates=["date"])
-    # use latest record per location
-    last = processed.sort_values("date").groupby("location").tail(1)
-    features = ["pm25_mean","pm25_max","pm10_mean","no2_mean","so2_mean","temp_mean","humidity_mean","wind_speed_mean","precip_sum","pm25_roll3","pm25_roll7","pm25_trend_3"]
-    X = last[features].fillna(0)
-    preds = model.predict(X)
+def _fit_fold(spec, X, y, train_idx, test_idx):
+    # runs in a joblib worker; X/y are memory-mapped there, not copied per fold
+    wall, cpu = time.perf_counter(), time.process_time()
+    model = make_estimator(spec, n_jobs=1)
+    model.fit(X[train_idx], y[train_idx])
+    rmse = mean_squared_error(y[test_idx], model.predict(X[test_idx])) ** 0.5
+    return float(rmse), time.perf_counter() - wall, time.process_time() - cpu
+
+def _candidates(search):
+    for entry in search or [{"name": DEFAULT_ESTIMATOR["name"], "grid": {"n_estimators": [100]}}]:
+        base = dict(entry.get("params") or {})
+        for combo in ParameterGrid(entry.get("grid") or {}):
+            yield {"name": entry["name"], "params": {**base, **combo}}
+
+def tune(data_path, search=None, n_splits=3, n_jobs=-1, model_path=None, report_path=None, arrays_path=None):
+    """Time-series cross-validated search over estimator configurations.
+
+    `search` is a list of {"name": estimator, "params": fixed, "grid": {param: [values]}}.
+    Folds are expanding windows over calendar days (all locations share the
+    cut-off), the float32 feature matrix is built once and shared by every
+    (config, fold) task, and tasks run in parallel with `n_jobs` workers.
+    Writes a JSON report (RMSE, wall-clock and CPU per config) to artifacts/reports
+    and, if `model_path` is given, refits the best config on all rows and saves it
+    like `train` (tree arrays at `arrays_path`, summary with the mean CV RMSE).
+    """
+    df = training_frame(data_path)
+    X = df[FEATURES].to_numpy(dtype="float32")
+    y = df["pm25_next_day"].to_numpy(dtype="float64")
+    days = pd.Series(pd.unique(df["date"])).sort_values().to_numpy()
+    day_idx = pd.Index(days).get_indexer(df["date"])
+    folds = [(np.flatnonzero(np.isin(day_idx, tr)), np.flatnonzero(np.isin(day_idx, te)))
+             for tr, te in TimeSeriesSplit(n_splits=n_splits).split(days)]
+    configs = list(_candidates(search))
+    wall = time.perf_counter()
+    cpu = _cpu_seconds()
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(spec, X, y, tr, te) for spec in configs for tr, te in folds)
+    wall = time.perf_counter() - wall
+    results = []
+    for i, spec in enumerate(configs):
+        fold_scores = scores[i * len(folds):(i + 1) * len(folds)]
+        results.append({
+            "estimator": spec,
+            "rmse_mean": float(np.mean([s[0] for s in fold_scores])),
+            "rmse_folds": [round(s[0], 4) for s in fold_scores],
+            "fit_wall_seconds": round(sum(s[1] for s in fold_scores), 3),
+            "fit_cpu_seconds": round(sum(s[2] for s in fold_scores), 3),
+        })
+    results.sort(key=lambda r: r["rmse_mean"])
+    fold_cpu = sum(s[2] for s in scores)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "rows": int(len(df)),
+        "n_splits": n_splits,
+        "n_jobs": n_jobs,
+        "wall_seconds": round(wall, 3),
+        # CPU time summed over every worker divided by elapsed time
+        "cores_used": round(fold_cpu / wall, 2) if wall else 0.0,
+        "parent_cpu_seconds": round(_cpu_seconds() - cpu, 3),
+        "results": results,
+    }
+    report_path = Path(report_path or REPORT_DIR / f"tuning_{datetime.now():%Y-%m-%d_%H-%M-%S}.json")
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    best = results[0]
+    logger.info(f"Tuning: {len(configs)} configs x {len(folds)} folds in {wall:.1f}s "
+                f"({report['cores_used']} cores); best {best['estimator']} RMSE {best['rmse_mean']:.3f}")
+    if model_path:
+        model = make_estimator(best["estimator"], n_jobs=n_jobs)
+        model.fit(df[FEATURES], df["pm25_next_day"])
+        save_model(model, model_path, df, best["rmse_mean"], arrays_path)
+    return {"best": best["estimator"], "rmse": best["rmse_mean"], "report_path": str(report_path),
+            "model_path": str(model_path) if model_path else None, "arrays_path": arrays_path}
+
+def predict_today(model_path, output_path=None, data_path=PROCESSED_PATH, store_path=None, as_of=None):
+    """Forecast the next day per location; appends to the prediction store and/or writes `output_path`.
+
+    `as_of` (YYYY-MM-DD, e.g. a backfilled run date) forecasts from the latest
+    processed day on or before it instead of the latest day in the table.
+    """
+    model = load_model(model_path)
+    last = latest_features(data_path, filters=[("date", "<=", pd.Timestamp(as_of))] if as_of else None)
+    preds = model.predict(last[FEATURES])
     out = last[["location","date"]].copy()
     out["pm25_pred_next_day"] = preds
-    # classify air quality category (simple)
-    def aqi_category(pm25):
-        if pm25 <= 12:
-            return "Good"
-        if pm25 <= 35.4:
-            return "Moderate"
-        if pm25 <= 55.4:
-            return "Unhealthy for Sensitive Groups"
-        if pm25 <= 150.4:
-            return "Unhealthy"
-        if pm25 <= 250.4:
-            return "Very Unhealthy"
-        return "Hazardous"
-    out["aqi_category"] = out["pm25_pred_next_day"].apply(aqi_category)
-    output_path = render_template(output_path)
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(output_path, index=False)
-    logger.info(f"Predictions saved to {output_path}")
-    return str(output_path)
+    return save_predictions(out, output_path, store_path, source="predict_today", date=as_of)
+
+def save_predictions(out, output_path=None, store_path=None, source=None, date=None):
+    """Add AQI columns to a (location, date, pm25_pred_next_day) frame and store and/or write it."""
+    preds = out["pm25_pred_next_day"].to_numpy()
+    out["aqi"] = aqi_index(preds)
+    out["aqi_category"] = categorize(preds)
+    conform(out, "predictions")
+    if output_path:
+        output_path = render_template(str(output_path), date)
+    if store_path:
+        # with a per-day file as well, mark it imported so `prediction_store migrate` does not add it again
+        append_predictions(out, store_path, source=Path(output_path).name if output_path else source,
+                           imported=bool(output_path))
+        logger.info(f"Predictions appended to {store_path}")
+    if output_path:
+        write_table(out, output_path)
+        logger.info(f"Predictions saved to {output_path}")
+    return str(output_path or store_path)
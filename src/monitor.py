@@ -0,0 +1,329 @@
+"""Data-quality checks and drift monitoring, updated incrementally on every run.
+
+The state in artifacts/reports/monitoring/ keeps a histogram per day, location
+and raw feature over fixed bins (cut points are quantiles of the first rows
+seen), plus a watermark per raw table, so a run reads and folds only the rows
+newer than the ones it already saw. When `model.train` writes a new summary
+(aqi_model.json), the histograms of its training window are frozen as the
+reference profile.
+
+Every run checks the new rows (duplicate timestamp/location pairs, missing and
+impossible values, gaps in the cadence), scores drift as the PSI between the
+last `window_days` and the reference per location and feature (a feature's
+score is its mean over locations), compares the model's RMSE on days after its
+training window with its held-out RMSE, and writes a JSON report. The step
+returns {"retrain": ..., "reasons": [...]}; `run_if: monitor.retrain` on the
+training step in pipeline.yaml skips training when nothing moved.
+
+    python -m src.monitor              # same checks from the command line
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .config import MODELS_DIR, PROCESSED_PATH, REPORT_DIR, SENSOR_PATH, WEATHER_PATH
+from .model import FEATURES, load_model, model_file, summary_path, training_frame
+from .schema import SENSOR_COLUMNS, WEATHER_COLUMNS, conform
+from .storage import read_table
+from .utils import get_logger
+
+logger = get_logger()
+
+MONITOR_DIR = REPORT_DIR / "monitoring"
+SOURCES = {"sensor": SENSOR_COLUMNS, "weather": WEATHER_COLUMNS}
+COLUMNS = SENSOR_COLUMNS + WEATHER_COLUMNS
+# physically possible values, inclusive (None = unbounded)
+RANGES = {"pm25": (0, None), "pm10": (0, None), "no2": (0, None), "so2": (0, None),
+          "temp": (-90, 60), "humidity": (0, 100), "wind_speed": (0, None), "precip": (0, None)}
+
+class Profile:
+    """Daily histograms [day, location, feature, bin] with the watermarks of the rows folded in."""
+
+    def __init__(self, n_bins=16, history_days=90):
+        self.n_bins = n_bins
+        self.history_days = history_days
+        self.locations = []
+        self.days = []  # "YYYY-MM-DD", ascending
+        self.edges = np.full((len(COLUMNS), n_bins - 1), np.nan)
+        self.daily = np.zeros((0, 0, len(COLUMNS), n_bins), np.int32)
+        self.reference = None  # [location, feature, bin] of the training window
+        self.meta = {"watermarks": {}, "last_seen": {}, "freq": {}, "reference": None}
+
+    @classmethod
+    def load(cls, state_dir=MONITOR_DIR, n_bins=16, history_days=90):
+        profile = cls(n_bins, history_days)
+        state_dir = Path(state_dir)
+        if not (state_dir / "state.json").exists():
+            return profile
+        with open(state_dir / "state.json") as f:
+            meta = json.load(f)
+        if meta.get("n_bins") != n_bins:
+            logger.warning(f"Monitoring state has {meta.get('n_bins')} bins, not {n_bins}; starting over")
+            return profile
+        with np.load(state_dir / "state.npz") as arrays:
+            profile.edges, profile.daily = arrays["edges"], arrays["daily"]
+            profile.reference = arrays["reference"] if "reference" in arrays else None
+        profile.locations, profile.days = meta.pop("locations"), meta.pop("days")
+        profile.meta = {**profile.meta, **meta}
+        return profile
+
+    def save(self, state_dir=MONITOR_DIR):
+        state_dir = Path(state_dir)
+        state_dir.mkdir(parents=True, exist_ok=True)
+        arrays = {"edges": self.edges, "daily": self.daily}
+        if self.reference is not None:
+            arrays["reference"] = self.reference
+        tmp = state_dir / f"state.npz.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, state_dir / "state.npz")
+        meta = {**self.meta, "n_bins": self.n_bins, "locations": self.locations, "days": self.days}
+        tmp = state_dir / f"state.json.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(meta, indent=2))
+        os.replace(tmp, state_dir / "state.json")
+
+    def _location_index(self, locations):
+        names = [str(c) for c in locations.cat.categories]
+        new = [n for n in names if n not in set(self.locations)]
+        if new:
+            self.locations += new
+            pad = ((0, 0), (0, len(new)), (0, 0), (0, 0))
+            self.daily = np.pad(self.daily, pad)
+            if self.reference is not None:
+                self.reference = np.pad(self.reference, pad[1:])
+        lookup = pd.Index(self.locations).get_indexer(names)
+        return lookup[locations.cat.codes.to_numpy()]
+
+    def _day_index(self, days):
+        """Row -> index into self.days (-1 for days older than the history kept); extends self.days."""
+        seen = pd.DatetimeIndex(pd.unique(days)).strftime("%Y-%m-%d")
+        keep = sorted(set(self.days) | set(seen))
+        cutoff = f"{pd.Timestamp(keep[-1]) - pd.Timedelta(days=self.history_days - 1):%Y-%m-%d}"
+        keep = [d for d in keep if d >= cutoff]
+        if keep != self.days:
+            daily = np.zeros((len(keep),) + self.daily.shape[1:], np.int32)
+            old = {d: i for i, d in enumerate(self.days)}
+            for i, d in enumerate(keep):
+                if d in old:
+                    daily[i] = self.daily[old[d]]
+            self.days, self.daily = keep, daily
+        idx = pd.Index(self.days).get_indexer(days.dt.strftime("%Y-%m-%d"))
+        return np.asarray(idx)
+
+    def fold(self, df, source):
+        """Add the rows of one raw table to the daily histograms."""
+        loc = self._location_index(df["location"])
+        day = self._day_index(df["timestamp"].dt.normalize())
+        n_days, n_locs, n_bins = len(self.days), len(self.locations), self.n_bins
+        for col in SOURCES[source]:
+            f = COLUMNS.index(col)
+            values = df[col].to_numpy(np.float64)
+            ok = (day >= 0) & ~np.isnan(values)
+            if not ok.any():
+                continue
+            if np.isnan(self.edges[f]).any():
+                self.edges[f] = np.quantile(values[ok], np.linspace(0, 1, n_bins + 1)[1:-1])
+            bins = np.searchsorted(self.edges[f], values[ok], side="right")
+            flat = (day[ok] * n_locs + loc[ok]) * n_bins + bins
+            counts = np.bincount(flat, minlength=n_days * n_locs * n_bins)
+            self.daily[:, :, f, :] += counts.reshape(n_days, n_locs, n_bins).astype(np.int32)
+        last = df.groupby("location", observed=True)["timestamp"].max()
+        seen = self.meta["last_seen"].setdefault(source, {})
+        seen.update({str(k): v.isoformat() for k, v in last.items()})
+        self.meta["watermarks"][source] = df["timestamp"].max().isoformat()
+
+    def window(self, start=None, end=None):
+        """Histograms [location, feature, bin] summed over days in [start, end] (YYYY-MM-DD, inclusive)."""
+        days = np.array(self.days, dtype=object)
+        mask = np.ones(len(days), bool)
+        if start is not None:
+            mask &= days >= start
+        if end is not None:
+            mask &= days <= end
+        return self.daily[mask].sum(axis=0, dtype=np.int64)
+
+def psi(expected, actual, min_count=24, eps=1e-4):
+    """Population stability index over the last (bin) axis; NaN where a side has fewer than min_count values."""
+    n_e = expected.sum(-1, keepdims=True)
+    n_a = actual.sum(-1, keepdims=True)
+    p = np.clip(expected / np.maximum(n_e, 1), eps, None)
+    q = np.clip(actual / np.maximum(n_a, 1), eps, None)
+    score = ((q - p) * np.log(q / p)).sum(-1)
+    score[(n_e[..., 0] < min_count) | (n_a[..., 0] < min_count)] = np.nan
+    return score
+
+def check_quality(df, source, last_seen=None, freq=None):
+    """Issues among new rows of a raw table: duplicates, missing/impossible values, cadence gaps."""
+    cols = SOURCES[source]
+    dup = df.duplicated(["timestamp", "location"])
+    report = {"rows": len(df), "duplicates": int(dup.sum()),
+              "missing": {c: int(n) for c, n in df[list(cols)].isna().sum().items() if n},
+              "out_of_range": {}, "gaps": {}, "freq": freq}
+    for col in cols:
+        lo, hi = RANGES[col]
+        values = df[col].to_numpy(np.float64)
+        bad = ((values < lo) if lo is not None else False) | ((values > hi) if hi is not None else False)
+        if bad.any():
+            report["out_of_range"][col] = {"rows": int(bad.sum()), "min": float(np.nanmin(values)),
+                                           "max": float(np.nanmax(values)),
+                                           "locations": sorted(df.loc[bad, "location"].astype(str).unique()[:10])}
+    if df.empty:
+        return report
+    ts = df.loc[~dup, ["location", "timestamp"]].sort_values(["location", "timestamp"])
+    prev = ts.groupby("location", observed=True)["timestamp"].shift()
+    if freq is None:
+        steps = (ts["timestamp"] - prev).dropna()
+        freq = f"{int(steps.mode().iloc[0].total_seconds())}s" if len(steps) else None
+        report["freq"] = freq
+    if freq is None:
+        return report
+    # a location's first new row continues from the last one seen on a previous run
+    first = prev.isna()
+    prev[first] = pd.to_datetime(ts.loc[first, "location"].astype(str).map(last_seen or {}))
+    missing = ((ts["timestamp"] - prev) / pd.Timedelta(freq)).round() - 1
+    gaps = missing[missing > 0].groupby(ts["location"].astype(str)).sum()
+    report["gaps"] = {loc: int(n) for loc, n in gaps.items()}
+    return report
+
+def _issues(quality):
+    return sum(q["duplicates"] + sum(q["missing"].values()) + sum(v["rows"] for v in q["out_of_range"].values())
+               + sum(q["gaps"].values()) for q in quality.values())
+
+def _model_summary(model_path):
+    path = summary_path(model_path) if model_path else None
+    if path is None or not path.exists() or not model_file(model_path).exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def recent_rmse(model_path, data_path, after):
+    """RMSE of the model on processed days after `after` (YYYY-MM-DD) whose next day is known."""
+    df = training_frame(data_path, filters=[("date", ">", pd.Timestamp(after))])
+    if df.empty:
+        return None, 0
+    model = load_model(model_path)
+    err = model.predict(df[FEATURES]) - df["pm25_next_day"].to_numpy()
+    return float(np.sqrt(np.mean(err ** 2))), len(df)
+
+def _drift(profile, reference, recent, min_count):
+    scores = psi(reference, recent, min_count)
+    out = {}
+    for f, col in enumerate(COLUMNS):
+        s = scores[:, f]
+        valid = ~np.isnan(s)
+        if not valid.any():
+            out[col] = {"psi": None, "locations": 0}
+            continue
+        top = np.argsort(np.where(valid, -s, np.inf))[:3]
+        out[col] = {"psi": round(float(s[valid].mean()), 4), "max": round(float(s[valid].max()), 4),
+                    "locations": int(valid.sum()),
+                    "top": [[profile.locations[i], round(float(s[i]), 4)] for i in top if valid[i]]}
+    return out
+
+def monitor(sensor_path=SENSOR_PATH, weather_path=WEATHER_PATH, data_path=PROCESSED_PATH,
+            model_path=MODELS_DIR / "aqi_model.forest", state_dir=MONITOR_DIR, report_dir=MONITOR_DIR,
+            drift_threshold=0.2, rmse_tolerance=0.25, window_days=7, max_model_age_days=None,
+            n_bins=16, history_days=90, min_count=24, freq=None, as_of=None):
+    """Fold new raw rows into the profile, check them, score drift and decide whether to retrain.
+
+    With `as_of` (the run date), a model trained on data up to that date or later
+    is never retrained: a backfilled date would replace it with an older one.
+    """
+    profile = Profile.load(state_dir, n_bins, history_days)
+    quality = {}
+    for source, path in (("sensor", sensor_path), ("weather", weather_path)):
+        mark = profile.meta["watermarks"].get(source)
+        filters = [("timestamp", ">", pd.Timestamp(mark))] if mark else None
+        df = conform(read_table(path, columns=["timestamp", "location", *SOURCES[source]], filters=filters),
+                     source)
+        quality[source] = check_quality(df, source, profile.meta["last_seen"].get(source),
+                                        freq or profile.meta["freq"].get(source))
+        if quality[source]["freq"]:
+            profile.meta["freq"][source] = quality[source]["freq"]
+        if len(df):
+            profile.fold(df, source)
+
+    reasons = []
+    summary = _model_summary(model_path)
+    if summary is None:
+        reasons.append("no trained model")
+    elif (profile.meta["reference"] or {}).get("trained_at") != summary["trained_at"]:
+        profile.reference = profile.window(summary.get("train_start"), summary["train_end"])
+        profile.meta["reference"] = {"trained_at": summary["trained_at"], "start": summary.get("train_start"),
+                                     "end": summary["train_end"]}
+        logger.info(f"Monitoring reference set to the training window {summary.get('train_start')}"
+                    f"..{summary['train_end']}")
+
+    drift, window, rmse = {}, None, {}
+    if profile.days and profile.reference is not None:
+        start = f"{pd.Timestamp(profile.days[-1]) - pd.Timedelta(days=window_days - 1):%Y-%m-%d}"
+        window = {"start": start, "end": profile.days[-1]}
+        drift = _drift(profile, profile.reference, profile.window(start), min_count)
+        for col, d in drift.items():
+            if d["psi"] is not None and d["psi"] >= drift_threshold:
+                reasons.append(f"{col} drift {d['psi']:.3f} >= {drift_threshold}")
+    if summary is not None:
+        recent, rows = recent_rmse(model_path, data_path, summary["train_end"])
+        rmse = {"train": summary["rmse"], "recent": recent, "rows": rows}
+        if recent is not None and recent > summary["rmse"] * (1 + rmse_tolerance):
+            reasons.append(f"rmse {recent:.3f} > {summary['rmse']:.3f} x {1 + rmse_tolerance:g}")
+        age = (datetime.now() - datetime.fromisoformat(summary["trained_at"])).total_seconds() / 86400
+        if max_model_age_days is not None and age >= max_model_age_days:
+            reasons.append(f"model is {age:.1f} days old")
+    held = []
+    if summary is not None and as_of and summary["train_end"] >= as_of:
+        held, reasons = reasons, []
+        logger.info(f"Monitor: the model covers {summary['train_end']}, not retraining for {as_of}")
+    profile.save(state_dir)
+
+    created = datetime.now()
+    issues = _issues(quality)
+    report = {
+        "created": created.isoformat(timespec="seconds"),
+        "retrain": bool(reasons),
+        "reasons": reasons,
+        "held_back": held,
+        "as_of": as_of,
+        "thresholds": {"drift": drift_threshold, "rmse_tolerance": rmse_tolerance, "window_days": window_days,
+                       "max_model_age_days": max_model_age_days},
+        "reference": profile.meta["reference"],
+        "window": window,
+        "drift": drift,
+        "rmse": rmse,
+        "issues": issues,
+        "quality": quality,
+        "profile": {"locations": len(profile.locations), "days": len(profile.days)},
+    }
+    report_dir = Path(report_dir)
+    report_dir.mkdir(parents=True, exist_ok=True)
+    report_path = report_dir / f"monitor_{created:%Y-%m-%d_%H-%M-%S-%f}.json"
+    text = json.dumps(report, indent=2)
+    report_path.write_text(text)
+    (report_dir / "latest.json").write_text(text)
+    worst = max((d["psi"] for d in drift.values() if d["psi"] is not None), default=None)
+    with open(report_dir / "history.jsonl", "a") as f:
+        f.write(json.dumps({"created": report["created"], "retrain": report["retrain"], "max_psi": worst,
+                            "rmse_recent": rmse.get("recent"), "issues": issues}) + "\n")
+
+    if issues:
+        logger.warning(f"Data quality: {issues} issue(s) among new raw rows, see {report_path}")
+    logger.info(f"Monitor: {'retrain' if reasons else 'no retraining needed'}"
+                + (f" ({'; '.join(reasons)})" if reasons else f" (max PSI {worst})"))
+    return {"retrain": bool(reasons), "reasons": reasons, "max_psi": worst, "rmse_recent": rmse.get("recent"),
+            "rmse_train": rmse.get("train"), "issues": issues, "report_path": str(report_path)}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Data-quality and drift checks on the new raw rows")
+    ap.add_argument("--sensor", default=str(SENSOR_PATH))
+    ap.add_argument("--weather", default=str(WEATHER_PATH))
+    ap.add_argument("--data", default=str(PROCESSED_PATH))
+    ap.add_argument("--model", default=str(MODELS_DIR / "aqi_model.forest"))
+    ap.add_argument("--state-dir", default=str(MONITOR_DIR))
+    ap.add_argument("--drift-threshold", type=float, default=0.2)
+    ap.add_argument("--window-days", type=int, default=7)
+    args = ap.parse_args()
+    print(json.dumps(monitor(args.sensor, args.weather, args.data, args.model, args.state_dir, args.state_dir,
+                             drift_threshold=args.drift_threshold, window_days=args.window_days), indent=2))
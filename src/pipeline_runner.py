@@ -1,28 +1,141 @@
+import argparse
+import time
+from datetime import datetime
+from functools import partial
 import yaml
-from .tasks import run_step
-from .utils import get_logger
+from .cache import DEFAULT_MAX_ENTRIES, StepCache
+from .dag import as_list, condition_met, run_dag
+from .locks import pipeline_key, step_lock
+from .metrics import cached_step, skipped_step, write_run
+from .tasks import run_measured_step
+from .utils import get_logger, render_params
 logger = get_logger()
 
 def load_pipeline(yaml_path="pipeline.yaml"):
     with open(yaml_path) as f:
         return yaml.safe_load(f)
 
-def run_pipeline(yaml_path="pipeline.yaml"):
+def _task(step, run_date=None, pipeline=None):
+    params = render_params(step.get("params", {}) or {}, run_date)
+    # `lock` / `read_lock`: held in the worker while the step runs, across runs of the pipeline (src/locks.py)
+    lock = step_lock(step, pipeline) if pipeline else None
+    return run_measured_step, (step.get("module"), step.get("function"), params, step["name"], step.get("profile"),
+                               lock)
+
+class _CachedSteps:
+    """lookup/record hooks for run_dag backed by a StepCache."""
+
+    def __init__(self, cache, force=False, run_date=None):
+        self.cache = cache
+        self.force = force
+        self.run_date = run_date
+        self.keys = {}
+
+    def _key(self, step):
+        inputs = render_params(as_list(step.get("inputs")), self.run_date)
+        params = render_params(step.get("params", {}) or {}, self.run_date)
+        return self.cache.key(step.get("module"), step.get("function"), params, inputs)
+
+    def lookup(self, step):
+        if step.get("cache", True) is False:
+            return None
+        key = self.keys[step["name"]] = self._key(step)
+        entry = None if self.force else self.cache.lookup(key)
+        return (entry["result"],) if entry is not None else None
+
+    def record(self, step, result):
+        if step["name"] in self.keys:
+            self.cache.store(self.keys[step["name"]], result,
+                             render_params(as_list(step.get("outputs")), self.run_date))
+
+class _StepMetrics:
+    """run_dag hooks that collect each step's metrics; steps return (result, metrics).
+
+    Steps in `done` ({name: result}, e.g. from an interrupted run being resumed)
+    are skipped like cached ones; `on_step(name, result)` is called after every
+    step that ran. A step whose `run_if` condition is false is skipped and
+    returns {"skipped": True, "run_if": condition}.
+    """
+
+    def __init__(self, cached=None, done=None, on_step=None):
+        self.cached = cached
+        self.done = done or {}
+        self.on_step = on_step
+        self.steps = {}
+        self.results = {}
+
+    def lookup(self, step):
+        name = step["name"]
+        cond = step.get("run_if")
+        if cond and not condition_met(cond, self.results):
+            logger.info(f"Step {name} skipped: run_if {cond!r} is false")
+            self.results[name] = {"skipped": True, "run_if": cond}
+            self.steps[name] = skipped_step(name)
+            return ((self.results[name], self.steps[name]),)
+        if name in self.done:
+            hit = (self.done[name],)
+        else:
+            hit = self.cached.lookup(step) if self.cached else None
+        if hit is None:
+            return None
+        self.results[name] = hit[0]
+        self.steps[name] = cached_step(name)
+        return ((hit[0], self.steps[name]),)
+
+    def record(self, step, out):
+        result, self.steps[step["name"]] = out
+        self.results[step["name"]] = result
+        if self.cached:
+            self.cached.record(step, result)
+        if self.on_step:
+            self.on_step(step["name"], result)
+
+def run_pipeline(yaml_path="pipeline.yaml", max_workers=None, executor=None, force=False, run_date=None,
+                 done=None, on_step=None):
+    """Run every step; `run_date` (YYYY-MM-DD) fills {{date}} in params, default today."""
     pipeline = load_pipeline(yaml_path)
-    results = {}
-    for step in pipeline.get("steps", []):
-        name = step.get("name")
-        module = step.get("module")
-        function = step.get("function")
-        params = step.get("params", {}) or {}
-        try:
-            res = run_step(module, function, params)
-            results[name] = res
-        except Exception as e:
-            logger.exception(f"Step {name} failed: {e}")
-            raise
-    logger.info("Pipeline finished")
-    return results
+    steps = pipeline.get("steps", [])
+    # independent steps run concurrently; see `depends_on` / `inputs` / `outputs` / `run_if` in pipeline.yaml
+    max_workers = max_workers or pipeline.get("max_workers", 1)
+    executor = executor or pipeline.get("executor", "thread")
+    cache_cfg = pipeline.get("cache") or {}
+    cached = None
+    if cache_cfg.get("enabled", False):
+        cached = _CachedSteps(StepCache(max_entries=cache_cfg.get("max_entries", DEFAULT_MAX_ENTRIES)), force=force,
+                              run_date=run_date)
+    hooks = _StepMetrics(cached, done, on_step)
+    started, wall = datetime.now(), time.perf_counter()
+    status = "failed"
+    try:
+        task = partial(_task, run_date=run_date, pipeline=pipeline_key(yaml_path))
+        outs, timings = run_dag(steps, task, max_workers=max_workers, executor=executor,
+                                lookup=hooks.lookup, record=hooks.record)
+        status = "ok"
+    finally:
+        if cached is not None:
+            cached.cache.save()
+        if pipeline.get("metrics", True):
+            # per-step wall/CPU/RSS/rows/bytes as JSON + Prometheus (src/metrics.py)
+            write_run({
+                "run_id": f"{started:%Y-%m-%d_%H-%M-%S-%f}",
+                "pipeline": str(yaml_path),
+                "run_date": run_date or f"{started:%Y-%m-%d}",
+                "started": started.isoformat(timespec="seconds"),
+                "finished_ts": round(time.time(), 3),
+                "status": status,
+                "wall_s": round(time.perf_counter() - wall, 4),
+                "max_workers": max_workers,
+                "executor": executor,
+                "steps": [hooks.steps[s["name"]] for s in steps if s["name"] in hooks.steps],
+            })
+    logger.info(f"Pipeline finished in {sum(timings.values()):.2f}s of step time "
+                f"({max_workers} {executor} worker(s))")
+    return {name: out[0] for name, out in outs.items()}
 
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="Run the YAML-defined pipeline")
+    parser.add_argument("yaml_path", nargs="?", default="pipeline.yaml")
+    parser.add_argument("--force", action="store_true", help="ignore cached step results and re-run every step")
+    parser.add_argument("--date", default=None, help="run date (YYYY-MM-DD) used for {{date}}; default today")
+    args = parser.parse_args()
+    run_pipeline(args.yaml_path, force=args.force, run_date=args.date)
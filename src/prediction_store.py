@@ -0,0 +1,178 @@
+"""Append-only history of next-day forecasts in an embedded SQLite database.
+
+Every `predict_today` run appends one row per location: the day the features
+describe (`issued_date`), the day being forecast (`forecast_date`, the next
+day), the forecast and when it was made. Nothing is updated in place; when a
+day is predicted more than once, queries use the most recent row. Dates are
+stored as ISO text, so the (location, forecast_date) and (forecast_date)
+indexes serve "latest", range and forecast-vs-actual queries directly.
+
+    python -m src.prediction_store migrate              # import artifacts/predictions/prediction_*.csv
+    python -m src.prediction_store latest
+    python -m src.prediction_store history --location Tokyo --start 2025-11-01
+"""
+import argparse
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+from .config import PRED_DIR, PREDICTION_DB, PROCESSED_PATH
+from .storage import BACKENDS, read_table
+from .utils import get_logger
+
+logger = get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    location TEXT NOT NULL,
+    issued_date TEXT NOT NULL,
+    forecast_date TEXT NOT NULL,
+    pm25_pred REAL NOT NULL,
+    aqi_category TEXT,
+    created_at TEXT NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS predictions_location_date ON predictions (location, forecast_date);
+CREATE INDEX IF NOT EXISTS predictions_date ON predictions (forecast_date);
+CREATE TABLE IF NOT EXISTS imported_files (
+    source TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    imported_at TEXT NOT NULL
+);
+"""
+
+# newest row per (location, forecast_date); rowid grows with every append
+_CURRENT = """
+SELECT p.location, p.issued_date, p.forecast_date, p.pm25_pred, p.aqi_category, p.created_at
+FROM predictions p
+JOIN (SELECT MAX(rowid) AS rid FROM predictions {where} GROUP BY location, forecast_date) m ON p.rowid = m.rid
+"""
+
+def connect(db_path=PREDICTION_DB):
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+def _day(value):
+    return None if value is None else pd.Timestamp(value).strftime("%Y-%m-%d")
+
+def _frame(conn, sql, params=()):
+    df = pd.read_sql_query(sql, conn, params=params)
+    for col in ("issued_date", "forecast_date"):
+        if col in df:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+def append_predictions(df, db_path=PREDICTION_DB, source=None, created_at=None, imported=False):
+    """Append a predict_today frame (location, date, pm25_pred_next_day[, aqi_category]).
+
+    With `imported`, `source` (a prediction_* file name) is recorded in
+    imported_files in the same transaction, so migrate_files skips it.
+    """
+    issued = pd.to_datetime(df["date"]).dt.normalize()
+    rows = pd.DataFrame({
+        "location": df["location"].astype(str),
+        "issued_date": issued.dt.strftime("%Y-%m-%d"),
+        "forecast_date": (issued + pd.Timedelta(days=1)).dt.strftime("%Y-%m-%d"),
+        "pm25_pred": df["pm25_pred_next_day"].astype(float),
+        "aqi_category": df["aqi_category"].astype(str) if "aqi_category" in df else None,
+        "created_at": created_at or datetime.now().isoformat(timespec="seconds"),
+        "source": source,
+    })
+    with closing(connect(db_path)) as conn, conn:
+        conn.executemany("INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         rows.itertuples(index=False, name=None))
+        if imported:
+            conn.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?, ?)",
+                         (source, len(rows), datetime.now().isoformat(timespec="seconds")))
+    return len(rows)
+
+def migrate_files(pred_dir=PRED_DIR, db_path=PREDICTION_DB):
+    """Import prediction_* files not imported before; returns the number of rows added."""
+    files = sorted(p for p in Path(pred_dir).glob("prediction_*") if p.suffix in BACKENDS)
+    added, imported = 0, 0
+    with closing(connect(db_path)) as conn:
+        done = {row[0] for row in conn.execute("SELECT source FROM imported_files")}
+        for path in files:
+            if path.name in done:
+                continue
+            df = read_table(path)
+            # files sort by name = run date, so appending in that order keeps "newest wins"
+            stamp = datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec="seconds")
+            # rows and the imported_files entry commit together: a crash cannot import a file twice
+            n = append_predictions(df, db_path, source=path.name, created_at=stamp, imported=True)
+            added += n
+            imported += 1
+    logger.info(f"Imported {added} prediction rows from {imported} files into {db_path}")
+    return added
+
+def latest(db_path=PREDICTION_DB, locations=None):
+    """Most recent forecast per location (newest forecast_date, newest run)."""
+    where, params = "", []
+    if locations:
+        where = f"WHERE location IN ({','.join('?' * len(locations))})"
+        params = list(locations)
+    sql = f"""
+        SELECT c.* FROM ({_CURRENT.format(where=where)}) c
+        JOIN (SELECT location, MAX(forecast_date) AS d FROM predictions {where} GROUP BY location) l
+          ON c.location = l.location AND c.forecast_date = l.d
+        ORDER BY c.pm25_pred DESC
+    """
+    with closing(connect(db_path)) as conn:
+        return _frame(conn, sql, params * 2)
+
+def history(db_path=PREDICTION_DB, location=None, start=None, end=None):
+    """Current forecast per (location, forecast_date) with start <= forecast_date <= end."""
+    clauses, params = [], []
+    if location is not None:
+        clauses.append("location = ?")
+        params.append(str(location))
+    if start is not None:
+        clauses.append("forecast_date >= ?")
+        params.append(_day(start))
+    if end is not None:
+        clauses.append("forecast_date <= ?")
+        params.append(_day(end))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT * FROM ({_CURRENT.format(where=where)}) ORDER BY location, forecast_date"
+    with closing(connect(db_path)) as conn:
+        return _frame(conn, sql, params)
+
+def forecast_vs_actual(db_path=PREDICTION_DB, actuals=PROCESSED_PATH, location=None, start=None, end=None):
+    """history() joined with the observed daily pm25_mean of the forecast day (NaN if not observed yet).
+
+    `actuals` is a processed table path or an already loaded frame (location, date, pm25_mean).
+    """
+    forecasts = history(db_path, location, start, end)
+    if not isinstance(actuals, pd.DataFrame):
+        filters = [("location", "==", str(location))] if location is not None else None
+        actuals = read_table(actuals, columns=["location", "date", "pm25_mean"], filters=filters)
+    observed = pd.DataFrame({
+        "location": actuals["location"].astype(str),
+        "forecast_date": pd.to_datetime(actuals["date"]).dt.normalize(),
+        "pm25_actual": actuals["pm25_mean"].astype(float),
+    })
+    out = forecasts.merge(observed, on=["location", "forecast_date"], how="left")
+    out["error"] = out["pm25_pred"] - out["pm25_actual"]
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prediction history store")
+    parser.add_argument("command", choices=["migrate", "latest", "history", "vs-actual"])
+    parser.add_argument("--db", default=str(PREDICTION_DB))
+    parser.add_argument("--pred-dir", default=str(PRED_DIR))
+    parser.add_argument("--location", default=None)
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    args = parser.parse_args()
+    if args.command == "migrate":
+        print(f"{migrate_files(args.pred_dir, args.db)} rows imported into {args.db}")
+    elif args.command == "latest":
+        print(latest(args.db).to_string(index=False))
+    elif args.command == "history":
+        print(history(args.db, args.location, args.start, args.end).to_string(index=False))
+    else:
+        print(forecast_vs_actual(args.db, location=args.location, start=args.start, end=args.end).to_string(index=False))
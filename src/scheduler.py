@@ -1,20 +1,288 @@
-from apscheduler.schedulers.blocking import BlockingScheduler
-from .pipeline_runner import run_pipeline
+"""Daily pipeline scheduler with a worker pool, per-run locks, backfill and resumable run state.
+
+    python -m src.scheduler                          # daily at 02:00; resumes unfinished runs first
+    python -m src.scheduler --backfill 7 --max-concurrent 3   # the last 7 days, then exit
+    python -m src.scheduler --resume                 # finish interrupted runs, then exit
+    python -m src.scheduler --status
+
+Runs execute in a process pool (`max_concurrent` at a time), so a slow run does
+not hold up the cron trigger or other dates. A run is one (pipeline, run date);
+its date fills `{{date}}` in the pipeline params (pipeline.yaml passes it as
+`as_of` to the generators, ETL, monitor and prediction and keeps data per date).
+A file lock per (pipeline, date) keeps two runs of the same date from
+overlapping, also across scheduler processes; a run that finds it taken is
+skipped. Runs of different dates also share a per-pipeline lock (they wait for
+each other) unless pipeline.yaml sets `scheduler: {lock: date}`: then they
+overlap, and the steps that write shared artifacts take turns through their
+own `lock` (readers `read_lock`, see src/locks.py).
+
+Run state lives in artifacts/scheduler/runs.sqlite: each run's status (queued,
+running, ok, failed, or skipped when another process held its date) and the
+result of every step that finished. On start the scheduler resubmits queued
+runs and runs left "running" by a process that died, and those skip the steps
+that already finished. Today's run is only started
+right away if its scheduled time has passed and it has not succeeded yet.
+"""
+import argparse
+import json
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, closing
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import pandas as pd
+from apscheduler.schedulers.background import BackgroundScheduler
+from .config import ARTIFACTS
+from .locks import lock_path, pipeline_key, run_lock
+from .pipeline_runner import load_pipeline, run_pipeline
 from .utils import get_logger
 
 logger = get_logger()
 
-def start_scheduler(yaml_path="pipeline.yaml", hour=2, minute=0):
-    sched = BlockingScheduler()
-    # run once immediately
-    run_pipeline(yaml_path)
-    # schedule daily at given hour
-    sched.add_job(lambda: run_pipeline(yaml_path), 'cron', hour=hour, minute=minute)
-    logger.info(f"Scheduler started — pipeline scheduled daily at {hour:02d}:{minute:02d}")
+STATE_DIR = ARTIFACTS / "scheduler"
+STATE_DB = STATE_DIR / "runs.sqlite"
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    pipeline TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    queued_at TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    error TEXT,
+    PRIMARY KEY (pipeline, run_date)
+);
+CREATE TABLE IF NOT EXISTS steps (
+    pipeline TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    step TEXT NOT NULL,
+    result TEXT,
+    finished_at TEXT NOT NULL,
+    PRIMARY KEY (pipeline, run_date, step)
+);
+"""
+
+def connect(db_path=STATE_DB):
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def _day(value):
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+def _set_status(db_path, pipeline, run_date, status, **fields):
+    cols = {"status": status, **fields}
+    with closing(connect(db_path)) as conn, conn:
+        conn.execute("INSERT OR IGNORE INTO runs (pipeline, run_date, status) VALUES (?, ?, ?)",
+                     (pipeline, run_date, status))
+        conn.execute(f"UPDATE runs SET {', '.join(f'{c} = ?' for c in cols)} WHERE pipeline = ? AND run_date = ?",
+                     (*cols.values(), pipeline, run_date))
+
+def run_state(db_path=STATE_DB, pipeline=None):
+    """All runs (optionally of one pipeline), newest date first."""
+    with closing(connect(db_path)) as conn:
+        where, params = ("WHERE pipeline = ?", (pipeline,)) if pipeline else ("", ())
+        return pd.read_sql_query(f"SELECT * FROM runs {where} ORDER BY run_date DESC, pipeline", conn, params=params)
+
+def finished_steps(db_path, pipeline, run_date):
+    """{step: result} of the steps a run already finished."""
+    with closing(connect(db_path)) as conn:
+        rows = conn.execute("SELECT step, result FROM steps WHERE pipeline = ? AND run_date = ?",
+                            (pipeline, run_date)).fetchall()
+    return {step: json.loads(result) for step, result in rows}
+
+def _save_step(db_path, pipeline, run_date, step, result):
+    try:
+        blob = json.dumps(result)
+    except TypeError:
+        return  # not replayable; the step runs again on resume
+    with closing(connect(db_path)) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?)", (pipeline, run_date, step, blob, _now()))
+
+def _lock_path(pipeline, run_date="all"):
+    return lock_path(pipeline, run_date, STATE_DIR / "locks")
+
+def lock_scope(yaml_path):
+    """'pipeline' (default: one run of the pipeline at a time) or 'date' (steps lock what they share)."""
+    cfg = load_pipeline(yaml_path).get("scheduler") or {}
+    scope = cfg.get("lock", "pipeline")
+    if scope not in ("pipeline", "date"):
+        raise ValueError(f"scheduler.lock must be 'pipeline' or 'date', not {scope!r}")
+    return scope
+
+def run_once(yaml_path, run_date, db_path=STATE_DB, force=False):
+    """One locked, recorded pipeline run (executed in a pool worker). Returns its status."""
+    pipeline = pipeline_key(yaml_path)
+    with run_lock(_lock_path(pipeline, run_date)) as acquired:
+        if not acquired:
+            logger.info(f"Scheduler: {run_date} of {yaml_path} is already running; skipped")
+            with closing(connect(db_path)) as conn, conn:
+                # the run holding the lock records its own status; only end the "queued" entry this submit made
+                conn.execute("UPDATE runs SET status = 'skipped', finished_at = ?, error = 'locked by another run' "
+                             "WHERE pipeline = ? AND run_date = ? AND status = 'queued'", (_now(), pipeline, run_date))
+            return "locked"
+        with ExitStack() as stack:
+            if lock_scope(yaml_path) == "pipeline":
+                # other dates write the same artifacts: wait for them
+                stack.enter_context(run_lock(_lock_path(pipeline), wait=True))
+            return _run_recorded(yaml_path, pipeline, run_date, db_path, force)
+
+def _run_recorded(yaml_path, pipeline, run_date, db_path, force):
+    """Run with state and per-step results recorded; resumes from the steps already finished."""
+    done = {} if force else finished_steps(db_path, pipeline, run_date)
+    with closing(connect(db_path)) as conn, conn:
+        conn.execute("INSERT OR IGNORE INTO runs (pipeline, run_date, status) VALUES (?, ?, 'queued')",
+                     (pipeline, run_date))
+        conn.execute("UPDATE runs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                     "finished_at = NULL, error = NULL WHERE pipeline = ? AND run_date = ?",
+                     (_now(), pipeline, run_date))
+    if done:
+        logger.info(f"Scheduler: resuming {run_date}; {len(done)} step(s) already finished")
+    try:
+        run_pipeline(yaml_path, force=force, run_date=run_date, done=done,
+                     on_step=lambda step, result: _save_step(db_path, pipeline, run_date, step, result))
+    except Exception as e:
+        _set_status(db_path, pipeline, run_date, "failed", finished_at=_now(), error=repr(e)[:2000])
+        logger.exception(f"Scheduler: run {run_date} of {yaml_path} failed: {e}")
+        return "failed"
+    with closing(connect(db_path)) as conn, conn:
+        # step results only matter for resuming an unfinished run
+        conn.execute("DELETE FROM steps WHERE pipeline = ? AND run_date = ?", (pipeline, run_date))
+    _set_status(db_path, pipeline, run_date, "ok", finished_at=_now())
+    logger.info(f"Scheduler: run {run_date} of {yaml_path} finished")
+    return "ok"
+
+class PipelineScheduler:
+    """Submits (pipeline, date) runs to a bounded worker pool and keeps their state."""
+
+    def __init__(self, yaml_path="pipeline.yaml", max_concurrent=2, executor="process", db_path=STATE_DB):
+        self.yaml_path = str(yaml_path)
+        self.pipeline = pipeline_key(yaml_path)
+        self.db_path = str(db_path)
+        self.pool = EXECUTORS[executor](max_workers=max(1, int(max_concurrent)))
+        self.futures = {}
+        self.cron = None
+
+    def status(self, run_date):
+        with closing(connect(self.db_path)) as conn:
+            row = conn.execute("SELECT status FROM runs WHERE pipeline = ? AND run_date = ?",
+                               (self.pipeline, run_date)).fetchone()
+        return row[0] if row else None
+
+    def submit(self, run_date=None, force=False, rerun=False):
+        """Queue a run (default today); returns its future, or None if it is pending or already ok."""
+        run_date = _day(run_date or date.today())
+        pending = self.futures.get(run_date)
+        if pending is not None and not pending.done():
+            logger.info(f"Scheduler: {run_date} is already queued or running")
+            return None
+        status = self.status(run_date)
+        if status == "ok" and not (force or rerun):
+            return None
+        if status == "running":
+            with run_lock(_lock_path(self.pipeline, run_date)) as free:
+                if not free:
+                    logger.info(f"Scheduler: {run_date} is running in another process")
+                    return None
+        _set_status(self.db_path, self.pipeline, run_date, "queued", queued_at=_now())
+        future = self.futures[run_date] = self.pool.submit(run_once, self.yaml_path, run_date, self.db_path, force)
+        return future
+
+    def backfill(self, days=None, start=None, end=None, rerun=False, force=False):
+        """Queue the `days` dates before today (or start..end inclusive); at most max_concurrent run at once."""
+        if days is not None:
+            dates = [date.today() - timedelta(days=k) for k in range(int(days), 0, -1)]
+        else:
+            dates = pd.date_range(start, end or date.today(), freq="D")
+        futures = {_day(d): self.submit(d, force=force, rerun=rerun) for d in dates}
+        queued = {d: f for d, f in futures.items() if f is not None}
+        logger.info(f"Scheduler: backfill queued {len(queued)} of {len(futures)} date(s)")
+        return queued
+
+    def resume(self):
+        """Resubmit runs left queued, or running by a process that is gone."""
+        state = run_state(self.db_path, self.pipeline)
+        resumed = {}
+        for run_date, status in zip(state["run_date"], state["status"]):
+            if status not in ("queued", "running"):
+                continue
+            # submit() skips runs whose lock is still held by a live process
+            future = self.submit(run_date, rerun=True)
+            if future is not None:
+                resumed[run_date] = future
+        if resumed:
+            logger.info(f"Scheduler: resuming {len(resumed)} unfinished run(s): {sorted(resumed)}")
+        return resumed
+
+    def start(self, hour=2, minute=0):
+        """Resume unfinished runs, catch up today's if its time has passed, then trigger daily."""
+        self.resume()
+        now = datetime.now()
+        if (now.hour, now.minute) >= (hour, minute):
+            self.submit(now.date())
+        self.cron = BackgroundScheduler()
+        # the job only queues the run, so it never blocks the trigger thread
+        self.cron.add_job(lambda: self.submit(date.today()), "cron", hour=hour, minute=minute,
+                          max_instances=1, coalesce=True, misfire_grace_time=3600)
+        self.cron.start()
+        logger.info(f"Scheduler started — pipeline scheduled daily at {hour:02d}:{minute:02d}")
+
+    def wait(self, futures=None):
+        """Block until the given (default: all submitted) runs finish; returns {date: status}."""
+        futures = self.futures if futures is None else futures
+        return {d: f.result() for d, f in sorted(futures.items())}
+
+    def shutdown(self, wait=True):
+        if self.cron is not None:
+            self.cron.shutdown(wait=False)
+        self.pool.shutdown(wait=wait, cancel_futures=not wait)
+
+def start_scheduler(yaml_path="pipeline.yaml", hour=2, minute=0, max_concurrent=2):
+    sched = PipelineScheduler(yaml_path, max_concurrent=max_concurrent)
+    sched.start(hour, minute)
     try:
-        sched.start()
+        while True:
+            time.sleep(1)
     except (KeyboardInterrupt, SystemExit):
         logger.info("Scheduler stopped")
+    finally:
+        # queued runs stay "queued" in the state db and are resumed on the next start
+        sched.shutdown(wait=False)
 
 if __name__ == "__main__":
-    start_scheduler()
+    parser = argparse.ArgumentParser(description="Schedule, backfill and resume pipeline runs")
+    parser.add_argument("yaml_path", nargs="?", default="pipeline.yaml")
+    parser.add_argument("--hour", type=int, default=2)
+    parser.add_argument("--minute", type=int, default=0)
+    parser.add_argument("--max-concurrent", type=int, default=2, help="pipeline runs at once")
+    parser.add_argument("--backfill", type=int, default=None, metavar="N", help="run the last N days, then exit")
+    parser.add_argument("--start", default=None, help="backfill from this date (YYYY-MM-DD) instead")
+    parser.add_argument("--end", default=None, help="last backfill date (default today)")
+    parser.add_argument("--rerun", action="store_true", help="backfill dates that already succeeded too")
+    parser.add_argument("--resume", action="store_true", help="finish queued/interrupted runs and exit")
+    parser.add_argument("--status", action="store_true", help="print the recorded runs and exit")
+    args = parser.parse_args()
+    if args.status:
+        print(run_state(pipeline=pipeline_key(args.yaml_path)).to_string(index=False))
+    elif args.resume or args.backfill is not None or args.start:
+        sched = PipelineScheduler(args.yaml_path, max_concurrent=args.max_concurrent)
+        try:
+            if args.resume:
+                futures = sched.resume()
+            else:
+                futures = sched.backfill(args.backfill, args.start, args.end, rerun=args.rerun)
+            results = sched.wait(futures)
+        finally:
+            sched.shutdown()
+        print(json.dumps(results, indent=2))
+    else:
+        start_scheduler(args.yaml_path, args.hour, args.minute, args.max_concurrent)
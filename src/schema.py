@@ -0,0 +1,53 @@
+"""Column types of the raw, processed and prediction tables.
+
+    location       category (sorted categories, so sorts and groupbys stay lexical)
+    timestamp/date datetime64
+    measurements   float32 (pm25 ... precip, the daily aggregates, features, forecasts)
+
+`conform(df, table)` casts a frame to its table's schema in place and is
+called wherever a stage reads or writes one of these tables, so every stage
+sees the same dtypes whatever the storage format (CSV has no types, Parquet
+keeps them). Float columns not named in a schema are measurements too and
+become float32. Integer columns are left alone.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORY = "category"
+DATETIME = "datetime64"
+FLOAT = "float32"
+
+SENSOR_COLUMNS = ("pm25", "pm10", "no2", "so2")
+WEATHER_COLUMNS = ("temp", "humidity", "wind_speed", "precip")
+
+TABLES = {
+    "sensor": {"timestamp": DATETIME, "location": CATEGORY, **{c: FLOAT for c in SENSOR_COLUMNS}},
+    "weather": {"timestamp": DATETIME, "location": CATEGORY, **{c: FLOAT for c in WEATHER_COLUMNS}},
+    "processed": {"location": CATEGORY, "date": DATETIME},
+    "predictions": {"location": CATEGORY, "date": DATETIME, "pm25_pred_next_day": FLOAT, "aqi": FLOAT,
+                    "aqi_category": CATEGORY},
+}
+
+def _category(s):
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        return s.astype(CATEGORY)
+    cats = s.cat.categories
+    return s if cats.is_monotonic_increasing else s.cat.set_categories(cats.sort_values())
+
+def conform(df, table):
+    """Cast `df` to the schema of `table` ("sensor", "weather", "processed", "predictions"); returns df."""
+    if df is None:
+        return df
+    spec = TABLES[table]
+    for col in df.columns:
+        kind = spec.get(col)
+        s = df[col]
+        if kind == CATEGORY:
+            df[col] = _category(s)
+        elif kind == DATETIME:
+            if not pd.api.types.is_datetime64_any_dtype(s):
+                df[col] = pd.to_datetime(s)
+        elif kind == FLOAT or (kind is None and pd.api.types.is_float_dtype(s)):
+            if s.dtype != np.float32:
+                df[col] = s.astype(np.float32)
+    return df
@@ -0,0 +1,289 @@
+"""Long-lived local prediction server with a warm model and micro-batching.
+
+    python -m src.serve --port 8008
+
+Endpoints (JSON):
+    GET  /predict?location=Tokyo&location=Zurich   next-day forecast from the latest features
+                                                   (all locations when none given)
+    POST /predict  {"rows": [{<feature>: value, ...}, ...]}   forecast for arbitrary feature rows
+    GET  /metrics  request/batch counters, latency percentiles, throughput
+    GET  /healthz
+
+The model and the latest feature row per location are loaded once and reloaded
+in the background when the model or processed data file changes. Concurrent
+requests are queued and answered by a single `model.predict` call per batch.
+"""
+import argparse
+import json
+import threading
+import time
+import warnings
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from queue import Empty, Queue
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from .aqi import aqi_index, categorize
+from .config import MODELS_DIR, PROCESSED_PATH
+from .model import FEATURES, latest_features, load_model, model_file
+from .utils import get_logger
+
+logger = get_logger()
+
+def _mtime(path):
+    path = Path(path)
+    if path.is_dir():
+        return max((p.stat().st_mtime_ns for p in path.rglob("*") if p.is_file()), default=0)
+    return path.stat().st_mtime_ns if path.exists() else 0
+
+class ModelState:
+    """The loaded model plus the latest feature row per location, swapped atomically on reload."""
+
+    def __init__(self, model_path, data_path):
+        self.model_path = Path(model_path)
+        self.data_path = Path(data_path)
+        self.stamp = None
+        self.reloads = 0
+        self.current = None
+        self.reload()
+
+    def reload(self):
+        stamp = (_mtime(model_file(self.model_path)), _mtime(self.data_path))
+        model = load_model(self.model_path)
+        latest = latest_features(self.data_path)
+        latest["location"] = latest["location"].astype(str)
+        self.current = (model, latest.set_index("location"))
+        self.stamp = stamp
+        self.reloads += 1
+        logger.info(f"Prediction server loaded {self.model_path} and {len(latest)} locations")
+
+    def changed(self):
+        return (_mtime(model_file(self.model_path)), _mtime(self.data_path)) != self.stamp
+
+    def watch(self, interval, stop):
+        while not stop.wait(interval):
+            try:
+                if self.changed():
+                    self.reload()
+            except Exception as e:  # keep serving the previous model
+                logger.exception(f"Prediction server reload failed: {e}")
+
+class Metrics:
+    def __init__(self, window=10_000):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=window)  # seconds, most recent requests
+        self.finished = deque(maxlen=window)   # completion timestamps, for recent throughput
+
+    def observe(self, seconds, rows, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.rows += rows
+            self.latencies.append(seconds)
+            self.finished.append(time.time())
+
+    def batch(self):
+        with self.lock:
+            self.batches += 1
+
+    def snapshot(self):
+        with self.lock:
+            lat = np.array(self.latencies) * 1000
+            now = time.time()
+            recent = sum(1 for t in self.finished if now - t <= 10)
+            uptime = now - self.started
+            out = {
+                "uptime_s": round(uptime, 1),
+                "requests_total": self.requests,
+                "errors_total": self.errors,
+                "rows_predicted_total": self.rows,
+                "batches_total": self.batches,
+                "avg_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0.0,
+                "throughput_rps": round(self.requests / uptime, 2) if uptime else 0.0,
+                "throughput_rps_10s": round(recent / 10, 2),
+            }
+            for p in (50, 95, 99):
+                out[f"latency_p{p}_ms"] = round(float(np.percentile(lat, p)), 3) if len(lat) else None
+            return out
+
+class MicroBatcher:
+    """Collects queued feature rows for up to `max_wait` seconds / `max_rows` rows, then predicts once."""
+
+    def __init__(self, state, metrics, max_rows=1024, max_wait=0.005):
+        self.state = state
+        self.metrics = metrics
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.queue = Queue()
+
+    def submit(self, X):
+        fut = Future()
+        self.queue.put((X, fut))
+        return fut
+
+    def run(self, stop):
+        while not stop.is_set():
+            try:
+                first = self.queue.get(timeout=0.1)
+            except Empty:
+                continue
+            batch, n = [first], len(first[0])
+            deadline = time.perf_counter() + self.max_wait
+            while n < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except Empty:
+                    break
+                batch.append(item)
+                n += len(item[0])
+            self._predict(batch)
+
+    def _predict(self, batch):
+        model, _ = self.state.current
+        try:
+            with warnings.catch_warnings():
+                # rows arrive as plain arrays in FEATURES order; the model was fit on a DataFrame
+                warnings.filterwarnings("ignore", message="X does not have valid feature names")
+                preds = model.predict(np.vstack([X for X, _ in batch]))
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        self.metrics.batch()
+        start = 0
+        for X, fut in batch:
+            fut.set_result(preds[start:start + len(X)])
+            start += len(X)
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model_path, data_path, max_rows=1024, max_wait=0.005, reload_interval=2.0):
+        super().__init__(address, _Handler)
+        self.state = ModelState(model_path, data_path)
+        self.metrics = Metrics()
+        self.batcher = MicroBatcher(self.state, self.metrics, max_rows=max_rows, max_wait=max_wait)
+        self._stop = threading.Event()
+        self._workers = [
+            threading.Thread(target=self.batcher.run, args=(self._stop,), daemon=True),
+            threading.Thread(target=self.state.watch, args=(reload_interval, self._stop), daemon=True),
+        ]
+        for t in self._workers:
+            t.start()
+
+    def predict_locations(self, locations):
+        _, latest = self.state.current
+        rows = latest if not locations else latest.loc[[l for l in locations if l in latest.index]]
+        if rows.empty:
+            return []
+        preds = self.batcher.submit(rows[FEATURES].to_numpy(dtype=float)).result()
+        dates = rows["date"].dt.strftime("%Y-%m-%d")
+        return [{"location": loc, "date": d, "pm25_pred_next_day": float(p), "aqi": float(a), "aqi_category": c}
+                for loc, d, p, a, c in zip(rows.index, dates, preds, aqi_index(preds), categorize(preds))]
+
+    def predict_rows(self, rows):
+        X = np.array([[float(r.get(f, 0) or 0) for f in FEATURES] for r in rows], dtype=float).reshape(-1, len(FEATURES))
+        if not len(X):
+            return []
+        preds = self.batcher.submit(X).result()
+        return [{"pm25_pred_next_day": float(p), "aqi": float(a), "aqi_category": c}
+                for p, a, c in zip(preds, aqi_index(preds), categorize(preds))]
+
+    def server_close(self):
+        self._stop.set()
+        super().server_close()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so load tests measure the server and not TCP setup
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except (KeyError, ValueError, TypeError) as e:
+            self.server.metrics.observe(time.perf_counter() - start, 0, error=True)
+            return self._send(400, {"error": str(e)})
+        except Exception as e:
+            logger.exception(f"Prediction request failed: {e}")
+            self.server.metrics.observe(time.perf_counter() - start, 0, error=True)
+            return self._send(500, {"error": str(e)})
+        self.server.metrics.observe(time.perf_counter() - start, len(result))
+        self._send(200, {"predictions": result})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/predict":
+            locations = parse_qs(url.query).get("location", [])
+            return self._timed(lambda: self.server.predict_locations(locations))
+        if url.path == "/metrics":
+            snap = self.server.metrics.snapshot()
+            snap["model_reloads_total"] = self.server.state.reloads
+            return self._send(200, snap)
+        if url.path == "/healthz":
+            return self._send(200, {"status": "ok"})
+        self._send(404, {"error": f"unknown path {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/predict":
+            return self._send(404, {"error": f"unknown path {url.path}"})
+        self._timed(lambda: self.server.predict_rows(self._rows()))
+
+    def _rows(self):
+        """The "rows" of the request body; ValueError/TypeError (a 400) when it is not a JSON object of objects."""
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise ValueError(f"invalid JSON body: {e}") from None
+        if not isinstance(body, dict):
+            raise TypeError(f"body must be a JSON object, not {type(body).__name__}")
+        rows = body.get("rows", [])
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise TypeError('"rows" must be a list of objects')
+        return rows
+
+def serve(host="127.0.0.1", port=8008, model_path=MODELS_DIR / "aqi_model.joblib", data_path=PROCESSED_PATH,
+          max_rows=1024, max_wait_ms=5.0, reload_interval=2.0):
+    server = PredictionServer((host, port), model_path, data_path, max_rows=max_rows,
+                              max_wait=max_wait_ms / 1000, reload_interval=reload_interval)
+    logger.info(f"Prediction server listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve next-day PM2.5 forecasts over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--model", default=str(MODELS_DIR / "aqi_model.joblib"))
+    parser.add_argument("--data", default=str(PROCESSED_PATH))
+    parser.add_argument("--max-batch-rows", type=int, default=1024)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--reload-interval", type=float, default=2.0)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.model, args.data, args.max_batch_rows, args.max_wait_ms, args.reload_interval)
@@ -0,0 +1,155 @@
+"""Per-shard (per-location or per-region) models trained and used in parallel.
+
+    train_sharded(data_path, registry_dir, shard_by="location")
+    predict_sharded(registry_dir / "registry.json", data_path, store_path=...)
+
+A shard is every location sharing a value of `shard_by`: a column of the
+processed table (e.g. "location") or, with `regions`, a {location: region}
+mapping (locations missing from it use the global model). Each shard is
+fitted in its own worker process (joblib/loky, one core per fit) and reads
+only its rows from the processed table (pushed down for Parquet datasets
+partitioned by location). Shards with fewer than `min_rows` training rows
+(the default, 14, is two weeks of one location) get no model of their own; they, and locations never seen in training, are
+predicted by a global model fitted on all rows.
+
+The registry (registry.json next to the shard models) records each shard's
+locations, model path, RMSE and whether it falls back to the global model.
+"""
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+import joblib
+from joblib import Parallel, delayed
+from sklearn.metrics import mean_squared_error
+from .config import MODELS_DIR, PROCESSED_PATH
+from .forest import export_forest, exportable
+from .model import FEATURES, latest_features, load_model, make_estimator, save_predictions, time_split, training_frame
+from .storage import read_table
+from .utils import get_logger
+
+logger = get_logger()
+
+REGISTRY_DIR = MODELS_DIR / "shards"
+GLOBAL = "__global__"
+
+def _safe(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(name))
+
+def shard_assignments(locations, shard_by="location", regions=None, data_path=None):
+    """{location: shard name}; locations without a shard are left out (global model)."""
+    locations = [str(l) for l in locations]
+    if regions:
+        return {loc: str(regions[loc]) for loc in locations if loc in regions}
+    if shard_by == "location":
+        return {loc: loc for loc in locations}
+    # any other column of the processed table that is constant per location
+    keys = read_table(data_path, columns=["location", shard_by]).drop_duplicates("location")
+    mapping = dict(zip(keys["location"].astype(str), keys[shard_by].astype(str)))
+    return {loc: mapping[loc] for loc in locations if loc in mapping}
+
+def _fit(name, data_path, locations, estimator, test_size, min_rows, model_path, arrays_path):
+    """Fit one shard (or the global model when `locations` is None) in a worker process."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    filters = [("location", "in", list(locations))] if locations is not None else None
+    df = training_frame(data_path, filters=filters)
+    is_train = time_split(df["date"], test_size) if df["date"].nunique() > 1 else None
+    n_train = int(is_train.sum()) if is_train is not None else 0
+    entry = {"rows": int(len(df)), "train_rows": n_train, "locations": locations}
+    if locations is not None and n_train < min_rows:
+        return name, {**entry, "model_path": None, "fallback": True, "rmse": None,
+                      "fit_seconds": 0.0, "cpu_seconds": round(time.process_time() - cpu, 3)}
+    X, y = df[FEATURES], df["pm25_next_day"]
+    model = make_estimator(estimator, n_jobs=1)
+    if is_train is not None and n_train and (~is_train).any():
+        model.fit(X[is_train], y[is_train])
+        rmse = float(mean_squared_error(y[~is_train], model.predict(X[~is_train])) ** 0.5)
+    else:
+        rmse = None
+    model.fit(X, y)  # the served model sees every day
+    Path(model_path).parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, model_path)
+    if arrays_path and exportable(model):
+        export_forest(model, arrays_path)
+    else:
+        arrays_path = None
+    return name, {**entry, "model_path": str(arrays_path or model_path), "fallback": False, "rmse": rmse,
+                  "fit_seconds": round(time.perf_counter() - wall, 3),
+                  "cpu_seconds": round(time.process_time() - cpu, 3)}
+
+def train_sharded(data_path=PROCESSED_PATH, registry_dir=REGISTRY_DIR, shard_by="location", regions=None,
+                  min_rows=14, test_size=0.2, estimator=None, max_workers=-1, export_arrays=False):
+    """Fit a model per shard plus the global fallback in parallel; write and return the registry."""
+    registry_dir = Path(registry_dir)
+    locations = read_table(data_path, columns=["location"])["location"].astype(str).unique()
+    assign = shard_assignments(sorted(locations), shard_by, regions, data_path)
+    shards = {}
+    for loc, shard in assign.items():
+        shards.setdefault(shard, []).append(loc)
+
+    def paths(name):
+        base = registry_dir / _safe(name)
+        return str(base.with_suffix(".joblib")), (str(base.with_suffix(".forest")) if export_arrays else None)
+
+    tasks = [(GLOBAL, None)] + sorted(shards.items())
+    wall = time.perf_counter()
+    fitted = Parallel(n_jobs=max_workers)(
+        delayed(_fit)(name, str(data_path), locs, estimator, test_size, min_rows, *paths(name))
+        for name, locs in tasks)
+    wall = time.perf_counter() - wall
+    fitted = dict(fitted)
+    cpu = sum(entry["cpu_seconds"] for entry in fitted.values())
+    registry = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "data_path": str(data_path),
+        "shard_by": "regions" if regions else shard_by,
+        "regions": regions or None,
+        "min_rows": min_rows,
+        "estimator": estimator,
+        "global": fitted.pop(GLOBAL),
+        "shards": fitted,
+        "wall_seconds": round(wall, 3),
+        "cores_used": round(cpu / wall, 2) if wall else 0.0,
+    }
+    registry_dir.mkdir(parents=True, exist_ok=True)
+    registry_path = registry_dir / "registry.json"
+    with open(registry_path, "w") as f:
+        json.dump(registry, f, indent=2)
+    n_fallback = sum(1 for e in fitted.values() if e["fallback"])
+    logger.info(f"Sharded training: {len(fitted)} shards ({n_fallback} use the global model) "
+                f"in {wall:.2f}s on {registry['cores_used']} cores; registry {registry_path}")
+    return {"registry_path": str(registry_path), "shards": len(fitted), "fallback_shards": n_fallback,
+            "wall_seconds": registry["wall_seconds"], "cores_used": registry["cores_used"]}
+
+def load_registry(registry_path):
+    with open(registry_path) as f:
+        return json.load(f)
+
+def _predict(name, model_path, rows):
+    model = load_model(model_path)
+    return name, model.predict(rows[FEATURES])
+
+def predict_sharded(registry_path=REGISTRY_DIR / "registry.json", data_path=PROCESSED_PATH, output_path=None,
+                    store_path=None, max_workers=-1):
+    """Next-day forecast per location with its shard's model (global model for fallbacks)."""
+    registry = load_registry(registry_path)
+    last = latest_features(data_path)
+    last["location"] = last["location"].astype(str)
+    owner = {loc: name for name, entry in registry["shards"].items()
+             if not entry["fallback"] for loc in entry["locations"]}
+    last["model_shard"] = last["location"].map(owner).fillna(GLOBAL)
+    models = {name: e["model_path"] for name, e in registry["shards"].items() if not e["fallback"]}
+    models[GLOBAL] = registry["global"]["model_path"]
+    groups = list(last.groupby("model_shard", sort=False))
+    # process-pool start-up only pays off with more than a handful of shards
+    n_jobs = max_workers if len(groups) > 4 else 1
+    preds = dict(Parallel(n_jobs=n_jobs)(
+        delayed(_predict)(name, models[name], rows) for name, rows in groups))
+    last["pm25_pred_next_day"] = 0.0
+    for name, rows in groups:
+        last.loc[rows.index, "pm25_pred_next_day"] = preds[name]
+    out = last[["location", "date", "pm25_pred_next_day", "model_shard"]].copy()
+    logger.info(f"Sharded prediction for {len(out)} locations with {len(groups)} models "
+                f"({(out['model_shard'] == GLOBAL).sum()} from the global model)")
+    return save_predictions(out, output_path, store_path, source="predict_sharded")
@@ -0,0 +1,289 @@
+"""Artifact storage: read/write tables as CSV or Parquet, chosen by file suffix.
+
+Every stage goes through `read_table` / `write_table` so the on-disk format is a
+property of the path in `pipeline.yaml` (or `config.py`), not of the code.
+Parquet needs `pyarrow`; CSV is always available and remains the export format.
+"""
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+import pandas as pd
+
+# columns parsed as datetimes on read (CSV has no types, Parquet may store dates as date32)
+DATE_COLUMNS = ("timestamp", "date")
+
+_OPS = {
+    "==": lambda s, v: s == v,
+    "=": lambda s, v: s == v,
+    "!=": lambda s, v: s != v,
+    "<": lambda s, v: s < v,
+    "<=": lambda s, v: s <= v,
+    ">": lambda s, v: s > v,
+    ">=": lambda s, v: s >= v,
+    "in": lambda s, v: s.isin(list(v)),
+    "not in": lambda s, v: ~s.isin(list(v)),
+}
+
+def _parse_dates(df):
+    for col in DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+def apply_filters(df, filters):
+    """Apply pyarrow-style filters [(column, op, value), ...] (AND-ed) to a frame."""
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if op not in _OPS:
+            raise ValueError(f"Unsupported filter operator {op!r}")
+        mask &= _OPS[op](df[col], value)
+    return df[mask].reset_index(drop=True)
+
+def _remove(path):
+    path = Path(path)
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+class CsvStorage:
+    """Plain CSV. Filters are applied after parsing, so they save memory, not I/O."""
+
+    def read(self, path, columns=None, filters=None):
+        usecols = None
+        if columns is not None:
+            # filter columns must be parsed even if they are not returned
+            usecols = list(dict.fromkeys(list(columns) + [f[0] for f in filters or []]))
+        # round_trip so values written by to_csv read back bit-identical
+        df = _parse_dates(pd.read_csv(path, usecols=usecols, float_precision="round_trip"))
+        df = apply_filters(df, filters)
+        return df[list(columns)] if columns is not None else df
+
+    def iter_chunks(self, path, chunk_rows, columns=None):
+        reader = pd.read_csv(path, usecols=list(columns) if columns is not None else None,
+                             chunksize=chunk_rows, float_precision="round_trip")
+        for chunk in reader:
+            yield _parse_dates(chunk.reset_index(drop=True))
+
+    def open_writer(self, path, partition_cols=None):
+        return _CsvWriter(path)
+
+class _CsvWriter:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.first = True
+
+    def write(self, df):
+        if self.first:
+            _remove(self.path)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(self.path, index=False, mode="w" if self.first else "a", header=self.first)
+        self.first = False
+
+    def close(self):
+        pass
+
+class ParquetStorage:
+    """Parquet via pyarrow: typed columns, column projection and predicate pushdown.
+
+    With `partition_cols` the path is a hive-partitioned directory
+    (e.g. ``processed.parquet/location=Tokyo/part-0-0.parquet``) and filters on
+    partition columns skip whole directories; otherwise it is a single file whose
+    row-group statistics let filters on e.g. `timestamp` skip row groups.
+    """
+
+    def read(self, path, columns=None, filters=None):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=list(columns) if columns is not None else None,
+                              filters=[tuple(f) for f in filters] if filters else None)
+        df = table.to_pandas()
+        if columns is not None:
+            return _parse_dates(df[list(columns)])
+        # partition columns come back last; restore the column order that was written
+        written = [c["name"] for c in (table.schema.pandas_metadata or {}).get("columns", [])]
+        order = [c for c in written if c in df.columns]
+        return _parse_dates(df[order + [c for c in df.columns if c not in order]])
+
+    def iter_chunks(self, path, chunk_rows, columns=None):
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+        columns = list(columns) if columns is not None else None
+        if Path(path).is_dir():
+            batches = ds.dataset(path, format="parquet", partitioning="hive").to_batches(
+                columns=columns, batch_size=chunk_rows)
+        else:
+            batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns)
+        for batch in batches:
+            if batch.num_rows:
+                yield _parse_dates(batch.to_pandas())
+
+    def open_writer(self, path, partition_cols=None):
+        return _ParquetWriter(path, partition_cols)
+
+    def write_partitions(self, df, path, partition_cols):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        # delete_matching: every partition df has rows for is replaced, the others are not touched
+        ds.write_dataset(pa.Table.from_pandas(df, preserve_index=False), path, format="parquet",
+                         partitioning=list(partition_cols), partitioning_flavor="hive",
+                         basename_template="part-0-{i}.parquet", existing_data_behavior="delete_matching")
+
+class _ParquetWriter:
+    def __init__(self, path, partition_cols=None):
+        self.path = Path(path)
+        self.partition_cols = list(partition_cols or [])
+        self.writer = None
+        self.chunks = 0
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self.chunks == 0:
+            _remove(self.path)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.partition_cols:
+            import pyarrow.dataset as ds
+            ds.write_dataset(table, self.path, format="parquet",
+                             partitioning=self.partition_cols, partitioning_flavor="hive",
+                             basename_template=f"part-{self.chunks}-{{i}}.parquet",
+                             existing_data_behavior="overwrite_or_ignore")
+        else:
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        self.chunks += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+BACKENDS = {".csv": CsvStorage(), ".parquet": ParquetStorage()}
+
+def register_backend(suffix, backend):
+    """Register a storage backend (an object with `read`, `iter_chunks` and `open_writer`) for a suffix."""
+    BACKENDS[suffix.lower()] = backend
+
+def backend_for(path):
+    suffix = Path(path).suffix.lower()
+    if suffix not in BACKENDS:
+        raise ValueError(f"No storage backend for {path} (known: {', '.join(BACKENDS)})")
+    return BACKENDS[suffix]
+
+# rows / on-disk bytes moved through this module, per context (see track_io)
+_IO = ContextVar("storage_io", default=None)
+
+def _disk_size(path):
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+def _count(direction, rows, path=None):
+    counters = _IO.get()
+    if counters is not None:
+        counters[f"rows_{direction}"] += rows
+        if path is not None:
+            counters[f"bytes_{direction}"] += _disk_size(path)
+
+@contextmanager
+def track_io():
+    """Count rows and bytes read/written by read_table, iter_table and open_writer in this context.
+
+    Bytes are the on-disk size of the files touched, so a projected or
+    filtered Parquet read still counts the whole file.
+    """
+    counters = {"rows_in": 0, "rows_out": 0, "bytes_in": 0, "bytes_out": 0}
+    token = _IO.set(counters)
+    try:
+        yield counters
+    finally:
+        _IO.reset(token)
+
+def read_table(path, columns=None, filters=None):
+    """Read a table, optionally projecting `columns` and pushing down `filters`."""
+    df = backend_for(path).read(path, columns=columns, filters=filters)
+    _count("in", len(df), path)
+    return df
+
+def iter_table(path, chunk_rows=500_000, columns=None):
+    """Yield a table as DataFrames of at most `chunk_rows` rows, in file order."""
+    chunks = backend_for(path).iter_chunks(path, chunk_rows, columns=columns)
+    if _IO.get() is None:
+        return chunks
+    return _counted_chunks(chunks, path)
+
+def _counted_chunks(chunks, path):
+    _count("in", 0, path)
+    for chunk in chunks:
+        _count("in", len(chunk))
+        yield chunk
+
+def write_table(df, path, partition_cols=None):
+    with open_writer(path, partition_cols=partition_cols) as writer:
+        writer.write(df)
+    return str(path)
+
+@contextmanager
+def open_writer(path, partition_cols=None):
+    """Write a table chunk by chunk: `with open_writer(p) as w: w.write(df)`."""
+    writer = backend_for(path).open_writer(path, partition_cols=partition_cols)
+    counted = _CountingWriter(writer)
+    try:
+        yield counted
+    finally:
+        writer.close()
+        _count("out", counted.rows, path)
+
+class _CountingWriter:
+    def __init__(self, writer):
+        self.writer = writer
+        self.rows = 0
+
+    def write(self, df):
+        self.writer.write(df)
+        self.rows += len(df)
+
+def partitioned(path, partition_cols):
+    """True if `path` is an existing dataset partitioned by `partition_cols` that write_partitions can update."""
+    return bool(partition_cols) and hasattr(backend_for(path), "write_partitions") and Path(path).is_dir()
+
+def write_partitions(df, path, partition_cols):
+    """Replace only the partitions of dataset `path` that `df` has rows for; returns the path."""
+    if not partitioned(path, partition_cols):
+        raise ValueError(f"{path} is not a dataset partitioned by {partition_cols}")
+    backend_for(path).write_partitions(df, path, partition_cols)
+    _count("out", len(df), path)
+    return str(path)
+
+def export_table(src_path, out_path, columns=None, filters=None):
+    """Pipeline step: copy a table to another format (e.g. Parquet -> CSV for sharing)."""
+    return write_table(read_table(src_path, columns=columns, filters=filters), out_path)
+
+def publish_table(src_path, out_path, as_of=None):
+    """Pipeline step: copy a run's table to the shared `out_path` unless a later `as_of` is published there.
+
+    Runs write their tables per date, so a backfilled date never replaces the
+    newer table that the dashboard, server and monitor read.
+    """
+    src, out = Path(src_path), Path(out_path)
+    marker = Path(f"{out}.published.json")
+    current = json.loads(marker.read_text()).get("as_of") if marker.exists() else None
+    if as_of and current and as_of < current:
+        return {"published": False, "out_path": str(out), "as_of": current}
+    tmp = out.with_name(f"{out.name}.{os.getpid()}.tmp")
+    _remove(tmp)
+    if src.is_dir():
+        shutil.copytree(src, tmp)
+    else:
+        shutil.copy2(src, tmp)
+    _remove(out)
+    os.replace(tmp, out)
+    marker.write_text(json.dumps({"as_of": as_of, "src_path": str(src)}))
+    return {"published": True, "out_path": str(out), "as_of": as_of}
@@ -0,0 +1,279 @@
+"""Streaming ingestion: hourly sensor/weather events in, daily features and nowcasts out.
+
+    python -m src.streaming --listen 127.0.0.1:8765 --store artifacts/predictions/predictions.sqlite
+    python -m src.streaming --tail events.jsonl
+    python benchmarks/replay_stream.py          # feed sensor_readings/weather at a chosen speed
+
+Events are JSON objects, one per line on a socket or file, or dicts put on an
+asyncio.Queue in-process:
+
+    {"type": "sensor",  "timestamp": "2025-01-01T13:00:00", "location": "Tokyo", "pm25": 31.2, ...}
+    {"type": "weather", "timestamp": "2025-01-01T13:00:00", "location": "Tokyo", "temp": 8.1, ...}
+    {"type": "flush"}   close every open day        {"type": "stop"}   flush and stop
+
+Hourly rows are buffered per location and day. A location's day closes once
+both its sensor and weather feeds have moved past it, or once any event is
+more than `lateness` past the end of the day (a silent feed cannot hold days
+open). Closed days are joined, aggregated and featurized with the same code as
+`run_etl` (`_merge`, `_aggregate_daily`, a per-location feature tail), so the
+daily rows equal the batch ETL output. Each batch of closed days is predicted
+at once and appended to the prediction store. Events for a day that already
+closed are counted and dropped.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .etl import _aggregate_daily, _FeatureStream, _merge
+from .model import FEATURES, load_model, model_file, save_predictions
+from .schema import SENSOR_COLUMNS, WEATHER_COLUMNS, conform
+from .utils import get_logger
+
+logger = get_logger()
+
+FIELDS = {"sensor": SENSOR_COLUMNS, "weather": WEATHER_COLUMNS}
+DAY = pd.Timedelta(days=1)
+
+def _stamp(path):
+    path = Path(path)
+    if path.is_dir():
+        return max((p.stat().st_mtime_ns for p in path.iterdir() if p.is_file()), default=0)
+    return path.stat().st_mtime_ns if path.exists() else 0
+
+class _Location:
+    __slots__ = ("days", "seen", "closed")
+
+    def __init__(self):
+        self.days = {}                                # day -> {"sensor": [rows], "weather": [rows]}
+        self.seen = {"sensor": None, "weather": None}  # newest timestamp per feed
+        self.closed = None                            # last day closed
+
+class StreamProcessor:
+    """Online daily aggregation, features and next-day predictions for a stream of hourly events."""
+
+    def __init__(self, model_path=None, store_path=None, features=None, lateness_hours=1.0,
+                 collect=False, on_predictions=None, window=100_000):
+        self.model_path = model_path
+        self.store_path = store_path
+        self.lateness = pd.Timedelta(hours=lateness_hours)
+        self.collect = collect
+        self.on_predictions = on_predictions
+        self.features = _FeatureStream(features, keep=collect)
+        self.locations = {}
+        self.max_ts = None
+        self.swept = None
+        self.closing = []  # (location, day, rows, received) waiting for the next emit
+        self.latest = {}   # location -> last prediction row
+        self.model, self.model_stamp = None, None
+        self.counts = {"events": 0, "late_events": 0, "bad_events": 0, "days_closed": 0, "predictions": 0}
+        self.latencies = deque(maxlen=window)
+        self.started = time.perf_counter()
+
+    # -- events --------------------------------------------------------------
+    def handle(self, event, received=None):
+        """Buffer one event; returns False for a stop event."""
+        kind = event.get("type")
+        if kind == "stop":
+            self.flush()
+            return False
+        if kind == "flush":
+            self.flush()
+            return True
+        try:
+            ts = pd.Timestamp(event["timestamp"])
+            loc = str(event["location"])
+            row = (ts, loc) + tuple(float(event.get(f, np.nan)) for f in FIELDS[kind])
+        except (KeyError, TypeError, ValueError):
+            self.counts["bad_events"] += 1
+            return True
+        self.counts["events"] += 1
+        state = self.locations.get(loc)
+        if state is None:
+            state = self.locations[loc] = _Location()
+        day = ts.normalize()
+        if state.closed is not None and day <= state.closed:
+            self.counts["late_events"] += 1
+            return True
+        state.days.setdefault(day, {"sensor": [], "weather": []})[kind].append(row)
+        if state.seen[kind] is None or ts > state.seen[kind]:
+            state.seen[kind] = ts
+        received = time.perf_counter() if received is None else received
+        # both feeds past the day -> it is complete for this location
+        if None not in state.seen.values():
+            self._close(loc, state, min(state.seen.values()).normalize(), received)
+        if self.max_ts is None or ts > self.max_ts:
+            self.max_ts = ts
+            cutoff = (ts - self.lateness).normalize()
+            if self.swept is None or cutoff > self.swept:
+                self.swept = cutoff
+                for name, other in self.locations.items():
+                    self._close(name, other, cutoff, received)
+        return True
+
+    def _close(self, loc, state, before, received):
+        for day in sorted(d for d in state.days if d < before):
+            self.closing.append((loc, day, state.days.pop(day), received))
+            state.closed = day
+
+    def flush(self):
+        """Close every open day (end of stream)."""
+        now = time.perf_counter()
+        for loc, state in self.locations.items():
+            if state.days:
+                self._close(loc, state, max(state.days) + DAY, now)
+        return self.emit()
+
+    # -- closed days -----------------------------------------------------------
+    def _frame(self, kind, rows):
+        df = pd.DataFrame.from_records(rows, columns=("timestamp", "location") + FIELDS[kind])
+        df["timestamp"] = df["timestamp"].astype("datetime64[ns]")
+        return conform(df, kind)
+
+    def _model(self):
+        if not self.model_path:
+            return None
+        stamp = _stamp(model_file(self.model_path))
+        if stamp != self.model_stamp:  # retrained since the last batch
+            self.model, self.model_stamp = load_model(self.model_path), stamp
+            logger.info(f"Streaming: loaded model {self.model_path}")
+        return self.model
+
+    def emit(self):
+        """Aggregate, featurize and predict every day closed since the last call; returns the daily rows."""
+        if not self.closing:
+            return None
+        closing, self.closing = self.closing, []
+        s = self._frame("sensor", [r for _, _, rows, _ in closing for r in rows["sensor"]])
+        w = self._frame("weather", [r for _, _, rows, _ in closing for r in rows["weather"]])
+        daily = conform(self.features.push(_aggregate_daily(_merge(s, w))), "processed")
+        self.counts["days_closed"] += len(daily)
+        model = self._model()
+        if model is not None and not daily.empty:
+            out = daily[["location", "date"]].reset_index(drop=True)
+            out["pm25_pred_next_day"] = model.predict(daily[FEATURES].fillna(0))
+            save_predictions(out, store_path=self.store_path, source="stream")  # adds the AQI columns
+            self.latest.update((row["location"], row) for row in out.to_dict("records"))
+            self.counts["predictions"] += len(out)
+            if self.on_predictions:
+                self.on_predictions(out)
+        done = time.perf_counter()
+        self.latencies.extend(done - received for _, _, _, received in closing)
+        return daily
+
+    def result(self):
+        """Every daily row produced so far (collect=True), like `run_etl` output."""
+        return conform(self.features.result(), "processed")
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        lat = np.array(self.latencies) * 1000
+        out = {**self.counts, "open_days": sum(len(s.days) for s in self.locations.values()),
+               "locations": len(self.locations), "elapsed_s": round(elapsed, 3),
+               "events_per_s": round(self.counts["events"] / elapsed, 1) if elapsed else 0.0}
+        for p in (50, 95, 99):
+            out[f"latency_p{p}_ms"] = round(float(np.percentile(lat, p)), 3) if len(lat) else None
+        return out
+
+async def consume(queue, processor, max_batch=5000):
+    """Process (event, received) items from `queue` until a stop event or None; emits after each batch."""
+    running = True
+    while running:
+        item = await queue.get()
+        batch = [item]
+        while len(batch) < max_batch:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        for item in batch:
+            if item is None:
+                processor.flush()
+                running = False
+                break
+            event, received = item if isinstance(item, tuple) else (item, None)
+            if not processor.handle(event, received):
+                running = False
+                break
+        processor.emit()
+        # let producers run between batches
+        await asyncio.sleep(0)
+    return processor.stats()
+
+def _parse(line):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return {"type": "bad"}
+
+async def feed_socket(queue, host="127.0.0.1", port=8765, path=None):
+    """Serve JSON-lines clients on TCP (or a Unix socket at `path`), forwarding events to `queue`."""
+    async def client(reader, writer):
+        async for line in reader:
+            if line.strip():
+                await queue.put((_parse(line), time.perf_counter()))
+        writer.close()
+
+    if path:
+        server = await asyncio.start_unix_server(client, path=path)
+    else:
+        server = await asyncio.start_server(client, host, port)
+    logger.info(f"Streaming: listening on {path or f'{host}:{port}'}")
+    async with server:
+        await server.serve_forever()
+
+async def feed_file(queue, path, poll=0.5, from_start=True):
+    """Follow a JSON-lines file like `tail -f`, forwarding each complete line to `queue`."""
+    path = Path(path)
+    while not path.exists():
+        await asyncio.sleep(poll)
+    with open(path) as f:
+        if not from_start:
+            f.seek(0, 2)
+        partial = ""
+        while True:
+            chunk = f.readline()
+            if not chunk:
+                await asyncio.sleep(poll)
+                continue
+            partial += chunk
+            if not partial.endswith("\n"):
+                continue  # the writer is mid-line
+            line, partial = partial, ""
+            if line.strip():
+                event = _parse(line)
+                await queue.put((event, time.perf_counter()))
+                if event.get("type") == "stop":
+                    return
+
+async def _main(args):
+    queue = asyncio.Queue(maxsize=args.queue_size)
+    processor = StreamProcessor(args.model, args.store, lateness_hours=args.lateness_hours)
+    if args.tail:
+        feeder = feed_file(queue, args.tail, from_start=not args.tail_new)
+    else:
+        host, _, port = args.listen.rpartition(":")
+        feeder = feed_socket(queue, host or "127.0.0.1", int(port), path=args.unix)
+    task = asyncio.create_task(feeder)
+    try:
+        stats = await consume(queue, processor)
+    finally:
+        task.cancel()
+    logger.info(f"Streaming stopped: {stats}")
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    from .config import MODELS_DIR, PREDICTION_DB
+    parser = argparse.ArgumentParser(description="Consume hourly sensor/weather events and nowcast closed days")
+    parser.add_argument("--listen", default="127.0.0.1:8765", help="HOST:PORT for JSON-lines clients")
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead")
+    parser.add_argument("--tail", default=None, help="follow this JSON-lines file instead of a socket")
+    parser.add_argument("--tail-new", action="store_true", help="skip lines already in the --tail file")
+    parser.add_argument("--model", default=str(MODELS_DIR / "aqi_model.forest"))
+    parser.add_argument("--store", default=str(PREDICTION_DB))
+    parser.add_argument("--lateness-hours", type=float, default=1.0)
+    parser.add_argument("--queue-size", type=int, default=100_000)
+    asyncio.run(_main(parser.parse_args()))
@@ -1,104 +1,296 @@
-# src/streamlit_actions.py (or directly inside src/dashboard.py)
-import streamlit as st
-import requests
+# src/streamlit_actions.py
+"""Trigger the pipeline from Streamlit and follow it without blocking the script.
+
+One `ActionsClient` per server process (st.cache_resource) owns a background
+event loop and the backend's pooled httpx.AsyncClient. `start_run()` triggers
+a run and returns at once; a task on that loop polls the run and, when it
+succeeds, downloads the predictions. The UI reads `client.state()` from a
+fragment that refreshes itself, so reruns never wait on the network.
+
+Backends (ACTIONS_BACKEND in .streamlit/secrets.toml, default "github" when a
+token is configured, else "local"):
+
+    GitHubBackend  workflow_dispatch + the workflow's runs, and the prediction
+                   CSV from the raw URL. GETs are conditional (If-None-Match);
+                   unchanged responses come back as 304 and are served from
+                   artifacts/cache/http/.
+    LocalBackend   runs pipeline.yaml in a worker thread and reads the local
+                   prediction store; needs no network (offline use and tests).
+"""
+import asyncio
+import hashlib
+import io
+import json
+import threading
 import time
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
 import pandas as pd
-from datetime import datetime
-import os
+import streamlit as st
+from .config import ARTIFACTS, PREDICTION_DB
+from .utils import get_logger
+
+logger = get_logger()
+
+HTTP_CACHE_DIR = ARTIFACTS / "cache" / "http"
+PREDICTIONS_PATH = "artifacts/predictions/latest.csv"
+
+def _secret(name, default=None):
+    try:
+        return st.secrets.get(name, default)
+    except Exception:  # no secrets.toml
+        return default
+
+class HttpCache:
+    """ETag cache: bodies on disk, revalidated with If-None-Match on every GET."""
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR):
+        self.dir = Path(cache_dir)
+        self.hits = self.misses = 0
+
+    def _paths(self, key):
+        name = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return self.dir / f"{name}.body", self.dir / f"{name}.json"
+
+    async def get(self, client, url, params=None, headers=None):
+        """(status, body bytes, from_cache); a 304 returns the cached body with status 200."""
+        key = str(httpx.URL(url, params=params))
+        body_path, meta_path = self._paths(key)
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() and body_path.exists() else None
+        headers = dict(headers or {})
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        r = await client.get(url, params=params, headers=headers)
+        if r.status_code == 304 and meta:
+            self.hits += 1
+            return 200, body_path.read_bytes(), True
+        self.misses += 1
+        if r.status_code == 200 and r.headers.get("ETag"):
+            self.dir.mkdir(parents=True, exist_ok=True)
+            body_path.write_bytes(r.content)
+            meta_path.write_text(json.dumps({"url": key, "etag": r.headers["ETag"],
+                                             "fetched": datetime.now().isoformat(timespec="seconds")}))
+        return r.status_code, r.content, False
+
+class GitHubBackend:
+    """GitHub Actions workflow runs and the committed prediction CSV, over one pooled client."""
+
+    def __init__(self, owner, repo, token=None, workflow="pipeline-commit.yml", branch="main",
+                 raw_base="https://raw.githubusercontent.com", api_base="https://api.github.com",
+                 cache=None, transport=None):
+        self.owner, self.repo, self.workflow, self.branch = owner, repo, workflow, branch
+        self.raw_base, self.api_base = raw_base.rstrip("/"), api_base.rstrip("/")
+        self.cache = cache or HttpCache()
+        headers = {"Accept": "application/vnd.github.v3+json"}
+        if token:
+            headers["Authorization"] = f"token {token}"
+        self.client = httpx.AsyncClient(headers=headers, timeout=30, transport=transport,
+                                        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5))
+        self._frames = {}  # body digest -> parsed frame
+
+    @property
+    def _workflow_url(self):
+        return f"{self.api_base}/repos/{self.owner}/{self.repo}/actions/workflows/{self.workflow}"
+
+    async def trigger(self):
+        r = await self.client.post(f"{self._workflow_url}/dispatches", json={"ref": self.branch})
+        return r.status_code, r.text
+
+    async def latest_run(self):
+        status, body, _ = await self.cache.get(self.client, f"{self._workflow_url}/runs", params={"per_page": 5})
+        if status != 200:
+            return None
+        runs = json.loads(body).get("workflow_runs", [])
+        return runs[0] if runs else None
+
+    async def fetch_predictions(self, path_in_repo=PREDICTIONS_PATH):
+        url = f"{self.raw_base}/{self.owner}/{self.repo}/{self.branch}/{path_in_repo}"
+        status, body, _ = await self.cache.get(self.client, url)
+        if status != 200:
+            raise RuntimeError(f"Could not fetch raw file: {url} (status {status})")
+        digest = hashlib.sha256(body).hexdigest()
+        if digest not in self._frames:  # parse each distinct download once
+            self._frames = {digest: pd.read_csv(io.BytesIO(body))}
+        return self._frames[digest].copy()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+class LocalBackend:
+    """Runs the pipeline in a worker thread and answers in GitHub's run shape; no network."""
 
-# Config from secrets
-GH_TOKEN = st.secrets.get("GH_TRIGGER_TOKEN")
-OWNER = st.secrets.get("GITHUB_OWNER")
-REPO = st.secrets.get("GITHUB_REPO")
-WORKFLOW_FILE = st.secrets.get("WORKFLOW_FILE", "pipeline-commit.yml")
-BRANCH = st.secrets.get("BRANCH", "main")
-RAW_BASE = st.secrets.get("RAW_BASE", "https://raw.githubusercontent.com")
+    def __init__(self, yaml_path="pipeline.yaml", store_path=PREDICTION_DB, runner=None):
+        self.yaml_path = yaml_path
+        self.store_path = store_path
+        self.runner = runner
+        self.runs = []
+        self.tasks = set()
 
-HEADERS = {"Authorization": f"token {GH_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+    def _run(self):
+        if self.runner is not None:
+            return self.runner(self.yaml_path)
+        from .pipeline_runner import run_pipeline
+        return run_pipeline(self.yaml_path)
 
+    async def _execute(self, run):
+        run["status"] = "in_progress"
+        try:
+            await asyncio.to_thread(self._run)
+            run["conclusion"] = "success"
+        except Exception as e:
+            logger.exception(f"Local pipeline run {run['id']} failed: {e}")
+            run["conclusion"] = "failure"
+        run["status"] = "completed"
+        run["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    async def trigger(self):
+        run = {"id": len(self.runs) + 1, "status": "queued", "conclusion": None, "html_url": None,
+               "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        self.runs.append(run)
+        task = asyncio.create_task(self._execute(run))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return 204, ""
+
+    async def latest_run(self):
+        return dict(self.runs[-1]) if self.runs else None
+
+    async def fetch_predictions(self, path_in_repo=None):
+        from .prediction_store import latest
+        return await asyncio.to_thread(latest, self.store_path)
+
+    async def aclose(self):
+        pass
+
+class ActionsClient:
+    """A background event loop running the backend's calls and at most one run follower."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="actions-client", daemon=True)
+        self.thread.start()
+        self.lock = threading.Lock()
+        self.job = None
+        self._state = {"phase": "idle"}
+
+    def call(self, coro, timeout=60):
+        """Run a backend coroutine on the client loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def _update(self, **fields):
+        with self.lock:
+            self._state = {**self._state, **fields, "updated": time.time()}
+
+    def state(self):
+        with self.lock:
+            return dict(self._state)
+
+    def busy(self):
+        return self.job is not None and not self.job.done()
+
+    def start_run(self, poll_interval=6, timeout=900, fetch=True):
+        """Trigger a run and follow it in the background; returns False if one is already being followed."""
+        if self.busy():
+            return False
+        with self.lock:
+            self._state = {"phase": "triggering", "started": time.time(), "run": None, "error": None,
+                           "predictions": None}
+        self.job = asyncio.run_coroutine_threadsafe(self._follow(poll_interval, timeout, fetch), self.loop)
+        return True
+
+    async def _follow(self, poll_interval, timeout, fetch):
+        start = time.monotonic()
+        try:
+            before = await self.backend.latest_run()
+            code, text = await self.backend.trigger()
+            if code not in (200, 201, 204):
+                self._update(phase="failed", error=f"Trigger failed: {code} {text}")
+                return self.state()
+            self._update(phase="waiting")
+            while True:
+                run = await self.backend.latest_run()
+                # the dispatched run shows up as a new id
+                if run and (before is None or run["id"] != before["id"]):
+                    self._update(run=run)
+                    if run["status"] == "completed":
+                        break
+                if time.monotonic() - start > timeout:
+                    self._update(phase="timeout")
+                    return self.state()
+                await asyncio.sleep(poll_interval)
+            if run.get("conclusion") != "success":
+                self._update(phase="failed", error=f"Run finished with conclusion {run.get('conclusion')}")
+                return self.state()
+            predictions = await self.backend.fetch_predictions() if fetch else None
+            self._update(phase="completed", predictions=predictions)
+        except Exception as e:
+            logger.exception(f"Following the pipeline run failed: {e}")
+            self._update(phase="failed", error=repr(e))
+        return self.state()
+
+    def wait(self, timeout=None):
+        """Block until the followed run is done (scripts/tests; the UI never calls this)."""
+        return self.job.result(timeout) if self.job is not None else self.state()
+
+    def close(self):
+        if self.job is not None:
+            self.job.cancel()
+        self.call(self.backend.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+def make_backend():
+    kind = _secret("ACTIONS_BACKEND") or ("github" if _secret("GH_TRIGGER_TOKEN") else "local")
+    if kind == "local":
+        return LocalBackend(_secret("PIPELINE_YAML", "pipeline.yaml"))
+    return GitHubBackend(
+        owner=_secret("GITHUB_OWNER"),
+        repo=_secret("GITHUB_REPO"),
+        token=_secret("GH_TRIGGER_TOKEN"),
+        workflow=_secret("WORKFLOW_FILE", "pipeline-commit.yml"),
+        branch=_secret("BRANCH", "main"),
+        raw_base=_secret("RAW_BASE", "https://raw.githubusercontent.com"),
+    )
+
+@st.cache_resource
+def get_client():
+    """The process-wide client (shared by every session and rerun)."""
+    return ActionsClient(make_backend())
+
+# synchronous helpers for scripts
 def trigger_workflow():
-    url = f"https://api.github.com/repos/{OWNER}/{REPO}/actions/workflows/{WORKFLOW_FILE}/dispatches"
-    payload = {"ref": BRANCH}
-    r = requests.post(url, json=payload, headers=HEADERS)
-    return r.status_code, r.text
+    return get_client().call(get_client().backend.trigger())
 
 def get_latest_workflow_run():
-    url = f"https://api.github.com/repos/{OWNER}/{REPO}/actions/workflows/{WORKFLOW_FILE}/runs"
-    r = requests.get(url, headers=HEADERS, params={"per_page": 5})
-    if r.status_code != 200:
-        return None
-    runs = r.json().get("workflow_runs", [])
-    if not runs:
-        return None
-    return runs[0]  # latest run
-
-def wait_for_run_completion(poll_interval=5, timeout=600):
-    """Poll the workflow runs until latest is completed or timeout (seconds)."""
-    start = time.time()
-    last_seen_id = None
-    while True:
-        run = get_latest_workflow_run()
-        if not run:
-            time.sleep(poll_interval)
-            if time.time() - start > timeout:
-                return None
-            continue
-
-        run_id = run["id"]
-        status = run["status"]        # "in_progress"/"completed"/"queued"
-        conclusion = run.get("conclusion")  # "success"/"failure"/None
-
-        # show progress to user
-        st.text(f"Workflow run {run_id} status={status} conclusion={conclusion}")
-
-        if status == "completed":
-            return run
-        if time.time() - start > timeout:
-            return run
-        time.sleep(poll_interval)
-
-def fetch_latest_prediction_csv(path_in_repo="artifacts/predictions/latest.csv"):
-    """
-    Fetches the latest CSV from the main branch raw URL.
-    Make sure pipeline writes to exactly this path when committing.
-    """
-    raw_url = f"{RAW_BASE}/{OWNER}/{REPO}/{BRANCH}/{path_in_repo}"
-    r = requests.get(raw_url)
-    if r.status_code == 200:
-        # load to pandas
-        import io
-        return pd.read_csv(io.StringIO(r.text))
+    return get_client().call(get_client().backend.latest_run())
+
+def fetch_latest_prediction_csv(path_in_repo=PREDICTIONS_PATH):
+    return get_client().call(get_client().backend.fetch_predictions(path_in_repo))
+
+@st.fragment(run_every=2)
+def _run_status(client):
+    state = client.state()
+    phase, run = state.get("phase"), state.get("run") or {}
+    if phase == "idle":
+        return
+    elapsed = time.time() - state.get("started", time.time())
+    if phase in ("triggering", "waiting"):
+        st.info(f"Run {run.get('id', '(pending)')}: {run.get('status', 'queued')} — {elapsed:.0f}s")
+    elif phase == "completed":
+        st.success(f"Run {run.get('id')} succeeded" + (f": {run['html_url']}" if run.get("html_url") else ""))
+        if state.get("predictions") is not None:
+            st.dataframe(state["predictions"].head(200))
+    elif phase == "timeout":
+        st.warning("No workflow run found or timed out.")
     else:
-        st.error(f"Could not fetch raw file: {raw_url} (status {r.status_code})")
-        return None
+        st.error(state.get("error") or "Pipeline run failed.")
 
 # Streamlit UI snippet you can paste into src/dashboard.py
 def streamlit_run_pipeline_ui():
     st.header("Pipeline Control")
-
-    if st.button("Run pipeline now (GitHub Actions)"):
-        with st.spinner("Triggering workflow..."):
-            scode, txt = trigger_workflow()
-            if scode in (204, 201, 200):
-                st.success("Workflow triggered successfully. Waiting for completion...")
-            else:
-                st.error(f"Trigger failed: {scode} {txt}")
-                return
-
-        # Poll for completion (blocks UI for short time; ok for a few minutes)
-        run = wait_for_run_completion(poll_interval=6, timeout=900)  # wait up to 15 min
-        if not run:
-            st.warning("No workflow run found or timed out.")
-            return
-
-        run_url = run.get("html_url")
-        conclusion = run.get("conclusion")
-        st.write(f"Run finished: {run_url} — conclusion: {conclusion}")
-
-        if conclusion == "success":
-            st.success("Pipeline succeeded — fetching latest predictions from repo.")
-            df = fetch_latest_prediction_csv()
-            if df is not None:
-                st.dataframe(df.head(200))
-        else:
-            st.error("Pipeline run failed. Check Actions log: " + run_url)
+    client = get_client()
+    if st.button("Run pipeline now", disabled=client.busy()):
+        if client.start_run(poll_interval=6, timeout=900):
+            st.toast("Pipeline triggered; following it in the background.")
+    _run_status(client)
@@ -1,4 +1,6 @@
 import importlib
+from .locks import run_lock
+from .metrics import measure_step
 from .utils import get_logger
 logger = get_logger()
 
@@ -8,3 +10,20 @@ def run_step(module_name, function_name, params):
     func = getattr(mod, function_name)
     logger.info(f"Running {module_name}.{function_name} with params {params}")
     return func(**params)
+
+def run_measured_step(module_name, function_name, params, name=None, profile=None, lock=None):
+    """run_step plus its metrics (see src/metrics.py): returns (result, metrics).
+
+    `lock` is (lock file, shared), held while the step runs; waiting for it is not measured.
+    """
+    name = name or f"{module_name}.{function_name}"
+    if lock:
+        with run_lock(lock[0], wait=True, shared=lock[1]):
+            return run_measured_step(module_name, function_name, params, name, profile)
+    with measure_step(name, profile=profile) as metrics:
+        result = run_step(module_name, function_name, params)
+    metrics.update(module=module_name, function=function_name)
+    logger.info(f"Step {name}: {metrics['wall_s']:.2f}s wall, {metrics['cpu_s']:.2f}s CPU, "
+                f"peak RSS {metrics['peak_rss_bytes'] / 2**20:.0f} MiB, "
+                f"{metrics['rows_in']} rows in, {metrics['rows_out']} rows out")
+    return result, metrics
@@ -16,5 +16,16 @@ def get_logger(name="pipeline"):
         logger.setLevel(logging.INFO)
     return logger
 
-def render_template(s: str):
-    return s.replace("{{date}}", datetime.now().strftime("%Y-%m-%d"))
+def render_template(s: str, date=None):
+    """Replace {{date}} with `date` (YYYY-MM-DD, e.g. a backfilled run's date) or today."""
+    return s.replace("{{date}}", date or datetime.now().strftime("%Y-%m-%d"))
+
+def render_params(value, date=None):
+    """render_template applied to every string inside nested params/lists."""
+    if isinstance(value, str):
+        return render_template(value, date)
+    if isinstance(value, dict):
+        return {k: render_params(v, date) for k, v in value.items()}
+    if isinstance(value, list):
+        return [render_params(v, date) for v in value]
+    return value
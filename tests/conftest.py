@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.data_generator import iter_sensor_readings, iter_weather_data
+from src.etl import run_etl
+from src.storage import write_table
+
+FEATURES = [{"column": "pm25_mean", "name": "pm25", "rolling": {"windows": [3, 7], "aggs": ["mean"]}, "trend": [3]}]
+
+@pytest.fixture(scope="session")
+def raw_tables():
+    """Hourly sensor and weather rows: 12 days x 5 stations, fixed seeds."""
+    sensor = pd.concat(iter_sensor_readings(12, 5, seed=0), ignore_index=True)
+    weather = pd.concat(iter_weather_data(12, 5, seed=1), ignore_index=True)
+    return sensor, weather
+
+@pytest.fixture(scope="session")
+def processed_path(raw_tables, tmp_path_factory):
+    """The raw tables through run_etl, as Parquet."""
+    tmp = tmp_path_factory.mktemp("processed")
+    write_table(raw_tables[0], tmp / "sensor.parquet")
+    write_table(raw_tables[1], tmp / "weather.parquet")
+    return run_etl(tmp / "sensor.parquet", tmp / "weather.parquet", tmp / "processed.parquet", features=FEATURES)
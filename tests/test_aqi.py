@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.aqi import aqi_category, aqi_index, categorical, categorize, overall
+
+@pytest.mark.parametrize("conc, index, category", [
+    (0.0, 0, "Good"), (12.0, 50, "Good"), (12.05, 50, "Good"), (12.1, 51, "Moderate"),
+    (35.4, 100, "Moderate"), (35.5, 101, "Unhealthy for Sensitive Groups"), (55.5, 151, "Unhealthy"),
+    (150.5, 201, "Very Unhealthy"), (250.5, 301, "Hazardous"), (500.4, 500, "Hazardous"),
+    (900.0, 500, "Hazardous"), (-3.0, 0, "Good"),
+])
+def test_pm25_breakpoints(conc, index, category):
+    assert aqi_index([conc])[0] == index
+    assert aqi_category(conc) == category
+
+def test_other_pollutants_use_their_tables():
+    assert list(aqi_index([54, 55, 155], "pm10")) == [50, 51, 101]
+    assert list(categorize([53, 54, 361], "no2")) == ["Good", "Moderate", "Unhealthy"]
+    assert list(aqi_index([35, 36], "so2")) == [50, 51]
+    with pytest.raises(ValueError):
+        aqi_index([1.0], "co")
+
+def test_nan_is_unknown():
+    assert np.isnan(aqi_index([np.nan])[0])
+    assert categorize([np.nan])[0] == "Unknown"
+    assert pd.isna(categorical([np.nan])[0])
+
+def test_overall_takes_the_highest_sub_index():
+    df = pd.DataFrame({"pm25_mean": [10.0, 40.0, np.nan], "no2_mean": [60.0, 10.0, np.nan]})
+    out = overall(df)
+    assert list(out["aqi_pollutant"][:2]) == ["no2", "pm25"]
+    assert list(out["aqi_category"]) == ["Moderate", "Unhealthy for Sensitive Groups", "Unknown"]
@@ -0,0 +1,40 @@
+import itertools
+from types import SimpleNamespace
+
+from src import cache
+from src.cache import StepCache
+
+def _key(step_cache, inp, params=None):
+    return step_cache.key("etl", "run_etl", params or {"fmt": "parquet"}, [inp])
+
+def test_hit_and_misses(tmp_path, monkeypatch):
+    inp, out = tmp_path / "in.csv", tmp_path / "out.csv"
+    inp.write_text("a\n1\n")
+    out.write_text("b\n2\n")
+    step_cache = StepCache(tmp_path / "steps.json")
+    key = _key(step_cache, inp)
+    assert step_cache.lookup(key) is None
+    step_cache.store(key, {"rows": 1}, [out])
+    step_cache.save()
+    reloaded = StepCache(tmp_path / "steps.json")
+    assert reloaded.lookup(_key(reloaded, inp))["result"] == {"rows": 1}
+    assert _key(reloaded, inp, {"fmt": "csv"}) != key
+    monkeypatch.setattr(cache, "_CODE_HASH", "edited")
+    assert _key(reloaded, inp) != key
+    monkeypatch.undo()
+    inp.write_text("a\n1\n2\n")
+    assert _key(reloaded, inp) != key
+    out.write_text("changed\n")
+    assert reloaded.lookup(key) is None  # recorded output no longer matches
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: next(clock)))
+    step_cache = StepCache(tmp_path / "steps.json", max_entries=2)
+    for key in ["a", "b"]:
+        step_cache.store(key, key, [])
+    assert step_cache.lookup("a")["result"] == "a"
+    step_cache.store("c", "c", [])
+    assert sorted(step_cache.index["entries"]) == ["a", "c"]
+    step_cache.store("d", {"not": object()}, [])  # not JSON-serialisable, never stored
+    assert "d" not in step_cache.index["entries"]
@@ -0,0 +1,42 @@
+import pytest
+from src.dag import build_graph, condition_met, run_dag
+from src.pipeline_runner import _StepMetrics
+
+def _returns(result):
+    return result
+
+def _fails(message):
+    raise RuntimeError(message)
+
+def test_failure_stops_dependents_and_is_reraised():
+    steps = [{"name": "extract", "outputs": ["raw"]},
+             {"name": "load", "inputs": ["raw"], "outputs": ["table"]},
+             {"name": "report", "inputs": ["table"]}]
+    started = []
+
+    def task(step):
+        started.append(step["name"])
+        return (_fails, ("boom",)) if step["name"] == "extract" else (_returns, (step["name"],))
+
+    with pytest.raises(RuntimeError, match="boom"):
+        run_dag(steps, task, max_workers=2)
+    assert started == ["extract"]
+
+def test_run_if_skips_on_the_upstream_result():
+    steps = [{"name": "monitor"},
+             {"name": "retrain", "depends_on": "monitor", "run_if": "monitor.drift.detected"},
+             {"name": "report", "depends_on": "monitor", "run_if": "not monitor.drift.detected"}]
+    assert build_graph(steps)["retrain"] == {"monitor"}
+    hooks = _StepMetrics()
+    ran = []
+
+    def task(step):
+        ran.append(step["name"])
+        result = {"drift": {"detected": False}} if step["name"] == "monitor" else step["name"]
+        return _returns, ((result, {"step": step["name"]}),)
+
+    outs, _ = run_dag(steps, task, lookup=hooks.lookup, record=hooks.record)
+    assert ran == ["monitor", "report"]
+    assert outs["retrain"][0] == {"skipped": True, "run_if": "monitor.drift.detected"}
+    assert hooks.steps["retrain"]["skipped"] == 1
+    assert condition_met("monitor.missing.key", hooks.results) is False
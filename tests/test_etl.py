@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+from conftest import FEATURES
+from src.etl import run_etl
+from src.schema import conform
+from src.storage import read_table, write_table
+
+def _processed(path):
+    df = conform(read_table(path), "processed")
+    df["location"] = df["location"].astype(str)
+    return df.sort_values(["location", "date"], ignore_index=True)
+
+def _write_raw(tmp_path, sensor, weather, fmt):
+    paths = tmp_path / f"sensor.{fmt}", tmp_path / f"weather.{fmt}"
+    write_table(sensor, paths[0])
+    write_table(weather, paths[1])
+    return paths
+
+def _files(path):
+    return {p: p.stat().st_mtime_ns for p in path.rglob("*.parquet")}
+
+@pytest.mark.parametrize("fmt, partition_cols, streaming", [("parquet", None, False), ("csv", None, False),
+                                                            ("parquet", ["location"], False),
+                                                            ("parquet", ["location"], True)])
+def test_incremental_matches_rebuild(tmp_path, raw_tables, fmt, partition_cols, streaming):
+    sensor, weather = raw_tables
+    opts = dict(incremental=True, features=FEATURES, partition_cols=partition_cols, streaming=streaming)
+    # first run sees data up to midday (a partial watermark day)
+    cut = sensor["timestamp"].min().normalize() + pd.Timedelta(days=8, hours=12)
+    out = tmp_path / f"processed.{fmt}"
+    s_path, w_path = _write_raw(tmp_path, sensor[sensor["timestamp"] < cut], weather[weather["timestamp"] < cut], fmt)
+    run_etl(s_path, w_path, out, **opts)
+    before = _processed(out)
+    tokyo_files = _files(out / "location=Tokyo") if partition_cols else None
+
+    # second run: every station but Tokyo reports new hours; Tokyo has nothing from its watermark day on
+    quiet = lambda df: (df["location"] == "Tokyo") & (df["timestamp"] >= cut.normalize())
+    s_path, w_path = _write_raw(tmp_path, sensor[~quiet(sensor)], weather[~quiet(weather)], fmt)
+    run_etl(s_path, w_path, out, **opts)
+    incremental = _processed(out)
+    if partition_cols:
+        assert _files(out / "location=Tokyo") == tokyo_files  # partition not rewritten
+
+    rebuild = tmp_path / f"rebuild.{fmt}"
+    write_table(pd.concat([sensor[~quiet(sensor)], sensor[quiet(sensor) & (sensor["timestamp"] < cut)]]), s_path)
+    write_table(pd.concat([weather[~quiet(weather)], weather[quiet(weather) & (weather["timestamp"] < cut)]]), w_path)
+    run_etl(s_path, w_path, rebuild, features=FEATURES)
+    expected = _processed(rebuild)
+
+    tokyo = lambda df: df[df["location"] == "Tokyo"].reset_index(drop=True)
+    pd.testing.assert_frame_equal(tokyo(incremental), tokyo(before), check_exact=True)
+    pd.testing.assert_frame_equal(incremental, expected, check_exact=True)
+
+@pytest.mark.parametrize("days", [None, 9])
+def test_streaming_matches_in_memory(tmp_path, raw_tables, days):
+    s_path, w_path = _write_raw(tmp_path, *raw_tables, "parquet")
+    # with as_of, both paths drop the rows after that day
+    as_of = days and (raw_tables[0]["timestamp"].min().normalize() + pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+    run_etl(s_path, w_path, tmp_path / "full.parquet", features=FEATURES, as_of=as_of)
+    run_etl(s_path, w_path, tmp_path / "stream.parquet", features=FEATURES, as_of=as_of, streaming=True, chunk_rows=700)
+    full = _processed(tmp_path / "full.parquet")
+    pd.testing.assert_frame_equal(_processed(tmp_path / "stream.parquet"), full, check_exact=True)
+    if as_of:
+        assert full["date"].max() == pd.Timestamp(as_of)
+
+def test_incremental_without_new_rows_leaves_the_table(tmp_path, raw_tables):
+    s_path, w_path = _write_raw(tmp_path, *raw_tables, "parquet")
+    out = tmp_path / "processed.parquet"
+    run_etl(s_path, w_path, out, incremental=True, features=FEATURES, partition_cols=["location"])
+    files = _files(out)
+    early = (raw_tables[0]["timestamp"].min() + pd.Timedelta(days=2)).strftime("%Y-%m-%d")
+    run_etl(s_path, w_path, out, incremental=True, features=FEATURES, partition_cols=["location"], as_of=early)
+    assert _files(out) == files
+
+def test_streaming_with_no_rows_gives_an_empty_table(tmp_path, raw_tables):
+    s_path, w_path = _write_raw(tmp_path, *raw_tables, "parquet")
+    run_etl(s_path, w_path, tmp_path / "full.parquet", features=FEATURES, as_of="2000-01-01")
+    run_etl(s_path, w_path, tmp_path / "stream.parquet", features=FEATURES, as_of="2000-01-01", streaming=True)
+    stream, full = _processed(tmp_path / "stream.parquet"), _processed(tmp_path / "full.parquet")
+    assert stream.empty
+    pd.testing.assert_frame_equal(stream, full)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+from src.forest import export_forest, exportable, load_forest
+from src.model import load_model, train
+
+def _data(rows=400, features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features)).astype(np.float32)
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + rng.normal(0, 0.1, rows)
+    return X, y
+
+@pytest.mark.parametrize("params", [{"n_estimators": 20, "random_state": 0},
+                                    {"n_estimators": 5, "max_depth": 3, "random_state": 1}])
+def test_forest_arrays_match_sklearn(tmp_path, params):
+    X, y = _data()
+    model = RandomForestRegressor(**params).fit(X, y)
+    forest = load_forest(export_forest(model, tmp_path / "m.forest"))
+    np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+
+def test_only_tree_regressors_are_exportable():
+    X, y = _data(rows=50)
+    assert exportable(RandomForestRegressor(n_estimators=2).fit(X, y))
+    assert not exportable(Ridge().fit(X, y))
+    assert not exportable(HistGradientBoostingRegressor(max_iter=5).fit(X, y))
+    assert exportable(DecisionTreeRegressor(max_depth=3).fit(X, y))
+    assert not exportable(DecisionTreeClassifier(max_depth=3).fit(X, y > 0))
+    with pytest.raises(ValueError):
+        export_forest(Ridge().fit(X, y), "unused.forest")
+
+def test_non_forest_model_falls_back_to_joblib(tmp_path, processed_path):
+    arrays = tmp_path / "m.forest"
+    train(processed_path, tmp_path / "m.joblib", estimator={"name": "random_forest", "params": {"n_estimators": 5}},
+          arrays_path=arrays)
+    assert arrays.is_dir()
+    train(processed_path, tmp_path / "m.joblib", estimator={"name": "ridge"}, arrays_path=arrays)
+    assert not arrays.exists()  # stale forest removed
+    assert isinstance(load_model(arrays), Ridge)
+
+def test_reexport_leaves_mapped_arrays_alone(tmp_path):
+    X, y = _data()
+    old = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    new = RandomForestRegressor(n_estimators=10, max_depth=4, random_state=1).fit(X, -y)
+    path = tmp_path / "m.forest"
+    mapped = load_forest(export_forest(old, path))
+    export_forest(new, path)
+    np.testing.assert_array_equal(mapped.predict(X), old.predict(X))
+    np.testing.assert_array_equal(load_forest(path).predict(X), new.predict(X))
+    assert [p.name for p in tmp_path.iterdir()] == ["m.forest"]  # no temporary or old directories left
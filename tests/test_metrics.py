@@ -0,0 +1,37 @@
+import json
+
+import pytest
+from src import metrics
+from src.metrics import measure_step, skipped_step, write_run
+from src.storage import read_table, track_io, write_table
+
+def test_measure_step_counts_storage_io(tmp_path, raw_tables, monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_DIR", tmp_path / "profiles")
+    write_table(raw_tables[0].head(100), tmp_path / "in.parquet")
+    with measure_step("copy", profile="cprofile") as step:
+        with track_io() as inner:
+            df = read_table(tmp_path / "in.parquet")
+        write_table(df, tmp_path / "out.parquet")
+    assert inner["rows_in"] == 100  # counted in the innermost context only
+    assert (step["rows_in"], step["rows_out"]) == (0, 100)
+    assert step["bytes_out"] == (tmp_path / "out.parquet").stat().st_size
+    assert step["wall_s"] >= 0 and step["peak_rss_bytes"] > 0
+    assert any((tmp_path / "profiles").glob("copy_cprofile_*.txt"))
+    with pytest.raises(ValueError, match="Unknown profiler"):
+        with measure_step("copy", profile="perf"):
+            pass
+
+def test_write_run_appends_history_and_replaces_prom(tmp_path):
+    for i, status in enumerate(["failed", "ok"]):
+        run = {"run_id": f"r{i}", "started": "2026-01-01T00:00:00", "finished_ts": 1.0, "status": status,
+               "wall_s": 2.0, "steps": [{"step": "etl", "cached": 0, "wall_s": 1.5}, skipped_step("retrain")]}
+        write_run(run, tmp_path)
+    with open(tmp_path / "step_metrics.jsonl") as f:
+        lines = [json.loads(line) for line in f]
+    assert [(r["run_id"], r["step"]) for r in lines] == [("r0", "etl"), ("r0", "retrain"), ("r1", "etl"),
+                                                         ("r1", "retrain")]
+    prom = (tmp_path / "pipeline_metrics.prom").read_text()
+    assert 'aq_step_wall_seconds{step="etl"} 1.5' in prom
+    assert 'aq_step_skipped{step="retrain"} 1' in prom
+    assert "aq_pipeline_success 1" in prom
+    assert json.loads((tmp_path / "pipeline_run_r0.json").read_text())["status"] == "failed"
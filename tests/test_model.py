@@ -0,0 +1,22 @@
+import json
+
+import pandas as pd
+import pytest
+from src.model import load_model, summary_path, time_split, tune
+
+def test_time_split_holds_out_the_last_days():
+    dates = pd.Series(pd.to_datetime(["2026-01-01", "2026-01-02", "2026-01-02", "2026-01-03"]))
+    assert time_split(dates, 0.2).tolist() == [True, True, True, False]
+    with pytest.raises(ValueError, match="at least 2 days"):
+        time_split(dates[:1], 0.2)
+
+def test_tune_saves_like_train(tmp_path, processed_path):
+    search = [{"name": "random_forest", "params": {"n_estimators": 5}, "grid": {"max_depth": [3, 6]}}]
+    arrays = tmp_path / "m.forest"
+    result = tune(processed_path, search=search, n_splits=2, n_jobs=1, model_path=tmp_path / "m.joblib",
+                  report_path=tmp_path / "report.json", arrays_path=arrays)
+    with open(summary_path(tmp_path / "m.joblib")) as f:
+        summary = json.load(f)
+    assert summary["rmse"] == pytest.approx(result["rmse"])
+    assert arrays.is_dir()
+    assert load_model(arrays).predict(pd.read_parquet(processed_path).head(3)).shape == (3,)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from src.monitor import Profile, check_quality, psi
+
+def test_psi_scores_shifted_histograms():
+    counts = np.array([[25, 25, 25, 25], [25, 25, 25, 25], [1, 2, 3, 4]])
+    scores = psi(counts, np.array([[25, 25, 25, 25], [70, 10, 10, 10], [1, 2, 3, 4]]))
+    assert scores[0] == 0
+    assert scores[1] > 0.25  # the usual "significant shift" threshold
+    assert np.isnan(scores[2])  # too few values to score
+
+def test_check_quality_continues_from_the_last_seen_row():
+    ts = pd.to_datetime(["2026-01-01 03:00", "2026-01-01 04:00", "2026-01-01 04:00", "2026-01-01 07:00"])
+    df = pd.DataFrame({"timestamp": ts, "location": pd.Categorical(["Tokyo"] * 4),
+                       "pm25": [10.0, -1.0, -1.0, np.nan], "pm10": 20.0, "no2": 5.0, "so2": 1.0})
+    report = check_quality(df, "sensor", last_seen={"Tokyo": "2026-01-01 00:00"}, freq="3600s")
+    assert report["duplicates"] == 1
+    assert report["missing"] == {"pm25": 1}
+    assert report["out_of_range"]["pm25"]["rows"] == 2
+    assert report["gaps"] == {"Tokyo": 4}  # 01:00, 02:00 before the new rows, 05:00, 06:00 among them
+
+def test_folding_in_batches_matches_one_fold(raw_tables):
+    sensor = raw_tables[0]
+    cut = sensor["timestamp"].sort_values().iloc[len(sensor) // 2]
+    whole, batched = Profile(), Profile()
+    whole.fold(sensor, "sensor")
+    batched.edges = whole.edges.copy()  # same cut points; they come from the first rows seen
+    batched.fold(sensor[sensor["timestamp"] <= cut], "sensor")
+    assert batched.meta["watermarks"]["sensor"] == cut.isoformat()
+    batched.fold(sensor[sensor["timestamp"] > cut], "sensor")
+    assert batched.days == whole.days
+    np.testing.assert_array_equal(batched.window(), whole.window())
+    assert batched.meta["last_seen"] == whole.meta["last_seen"]
+    assert batched.meta["watermarks"]["sensor"] == sensor["timestamp"].max().isoformat()
+
+def test_profile_round_trips(tmp_path, raw_tables):
+    profile = Profile(n_bins=8)
+    profile.fold(raw_tables[1], "weather")
+    profile.save(tmp_path)
+    loaded = Profile.load(tmp_path, n_bins=8)
+    np.testing.assert_array_equal(loaded.daily, profile.daily)
+    assert loaded.meta["watermarks"] == profile.meta["watermarks"]
+    assert Profile.load(tmp_path, n_bins=16).days == []  # different binning starts over
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from src import dashboard_data
+from src.model import save_predictions
+from src.prediction_store import connect, history, migrate_files
+
+def _forecast(day, value):
+    return pd.DataFrame({"location": ["Tokyo", "Delhi"], "date": pd.to_datetime([day, day]),
+                         "pm25_pred_next_day": [value, value + 1.0]})
+
+def test_migrate_imports_each_file_once(tmp_path):
+    db = tmp_path / "predictions.sqlite"
+    for day in ["2026-01-01", "2026-01-02"]:
+        _forecast(day, 10.0).to_csv(tmp_path / f"prediction_{day}.csv", index=False)
+    assert migrate_files(tmp_path, db) == 4
+    assert migrate_files(tmp_path, db) == 0
+    with connect(db) as conn:
+        assert conn.execute("SELECT COUNT(*), SUM(rows) FROM imported_files").fetchone() == (2, 4)
+
+def test_daily_file_written_with_the_store_is_not_migrated_again(tmp_path):
+    db = tmp_path / "predictions.sqlite"
+    save_predictions(_forecast("2026-01-03", 20.0), tmp_path / "prediction_{{date}}.csv", db, date="2026-01-03")
+    assert (tmp_path / "prediction_2026-01-03.csv").exists()
+    assert migrate_files(tmp_path, db) == 0
+    assert len(history(db)) == 2
+
+def test_store_latest_is_sorted_by_forecast(tmp_path):
+    db = tmp_path / "predictions.sqlite"
+    save_predictions(_forecast("2026-01-03", 20.0), tmp_path / "prediction_{{date}}.csv", db, date="2026-01-03")
+    latest = dashboard_data.store_latest(db)
+    assert latest["location"].tolist() == ["Delhi", "Tokyo"]
+    assert latest.columns.tolist() == dashboard_data.load_prediction(tmp_path / "prediction_2026-01-03.csv").columns.tolist()
@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+from benchmarks.replay_stream import replay_inprocess, verify
+from src.storage import write_table
+
+def _unordered(tmp_path, raw_tables):
+    # location by location, like the shipped CSVs
+    paths = tmp_path / "sensor.csv", tmp_path / "weather.csv"
+    for df, path in zip(raw_tables, paths):
+        write_table(df.sort_values(["location", "timestamp"]), path)
+    return paths
+
+def test_replay_of_unordered_files_matches_etl(tmp_path, raw_tables):
+    sensor, weather = _unordered(tmp_path, raw_tables)
+    stats, processor = asyncio.run(replay_inprocess(sensor, weather, collect=True))
+    assert stats["locations"] == raw_tables[0]["location"].nunique()
+    assert verify(processor, sensor, weather, tmp_path)["match"]
+
+def test_producer_failure_reaches_the_caller(tmp_path, raw_tables):
+    sensor, _ = _unordered(tmp_path, raw_tables)
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(asyncio.wait_for(replay_inprocess(sensor, tmp_path / "missing.csv"), timeout=30))
@@ -0,0 +1,47 @@
+import threading
+
+from src import locks, scheduler
+from src.locks import run_lock, step_lock
+from src.scheduler import PipelineScheduler, run_once
+from src.storage import publish_table, read_table, write_table
+from src.tasks import run_measured_step
+
+def test_locked_run_is_marked_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "STATE_DIR", tmp_path)
+    db = tmp_path / "runs.sqlite"
+    sched = PipelineScheduler("pipeline.yaml", executor="thread", db_path=db)
+    scheduler._set_status(str(db), sched.pipeline, "2026-01-02", "queued")
+    with run_lock(scheduler._lock_path(sched.pipeline, "2026-01-02")):
+        assert run_once("pipeline.yaml", "2026-01-02", db_path=str(db)) == "locked"
+    assert sched.status("2026-01-02") == "skipped"
+
+def test_publish_keeps_the_newest_date(tmp_path, raw_tables):
+    sensor = raw_tables[0]
+    for day, n in [("2026-01-03", 10), ("2026-01-02", 20)]:
+        write_table(sensor.head(n), tmp_path / f"{day}.parquet")
+        publish_table(tmp_path / f"{day}.parquet", tmp_path / "out.parquet", as_of=day)
+    assert len(read_table(tmp_path / "out.parquet")) == 10
+
+def test_read_locks_share_and_exclude_writers(tmp_path):
+    path = tmp_path / "step.lock"
+    with run_lock(path, shared=True) as first, run_lock(path, shared=True) as second:
+        assert first and second
+        with run_lock(path) as writer:
+            assert not writer
+    with run_lock(path) as writer, run_lock(path, shared=True) as reader:
+        assert writer and not reader
+
+def test_locked_step_waits_for_its_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(locks, "LOCK_DIR", tmp_path)
+    lock = step_lock({"name": "etl", "lock": "artifacts"}, str(tmp_path / "pipeline.yaml"))
+    assert lock[1] is False
+    assert step_lock({"name": "predict", "read_lock": "artifacts"}, "p.yaml")[1] is True
+    assert step_lock({"name": "generate"}, "p.yaml") is None
+    done = threading.Event()
+    with run_lock(lock[0]):
+        worker = threading.Thread(target=lambda: (run_measured_step("utils", "render_template", {"s": "x"},
+                                                                    lock=lock), done.set()))
+        worker.start()
+        assert not done.wait(0.7)
+    worker.join(5)
+    assert done.is_set()
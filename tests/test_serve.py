@@ -0,0 +1,43 @@
+import http.client
+import json
+import threading
+
+import pytest
+from src.model import train
+from src.serve import PredictionServer
+
+@pytest.fixture(scope="module")
+def server(processed_path, tmp_path_factory):
+    model = tmp_path_factory.mktemp("serve") / "m.joblib"
+    train(processed_path, model, estimator={"name": "random_forest", "params": {"n_estimators": 5}})
+    srv = PredictionServer(("127.0.0.1", 0), model, processed_path)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+def _post(server, body):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    try:
+        conn.request("POST", "/predict", body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read())
+    finally:
+        conn.close()
+
+def test_post_rows(server):
+    status, payload = _post(server, json.dumps({"rows": [{"pm25_mean": 30.0}, {}]}))
+    assert status == 200
+    assert len(payload["predictions"]) == 2
+
+@pytest.mark.parametrize("body", ["{not json", "[1, 2]", '"rows"', '{"rows": {"pm25_mean": 1}}', '{"rows": [1]}'])
+def test_bad_body_is_a_400(server, body):
+    status, payload = _post(server, body)
+    assert status == 400
+    assert payload["error"]
+
+def test_unknown_path_is_a_404(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    conn.request("GET", "/nope")
+    assert conn.getresponse().status == 404
+    conn.close()
@@ -0,0 +1,20 @@
+import pandas as pd
+from conftest import FEATURES
+from src.data_generator import iter_sensor_readings, iter_weather_data
+from src.etl import run_etl
+from src.sharding import load_registry, predict_sharded, train_sharded
+from src.storage import write_table
+
+def test_pipeline_sized_data_gets_shard_models(tmp_path):
+    # the shipped pipeline: 30 days of hourly data per location
+    write_table(pd.concat(iter_sensor_readings(30, 3, seed=0), ignore_index=True), tmp_path / "sensor.parquet")
+    write_table(pd.concat(iter_weather_data(30, 3, seed=1), ignore_index=True), tmp_path / "weather.parquet")
+    processed = run_etl(tmp_path / "sensor.parquet", tmp_path / "weather.parquet", tmp_path / "processed.parquet",
+                        features=FEATURES, partition_cols=["location"])
+    result = train_sharded(processed, tmp_path / "shards", max_workers=1,
+                           estimator={"name": "random_forest", "params": {"n_estimators": 5}})
+    assert result["shards"] == 3 and result["fallback_shards"] == 0
+    registry = load_registry(result["registry_path"])
+    assert all(entry["model_path"] for entry in registry["shards"].values())
+    out = predict_sharded(result["registry_path"], processed, output_path=tmp_path / "pred.csv")
+    assert len(pd.read_csv(out)) == 3
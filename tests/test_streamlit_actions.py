@@ -0,0 +1,64 @@
+import asyncio
+
+import httpx
+import pandas as pd
+import pytest
+from src.model import save_predictions
+from src.streamlit_actions import ActionsClient, GitHubBackend, HttpCache, LocalBackend
+
+CSV = b"location,date,pm25_pred_next_day\nTokyo,2026-01-03,20.0\n"
+
+def test_predictions_are_revalidated_with_the_etag(tmp_path):
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=CSV, headers={"ETag": '"v1"'})
+
+    cache = HttpCache(tmp_path)
+    backend = GitHubBackend("owner", "repo", cache=cache, transport=httpx.MockTransport(handler))
+
+    async def fetch_twice():
+        try:
+            return await backend.fetch_predictions(), await backend.fetch_predictions()
+        finally:
+            await backend.aclose()
+
+    first, second = asyncio.run(fetch_twice())
+    assert seen == [None, '"v1"']
+    assert (cache.misses, cache.hits) == (1, 1)
+    pd.testing.assert_frame_equal(first, second)
+    assert first["location"].tolist() == ["Tokyo"]
+
+def test_failed_fetch_is_not_cached(tmp_path):
+    backend = GitHubBackend("owner", "repo", cache=HttpCache(tmp_path),
+                            transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+    with pytest.raises(RuntimeError, match="status 404"):
+        asyncio.run(backend.fetch_predictions())
+    assert not list(tmp_path.iterdir())
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_local_backend_follows_a_run(tmp_path, fails):
+    db = tmp_path / "predictions.sqlite"
+
+    def runner(yaml_path):
+        if fails:
+            raise RuntimeError("step failed")
+        forecast = pd.DataFrame({"location": ["Tokyo"], "date": pd.to_datetime(["2026-01-03"]),
+                                 "pm25_pred_next_day": [20.0]})
+        save_predictions(forecast, tmp_path / "prediction_{{date}}.csv", db, date="2026-01-03")
+
+    client = ActionsClient(LocalBackend(store_path=db, runner=runner))
+    try:
+        assert client.start_run(poll_interval=0.05, timeout=10)
+        state = client.wait(15)
+    finally:
+        client.close()
+    assert state["run"]["id"] == 1 and state["run"]["status"] == "completed"
+    if fails:
+        assert state["phase"] == "failed" and "failure" in state["error"]
+    else:
+        assert state["phase"] == "completed"
+        assert state["predictions"]["location"].tolist() == ["Tokyo"]